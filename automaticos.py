@@ -0,0 +1,142 @@
+# Jugadores automáticos: completan las partidas que no se llenan (`!mafia rellenar`) y juegan cualquier rol.
+# No reciben DMs ni hacen clic: cuando les toca elegir (de noche si tienen rol nocturno, de día para votar),
+# la partida arma una `Situacion` por cada uno y se la pasa a la estrategia en un pool de hilos o de
+# procesos, así pensar nunca frena al event loop. Lo que eligen entra por el mismo camino que los clics.
+#
+# Una estrategia es una función `(situacion) -> índice del jugador elegido`, definida a nivel de módulo
+# (así se puede mandar a otro proceso), que se registra en ESTRATEGIAS. Tiene que decidir solo con la
+# situación: no ve la partida, solo lo que sabría un jugador con ese rol.
+import asyncio
+import multiprocessing
+import random
+import time
+import traceback
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import metricas
+
+HILOS = 4  # Hilos del pool si no se piden procesos
+LIMITE_DECISION = 2  # Segundos que esperamos a las decisiones de una fase; después, esos jugadores no eligen
+
+# Lo que sabe un jugador automático cuando le toca elegir:
+#  momento: "noche" o "dia"; rol: su rol; yo: su índice; vivos: índices de los vivos (él incluido);
+#  conocidos: {índice: rol} de lo que averiguó como detective; votos: ((índice, votos), ...) del recuento
+#  actual, de más votado a menos (vacío de noche); semilla: para sus elecciones al azar.
+Situacion = namedtuple("Situacion", ("momento", "rol", "yo", "vivos", "conocidos", "votos", "semilla"))
+
+# Un jugador automático, con lo mínimo de un miembro de Discord que usa la partida. Su id sale del canal y
+# de su índice (negativo, para no chocar con los de Discord), así se puede volver a armar al recuperar la partida.
+class JugadorAutomatico:
+    __slots__ = ("id", "display_name", "conocidos")
+    bot = True # A los bots no se les mandan DMs (ver envios.py)
+
+    def __init__(self, canal_id, indice):
+        self.id = -(canal_id << 5 | indice) # Hasta 30 jugadores: el índice entra en 5 bits
+        self.display_name = f"🤖 Bot {indice + 1}"
+        self.conocidos = {} # Lo que averiguó como detective: índice -> rol
+
+    @property
+    def mention(self):
+        return self.display_name
+
+def es_automatico(jugador):
+    return isinstance(jugador, JugadorAutomatico)
+
+# Si un id guardado es de un jugador automático
+def es_id_automatico(jugador_id):
+    return jugador_id < 0
+
+def situacion(momento, rol, yo, vivos, conocidos=None, votos=()):
+    return Situacion(momento, rol, yo, tuple(vivos), dict(conocidos or {}), tuple(votos), random.getrandbits(32))
+
+# --------- Estrategias ---------
+# Elige a cualquier vivo al azar (que no sea él mismo, salvo el doctor, que se puede curar)
+def azar(situacion):
+    rng = random.Random(situacion.semilla)
+    opciones = [j for j in situacion.vivos if j != situacion.yo or situacion.rol == "doctor"]
+    return rng.choice(opciones or situacion.vivos)
+
+# Juega con lo que sabe: el detective investiga a quien todavía no conoce y vota a la mafia que encontró;
+# el doctor se cura la mitad de las veces; de día todos se suman al más votado del que no saben que es
+# inocente (la mafia, al más votado que no sea ella misma).
+def sensata(situacion):
+    rng = random.Random(situacion.semilla)
+    yo, rol, conocidos = situacion.yo, situacion.rol, situacion.conocidos
+    otros = [j for j in situacion.vivos if j != yo] or list(situacion.vivos)
+    if situacion.momento == "dia":
+        mafias = [j for j in otros if conocidos.get(j) == "mafia"]
+        if rol != "mafia" and mafias:
+            return rng.choice(mafias)
+        sospechosos = [j for j in otros if rol == "mafia" or conocidos.get(j, "mafia") == "mafia"] or otros
+        for jugador, _ in situacion.votos:
+            if jugador in sospechosos:
+                return jugador
+        return rng.choice(sospechosos)
+    if rol == "doctor":
+        return yo if rng.random() < 0.5 else rng.choice(otros)
+    if rol == "detective":
+        return rng.choice([j for j in otros if j not in conocidos] or otros)
+    return rng.choice(otros)
+
+ESTRATEGIAS = {"azar": azar, "sensata": sensata}
+
+# --------- Pool ---------
+_pool = None
+_procesos = 0 # Procesos del pool (0: es de hilos)
+_estrategia = sensata
+
+# Elige la estrategia y el pool: con `procesos` > 0, un pool de procesos (para estrategias que gastan
+# CPU de verdad); si no, uno de hilos.
+def configurar(estrategia="sensata", procesos=0):
+    global _pool, _procesos, _estrategia
+    _estrategia = ESTRATEGIAS[estrategia]
+    _procesos = procesos
+    if procesos:
+        _pool = ProcessPoolExecutor(procesos, mp_context=multiprocessing.get_context("spawn"))
+    else:
+        _pool = ThreadPoolExecutor(HILOS, thread_name_prefix="automaticos")
+
+# Arranca de antemano los procesos del pool (con hilos no hace falta), así la primera decisión no paga el
+# arranque. Llamarlo desde el proceso del bot y no al importar: los procesos del pool importan de nuevo el
+# módulo principal, y si lo hicieran al importar cada uno armaría su propio pool.
+def preparar():
+    pool = _obtener_pool()
+    for _ in range(_procesos):
+        pool.submit(int)
+
+def _obtener_pool():
+    if _pool is None:
+        configurar(_estrategia.__name__, _procesos)
+    return _pool
+
+# Corre en el pool: decide por todos los jugadores automáticos de una fase y devuelve, para cada uno,
+# (elegido o None si la estrategia falló, segundos que tardó)
+def _decidir_lote(estrategia, situaciones):
+    resultados = []
+    for caso in situaciones:
+        inicio = time.perf_counter()
+        try:
+            elegido = estrategia(caso)
+        except Exception:
+            traceback.print_exc()
+            elegido = None
+        resultados.append((elegido, time.perf_counter() - inicio))
+    return resultados
+
+# Decide por todos los jugadores automáticos de una fase de una partida, en un solo viaje al pool.
+# Devuelve la lista de elegidos (None para los que no eligieron). Si el pool tarda más de
+# LIMITE_DECISION, nadie elige y la fase sigue como si no hubieran hecho clic.
+async def decidir(situaciones):
+    loop = asyncio.get_running_loop()
+    momento = situaciones[0].momento
+    with metricas.medir("decision_automaticos", momento=momento):
+        try:
+            resultados = await asyncio.wait_for(
+                loop.run_in_executor(_obtener_pool(), _decidir_lote, _estrategia, situaciones), LIMITE_DECISION)
+        except asyncio.TimeoutError:
+            metricas.contar("decisiones_automaticas_tarde", len(situaciones))
+            return [None] * len(situaciones)
+    for _, segundos in resultados:
+        metricas.duracion("decision_automatico", segundos, momento=momento)
+    return [elegido for elegido, _ in resultados]
@@ -0,0 +1,178 @@
+# Prueba de carga: cuántas partidas a la vez aguanta un proceso del bot antes de pasarse del plazo de
+# 3 segundos que da Discord para responder un clic.
+# Conecta el bot real (mafia.bot, sin cambios) a un Discord local (gateway_falso.py, en otro proceso)
+# en lugar de a Discord: el bot se conecta por websocket, recibe los comandos y los clics como eventos
+# del gateway y manda todo por HTTP, con 429 de vez en cuando. Las fases duran `--compresion` veces
+# menos que de verdad, así una ronda de cientos de partidas completas tarda segundos.
+# Para cada cantidad de partidas simultáneas muestra:
+#  - respuesta a los clics (p50/p99/máximo) medida desde el Discord local, y cuántas pasaron los 3 s
+#  - cuánto tarda el bot en atender cada clic (p50/p99)
+#  - retraso del event loop (cuánto más de lo pedido tarda en despertar una tarea que duerme)
+#  - memoria del proceso del bot y cuánto creció
+#  - ediciones de mensajes por partida (el recuento de votos en vivo)
+# Con `--procesos N`, el bot corre repartido en N procesos con supervisor.py (N shards, uno por proceso),
+# para ver cuánto mejora usando más núcleos. Ahí el retraso del loop y la memoria son los que mandan los
+# trabajadores en sus latidos (la memoria, sumada), y no se mide la atención del clic por separado.
+# Uso: python bench_carga.py --pasos 50,100,200,400 --jugadores 10 --compresion 20 [--procesos 4]
+import argparse
+import asyncio
+import gc
+import multiprocessing
+import tempfile
+
+import aiohttp
+import discord
+import yarl
+from discord.gateway import DiscordWebSocket
+
+import gateway_falso
+import mafia
+import metricas
+import supervisor
+
+# Las fases de la partida duran `compresion` veces menos (los plazos de seguridad y la cola de mensajes no)
+def comprimir_tiempos(compresion):
+    mafia.DURACION_FASE /= compresion
+    mafia.PAUSA_ENTRE_RONDAS /= compresion
+    mafia.AVISOS_FASE = tuple(restante / compresion for restante in mafia.AVISOS_FASE)
+    mafia.ESPERA_LOBBY /= compresion
+
+def milisegundos(datos):
+    return f"{datos['p50'] * 1000:7.1f} {datos['p99'] * 1000:7.1f} {datos['maximo'] * 1000:7.1f}"
+
+# El bot habla con el Discord local en lugar de con Discord. Se llama con el módulo mafia en el proceso
+# que corre el bot (este mismo, o cada trabajador con --procesos).
+def preparar_bot(modulo, puerto, compresion):
+    discord.http.Route.BASE = f"http://127.0.0.1:{puerto}/api/v10"
+    DiscordWebSocket.DEFAULT_GATEWAY = yarl.URL(f"ws://127.0.0.1:{puerto}/gateway")
+    modulo.TOKEN = "token-falso"
+    comprimir_tiempos(compresion)
+    metricas.MAX_MUESTRAS = 10_000_000 # Queremos todas las muestras de cada ronda para los percentiles
+
+# Pide una ronda de `partidas` al Discord local y espera a que terminen todas (`quedan` dice cuántas
+# partidas siguen abiertas del lado del bot). Devuelve (partidas, estado final del Discord local).
+async def jugar_ronda(sesion, control, partidas, quedan):
+    async with sesion.post(f"{control}/ronda", json={"partidas": partidas}) as respuesta:
+        partidas = (await respuesta.json())["partidas"]
+    while True:
+        await asyncio.sleep(0.25)
+        async with sesion.get(f"{control}/estado") as respuesta:
+            estado = await respuesta.json()
+        if estado["pendientes"] <= 0 and not quedan():
+            return partidas, estado
+
+async def correr(args, puerto):
+    preparar_bot(mafia, puerto, args.compresion)
+    await mafia.bot.login(mafia.TOKEN)
+    tarea_bot = asyncio.create_task(mafia.bot.connect())
+    await mafia.bot.wait_until_ready()
+    retrasos = []
+    tarea_lag = asyncio.create_task(metricas.medir_retraso(retrasos))
+
+    control = f"http://127.0.0.1:{puerto}/control"
+    print(f"{'Partidas':>8} {'Seg':>6} {'Part/s':>7} | {'Respuesta a clics (ms)':>23} {'>3s':>5} | "
+          f"{'Atención del clic (ms)':>15} | {'Retraso del loop (ms)':>23} | {'Memoria (MiB)':>14} | {'429':>5} {'DM✗':>4} {'Edic/part':>9}")
+    print(f"{'':>8} {'':>6} {'':>7} | {'p50':>7} {'p99':>7} {'máx':>7} {'':>5} | {'p50':>7} {'p99':>7} | "
+          f"{'p50':>7} {'p99':>7} {'máx':>7} | {'total':>6} {'crece':>7} |")
+    memoria_inicial = metricas.memoria()
+    async with aiohttp.ClientSession() as sesion:
+        for partidas in args.pasos:
+            gc.collect()
+            antes = metricas.memoria()
+            retrasos.clear()
+            metricas.muestras.pop("menu", None)
+            partidas, estado = await jugar_ronda(sesion, control, partidas, lambda: mafia.partidas)
+            gc.collect()
+            despues = metricas.memoria()
+            atencion = gateway_falso.percentiles(list(metricas.muestras.get("menu", ())))
+            lag = gateway_falso.percentiles(retrasos)
+            print(f"{partidas:8} {estado['segundos']:6.1f} {partidas / estado['segundos']:7.1f} | "
+                  f"{milisegundos(estado['respuestas'])} {estado['tarde']:5} | "
+                  f"{atencion['p50'] * 1000:7.2f} {atencion['p99'] * 1000:7.2f} | {milisegundos(lag)} | "
+                  f"{despues:6.1f} {despues - antes:+7.1f} | {estado['respuestas_429']:5} {estado['dms_fallidos']:4} "
+                  f"{estado['ediciones'] / partidas:9.1f}")
+    print(f"Memoria al terminar: {metricas.memoria():.1f} MiB ({metricas.memoria() - memoria_inicial:+.1f} desde la primera ronda)")
+
+    tarea_lag.cancel()
+    await mafia.bot.close()
+    await asyncio.gather(tarea_bot, return_exceptions=True)
+
+# Lo mismo, con el bot repartido en `args.procesos` procesos trabajadores
+async def correr_procesos(args, puerto, directorio):
+    jefe = supervisor.Supervisor(args.procesos, args.procesos, directorio,
+                                 preparar=(preparar_bot, (puerto, args.compresion)))
+    await jefe.arrancar()
+    tarea_vigilar = asyncio.create_task(jefe.vigilar())
+    # Esperamos un latido completo de cada uno para tener la memoria inicial
+    await asyncio.sleep(supervisor.INTERVALO_LATIDO * 2)
+
+    control = f"http://127.0.0.1:{puerto}/control"
+    print(f"{'Partidas':>8} {'Seg':>6} {'Part/s':>7} | {'Respuesta a clics (ms)':>23} {'>3s':>5} | "
+          f"{'Retraso del loop (ms)':>23} | {'Memoria (MiB)':>14} | {'429':>5} {'DM✗':>4} {'Edic/part':>9} {'Reinicios':>9}")
+    print(f"{'':>8} {'':>6} {'':>7} | {'p50':>7} {'p99':>7} {'máx':>7} {'':>5} | "
+          f"{'p50':>7} {'p99':>7} {'máx':>7} | {'total':>6} {'crece':>7} |")
+    memoria_inicial = jefe.sumar("memoria")
+    async with aiohttp.ClientSession() as sesion:
+        for partidas in args.pasos:
+            antes = jefe.sumar("memoria")
+            jefe.retrasos.clear()
+            # Las partidas de los trabajadores se ven con el latido: esperamos uno más antes de dar la ronda por terminada
+            partidas, estado = await jugar_ronda(sesion, control, partidas, lambda: sum(jefe.partidas_activas().values()))
+            await asyncio.sleep(supervisor.INTERVALO_LATIDO * 2)
+            despues = jefe.sumar("memoria")
+            lag = gateway_falso.percentiles(jefe.retrasos)
+            print(f"{partidas:8} {estado['segundos']:6.1f} {partidas / estado['segundos']:7.1f} | "
+                  f"{milisegundos(estado['respuestas'])} {estado['tarde']:5} | {milisegundos(lag)} | "
+                  f"{despues:6.1f} {despues - antes:+7.1f} | {estado['respuestas_429']:5} {estado['dms_fallidos']:4} "
+                  f"{estado['ediciones'] / partidas:9.1f} {sum(t.reinicios for t in jefe.trabajadores):9}")
+    print(f"Memoria al terminar: {jefe.sumar('memoria'):.1f} MiB ({jefe.sumar('memoria') - memoria_inicial:+.1f} desde la primera ronda)")
+
+    tarea_vigilar.cancel()
+    await jefe.cerrar()
+
+def main():
+    parser = argparse.ArgumentParser(description="Prueba de carga del bot contra un Discord local")
+    parser.add_argument("--pasos", default="50,100,200,400", help="partidas simultáneas de cada ronda")
+    parser.add_argument("--jugadores", type=int, default=10, help="jugadores por partida")
+    parser.add_argument("--compresion", type=float, default=20, help="cuántas veces más rápido pasa el tiempo de las fases")
+    parser.add_argument("--actividad", type=float, default=0.9, help="probabilidad de que un jugador elija algo")
+    parser.add_argument("--tasa-429", type=float, default=0.01, help="fracción de envíos que responden 429")
+    parser.add_argument("--espera-429", type=float, default=0.2, help="segundos de retry_after de cada 429")
+    parser.add_argument("--dms-cerrados", type=float, default=0.02, help="fracción de jugadores sin DMs")
+    parser.add_argument("--procesos", type=int, default=1, help="procesos del bot (más de 1: con supervisor.py)")
+    parser.add_argument("--semilla", type=int, default=1)
+    args = parser.parse_args()
+    args.pasos = [int(paso) for paso in args.pasos.split(",")]
+
+    with tempfile.TemporaryDirectory() as directorio:
+        # Lo que el bot guarda (partidas en curso, historial) va a una carpeta temporal, y sin métricas por HTTP
+        mafia.DIRECTORIO_DATOS = directorio
+        mafia.METRICAS_PUERTO = 0
+
+        # El Discord local corre en otro proceso para no competir con el bot por su event loop
+        contexto = multiprocessing.get_context("spawn")
+        cola = contexto.Queue()
+        opciones = {
+            "servidores": max(args.pasos), "jugadores": args.jugadores,
+            # Los jugadores eligen dentro de la primera mitad de la fase
+            "pensar": mafia.DURACION_FASE / args.compresion / 2, "actividad": args.actividad,
+            "tasa_429": args.tasa_429, "espera_429": args.espera_429, "dms_cerrados": args.dms_cerrados,
+            "semilla": args.semilla,
+        }
+        proceso = contexto.Process(target=gateway_falso.correr, args=(cola, opciones), daemon=True)
+        proceso.start()
+        try:
+            puerto = cola.get(timeout=60)
+            print(f"{args.jugadores} jugadores por partida, fases {args.compresion:g} veces más rápidas, "
+                  f"{args.tasa_429:.0%} de 429, {args.dms_cerrados:.0%} de jugadores sin DMs")
+            if args.procesos > 1:
+                print(f"Bot repartido en {args.procesos} procesos")
+                asyncio.run(correr_procesos(args, puerto, directorio))
+            else:
+                asyncio.run(correr(args, puerto))
+        finally:
+            proceso.terminate()
+            proceso.join()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,93 @@
+# Benchmark: objetos que se crean en cada ronda para los componentes de noche y votación.
+# Compara las vistas de antes (una vista por rol activo con un botón y un callback por jugador vivo)
+# con los menús de ahora (una sola vista por fase, compartida, que se despacha por custom_id).
+# Uso: python bench_componentes.py --jugadores 25 --rondas 200
+import argparse
+import asyncio
+import gc
+import time
+import tracemalloc
+import types
+
+import discord
+from discord.ui import Button, View
+
+import falso_discord
+import mafia
+import motor
+
+# Componentes de una ronda con el formato anterior. Las vistas de antes tenían como mucho 25 botones,
+# así que con más jugadores no se podían ni armar.
+def ronda_botones(partida):
+    juego, jugadores = partida.juego, partida.jugadores
+    vivos = list(juego.indices_vivos())
+    vistas = []
+    for i in vivos:
+        rol = juego.rol(i)
+        if rol in motor.ROLES_NOCTURNOS:
+            view = View(timeout=90)
+            for objetivo in vivos:
+                button = Button(label=jugadores[objetivo].display_name, style=discord.ButtonStyle.primary)
+                async def callback(interaction, obj=objetivo, jug=i, rol=rol):
+                    pass
+                button.callback = callback
+                view.add_item(button)
+            vistas.append(view)
+    view = View()
+    for objetivo in vivos:
+        button = Button(label=jugadores[objetivo].display_name, style=discord.ButtonStyle.danger)
+        async def callback(interaction, obj=objetivo):
+            pass
+        button.callback = callback
+        view.add_item(button)
+    vistas.append(view)
+    return vistas
+
+# Componentes de una ronda con el formato actual: una vista para la noche y otra para la votación
+def ronda_menus(partida):
+    vivos = list(partida.juego.indices_vivos())
+    return [mafia.armar_menus(partida, vivos), mafia.armar_menus(partida, vivos)]
+
+# Arma `rondas` rondas y devuelve (objetos por ronda, funciones por ronda, bytes por ronda, segundos por ronda)
+def medir(armar, partida, rondas):
+    gc.collect()
+    gc.disable()
+    objetos = len(gc.get_objects())
+    funciones = sum(isinstance(o, types.FunctionType) for o in gc.get_objects())
+    tracemalloc.start()
+    antes = tracemalloc.get_traced_memory()[0]
+    inicio = time.perf_counter()
+    creadas = [armar(partida) for _ in range(rondas)]
+    segundos = time.perf_counter() - inicio
+    memoria = tracemalloc.get_traced_memory()[0] - antes
+    tracemalloc.stop()
+    objetos = len(gc.get_objects()) - objetos
+    funciones = sum(isinstance(o, types.FunctionType) for o in gc.get_objects()) - funciones
+    gc.enable()
+    del creadas
+    return objetos / rondas, funciones / rondas, memoria / rondas, segundos / rondas
+
+async def main():
+    parser = argparse.ArgumentParser(description="Objetos por ronda: botones por jugador vs. menús compartidos")
+    parser.add_argument("--jugadores", type=int, default=25)
+    parser.add_argument("--rondas", type=int, default=200)
+    args = parser.parse_args()
+
+    servidor = falso_discord.ServidorFalso(args.jugadores, 0)
+    creador, *resto = servidor.members
+    partida = mafia.Partida(creador, servidor.canal, args.jugadores, 0)
+    for miembro in resto:
+        partida.agregar(miembro)
+    partida.juego = motor.repartir_roles(args.jugadores, partida.rng)
+
+    print(f"Ronda con {args.jugadores} jugadores vivos")
+    formatos = [("menús", ronda_menus)]
+    if args.jugadores <= 25:
+        formatos.insert(0, ("botones", ronda_botones))
+    for nombre, armar in formatos:
+        objetos, funciones, memoria, segundos = medir(armar, partida, args.rondas)
+        print(f"  {nombre:8} {objetos:8.0f} objetos, {funciones:6.0f} funciones, "
+              f"{memoria / 1024:8.1f} KiB, {segundos * 1000:.3f} ms por ronda")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,119 @@
+# Benchmark: tiempo hasta on_ready y memoria con servidores grandes, descargando todos los miembros
+# al conectarse (lo que hace discord.py por defecto) o sin descargarlos (lo que hace el bot ahora).
+# No se conecta a Discord: le pasamos al estado interno de discord.py los mismos eventos que mandaría
+# el gateway (READY, GUILD_CREATE y los GUILD_MEMBERS_CHUNK que se piden al descargar miembros).
+# Uso: python bench_inicio.py --servidores 10 --miembros 10000
+import argparse
+import asyncio
+import gc
+import time
+import tracemalloc
+
+import discord
+
+import mafia
+import miembros
+
+MIEMBROS_POR_TROZO = 1000 # Discord manda los miembros en trozos de hasta 1000
+
+def datos_miembro(miembro_id):
+    return {
+        "user": {"id": str(miembro_id), "username": f"usuario{miembro_id}", "discriminator": "0",
+                 "global_name": None, "avatar": None},
+        "roles": [], "joined_at": "2024-01-01T00:00:00+00:00", "deaf": False, "mute": False, "flags": 0,
+    }
+
+def datos_servidor(servidor_id, cantidad):
+    return {
+        "id": str(servidor_id), "name": f"servidor{servidor_id}", "member_count": cantidad, "large": True,
+        "unavailable": False, "owner_id": "1", "roles": [{"id": str(servidor_id), "name": "@everyone",
+        "permissions": "0", "position": 0, "color": 0, "hoist": False, "managed": False, "mentionable": False}],
+        "channels": [], "members": [], "emojis": [], "stickers": [], "features": [], "threads": [],
+        "presences": [], "voice_states": [],
+    }
+
+# Gateway falso: cuando discord.py pide los miembros de un servidor, se los manda en trozos
+class GatewayFalso:
+    def __init__(self, estado, miembros_por_servidor):
+        self.estado = estado
+        self.miembros_por_servidor = miembros_por_servidor
+        self.armado = 0.0 # Tiempo que pasamos armando los datos falsos (no cuenta para el resultado)
+
+    async def request_chunks(self, guild_id, query=None, *, limit=0, user_ids=None, presences=False, nonce=None):
+        asyncio.get_running_loop().create_task(self.mandar_trozos(guild_id, nonce))
+
+    async def mandar_trozos(self, servidor_id, nonce):
+        total = self.miembros_por_servidor
+        trozos = (total + MIEMBROS_POR_TROZO - 1) // MIEMBROS_POR_TROZO
+        for indice in range(trozos):
+            inicio = time.perf_counter()
+            base = servidor_id * 10_000_000 + indice * MIEMBROS_POR_TROZO
+            datos = {
+                "guild_id": str(servidor_id), "nonce": nonce, "chunk_index": indice, "chunk_count": trozos,
+                "members": [datos_miembro(base + i) for i in range(min(MIEMBROS_POR_TROZO, total - indice * MIEMBROS_POR_TROZO))],
+            }
+            self.armado += time.perf_counter() - inicio
+            self.estado.parse_guild_members_chunk(datos)
+            await asyncio.sleep(0) # Como si cada trozo llegara en un mensaje distinto del gateway
+
+# Simula el arranque y devuelve (segundos hasta on_ready, bytes en memoria, miembros guardados, cliente).
+# Con `memoria` medimos con tracemalloc, que hace todo más lento, así que el tiempo se mide en otra corrida.
+async def medir_inicio(miembros_al_inicio, servidores, miembros_por_servidor, memoria=False):
+    cliente = discord.Client(**mafia.opciones_bot(miembros_al_inicio))
+    await cliente._async_setup_hook()
+    estado = cliente._connection
+    estado.guild_ready_timeout = 0.05 # Cuánto espera discord.py por más GUILD_CREATE (igual en los dos modos)
+    gateway = GatewayFalso(estado, miembros_por_servidor)
+    estado._get_websocket = lambda *args, **kwargs: gateway
+    listo = asyncio.Event()
+
+    @cliente.event
+    async def on_ready():
+        listo.set()
+
+    gc.collect()
+    if memoria:
+        tracemalloc.start()
+    inicio = time.perf_counter()
+    estado.parse_ready({
+        "user": {"id": "1", "username": "mafia", "discriminator": "0", "avatar": None, "bot": True},
+        "guilds": [{"id": str(i), "unavailable": True} for i in range(2, servidores + 2)],
+        "session_id": "falsa",
+    })
+    for i in range(2, servidores + 2):
+        estado.parse_guild_create(datos_servidor(i, miembros_por_servidor))
+    await listo.wait()
+    segundos = time.perf_counter() - inicio - gateway.armado
+    if memoria:
+        gc.collect()
+        memoria = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    guardados = sum(len(servidor.members) for servidor in cliente.guilds)
+    return segundos, memoria, guardados, cliente
+
+async def main():
+    parser = argparse.ArgumentParser(description="Tiempo hasta on_ready y memoria con servidores grandes")
+    parser.add_argument("--servidores", type=int, default=10)
+    parser.add_argument("--miembros", type=int, default=10000, help="miembros por servidor")
+    parser.add_argument("--jugadores", type=int, default=20000, help="jugadores distintos que pasan por partidas")
+    args = parser.parse_args()
+
+    print(f"{args.servidores} servidores de {args.miembros} miembros")
+    for nombre, al_inicio in (("descargando todos", True), ("sin descargar", False)):
+        segundos, _, guardados, _ = await medir_inicio(al_inicio, args.servidores, args.miembros)
+        _, memoria, _, cliente = await medir_inicio(al_inicio, args.servidores, args.miembros, memoria=True)
+        print(f"  {nombre:18} on_ready en {segundos * 1000:8.1f} ms, {memoria / 1024 / 1024:7.1f} MiB, "
+              f"{guardados} miembros en memoria")
+
+    # Después de muchas partidas la caché de miembros del bot no pasa de su límite
+    servidor = cliente.guilds[0]
+    tracemalloc.start()
+    for i in range(args.jugadores):
+        miembros.guardar(discord.Member(data=datos_miembro(50_000_000 + i), guild=servidor, state=cliente._connection))
+    memoria = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    print(f"  tras {args.jugadores} jugadores: {miembros.cantidad()} en la caché de miembros "
+          f"(límite {miembros.MAX_MIEMBROS}), {memoria / 1024 / 1024:.1f} MiB")
+
+if __name__ == "__main__":
+    asyncio.run(main())
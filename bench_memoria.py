@@ -0,0 +1,99 @@
+# Benchmark: memoria por partida con miles de partidas en curso al mismo tiempo.
+# Compara el diccionario suelto que se usaba antes (miembros como claves, set de vivos)
+# con Partida + motor.EstadoJuego (índices, bytes de roles y bits de vivos).
+# Uso: python bench_memoria.py --partidas 5000 --jugadores 30
+import argparse
+import random
+import time
+import tracemalloc
+
+import falso_discord
+import mafia
+import motor
+
+# Partida con el formato anterior: todo en un diccionario, con los miembros como claves
+def partida_diccionario(servidor, semilla):
+    jugadores = list(servidor.members)
+    semilla, rng = motor.crear_rng(semilla)
+    roles = motor.obtener_roles(jugadores, rng)
+    return {
+        "jugadores": jugadores,
+        "estado": "noche",
+        "creador": jugadores[0],
+        "canal": servidor.canal,
+        "roles": roles,
+        "vivos": set(jugadores),
+        "acciones": {},
+        "num_jugadores": len(jugadores),
+        "duracion_fase": mafia.DURACION_FASE,
+        "fase_completa": None,
+        "semilla": semilla,
+        "rng": rng,
+    }
+
+# Partida con el formato actual
+def partida_compacta(servidor, semilla):
+    creador, *resto = servidor.members
+    partida = mafia.Partida(creador, servidor.canal, len(servidor.members), semilla)
+    for miembro in resto:
+        partida.agregar(miembro)
+    partida.estado = "noche"
+    partida.juego = motor.repartir_roles(len(partida.jugadores), partida.rng)
+    return partida
+
+# Verificación de victoria como se hacía antes: recorriendo los vivos cada vez
+def victoria_diccionario(partida):
+    vivos_roles = [partida["roles"][j] for j in partida["vivos"]]
+    mafias = vivos_roles.count("mafia")
+    no_mafias = len(partida["vivos"]) - mafias
+    if mafias == 0:
+        return "Ciudadanos"
+    if mafias >= no_mafias:
+        return "Mafia"
+    return None
+
+# Crea una partida por servidor con `crear` y devuelve (bytes por partida, partidas creadas)
+def medir_memoria(crear, servidores):
+    tracemalloc.start()
+    antes = tracemalloc.get_traced_memory()[0]
+    creadas = [crear(servidor, i) for i, servidor in enumerate(servidores)]
+    despues = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return (despues - antes) / len(servidores), creadas
+
+def medir_tiempo(funcion, partidas, repeticiones=5):
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        for partida in partidas:
+            funcion(partida)
+    return (time.perf_counter() - inicio) / (repeticiones * len(partidas))
+
+def main():
+    parser = argparse.ArgumentParser(description="Memoria por partida: diccionario vs. formato compacto")
+    parser.add_argument("--partidas", type=int, default=5000)
+    parser.add_argument("--jugadores", type=int, default=30)
+    args = parser.parse_args()
+
+    # Los miembros los crea Discord y existen igual con cualquier formato, así que no se cuentan
+    servidores = [falso_discord.ServidorFalso(args.jugadores, i) for i in range(args.partidas)]
+
+    bytes_dict, con_dict = medir_memoria(partida_diccionario, servidores)
+    bytes_compacta, compactas = medir_memoria(partida_compacta, servidores)
+
+    # Matamos a un par de jugadores al azar en cada una, para que la verificación tenga trabajo
+    rng = random.Random(0)
+    for partida, compacta in zip(con_dict, compactas):
+        for i in rng.sample(range(args.jugadores), 2):
+            partida["vivos"].discard(partida["jugadores"][i])
+            compacta.juego.matar(i)
+
+    t_dict = medir_tiempo(victoria_diccionario, con_dict)
+    t_compacta = medir_tiempo(lambda p: motor.verificar_victoria(p.juego), compactas)
+
+    print(f"{args.partidas} partidas de {args.jugadores} jugadores")
+    print(f"  diccionario: {bytes_dict / 1024:.2f} KiB por partida, victoria en {t_dict * 1e6:.2f} µs")
+    print(f"  compacta:    {bytes_compacta / 1024:.2f} KiB por partida, victoria en {t_compacta * 1e6:.2f} µs")
+    print(f"  ahorro:      {1 - bytes_compacta / bytes_dict:.0%} de memoria")
+
+if __name__ == "__main__":
+    main()
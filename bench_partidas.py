@@ -0,0 +1,148 @@
+# Benchmark: juega miles de partidas completas a través del comando real `!mafia`
+# usando el Discord falso (falso_discord.py), sin conexión y sin esperas.
+# Uso: python bench_partidas.py --partidas 2000 --concurrentes 100 --semilla 1
+# Con --historial CARPETA se guarda el historial de las partidas, para probar repeticion.py.
+# Con --automaticos N, cada partida tiene N jugadores automáticos (ver automaticos.py) y se muestra cuánto
+# tardan en decidir.
+import argparse
+import asyncio
+import gc
+import time
+import tracemalloc
+
+import automaticos
+import falso_discord
+import historial
+import mafia
+import metricas
+import miembros
+import motor
+
+# Tiempo de CPU acumulado por cada fase del motor
+cpu_fases = {}
+
+# Envuelve una función del motor para medir el tiempo de CPU que consume
+def _medir_fase(nombre, funcion):
+    def envoltura(*args, **kwargs):
+        inicio = time.process_time()
+        try:
+            return funcion(*args, **kwargs)
+        finally:
+            cpu_fases[nombre] = cpu_fases.get(nombre, 0.0) + time.process_time() - inicio
+    return envoltura
+
+for _nombre, _fase in (("roles", "repartir_roles"), ("noche", "resolver_noche"), ("victoria", "verificar_victoria")):
+    setattr(motor, _fase, _medir_fase(_nombre, getattr(motor, _fase)))
+# Los votos se cuentan de a uno a medida que llegan (motor.Recuento)
+for _metodo in ("votar", "retirar", "resultado"):
+    setattr(motor.Recuento, _metodo, _medir_fase("votacion", getattr(motor.Recuento, _metodo)))
+
+# Juega una partida completa: el primero la crea, la completa con `automaticos` jugadores automáticos
+# y el resto se une (el último la arranca)
+async def jugar_partida(num_jugadores, semilla, automaticos=0):
+    automaticos = min(automaticos, num_jugadores - 1)
+    servidor = falso_discord.ServidorFalso(num_jugadores - automaticos, semilla)
+    creador, *resto = servidor.members
+    await mafia.mafia(falso_discord.ContextoFalso(creador), "crear", num_jugadores)
+    partida = mafia.partidas[servidor.canal.id]
+    if automaticos:
+        await mafia.mafia(falso_discord.ContextoFalso(creador), "rellenar", automaticos)
+    for miembro in resto:
+        await mafia.mafia(falso_discord.ContextoFalso(miembro), "unirme")
+    # Desde acá la partida avanza sola con el planificador: esperamos a que termine
+    while mafia.partidas.get(servidor.canal.id) is partida:
+        await asyncio.sleep(0.02)
+
+# Juega `total` partidas, con a lo sumo `concurrentes` al mismo tiempo
+async def jugar_lote(total, concurrentes, semilla, min_jugadores, max_jugadores, automaticos=0):
+    semaforo = asyncio.Semaphore(concurrentes)
+    rango = max_jugadores - min_jugadores + 1
+
+    async def una(i):
+        async with semaforo:
+            await jugar_partida(min_jugadores + i % rango, semilla + i, automaticos)
+
+    await asyncio.gather(*(una(i) for i in range(total)))
+    await historial.vaciar()
+
+# Juega `total` partidas de a una con tracemalloc andando. Devuelve, por partida, cuánto pasó el pico de
+# memoria de lo que ya estaba ocupado al empezarla, y la diferencia entre antes y después de todas: con
+# la caché de miembros y sin ella (tiene un límite, y los miembros falsos guardan los mensajes que reciben).
+async def medir_memoria(total, semilla, min_jugadores, max_jugadores, automaticos=0):
+    rango = max_jugadores - min_jugadores + 1
+    filtros = [tracemalloc.Filter(False, tracemalloc.__file__)]
+    antes = tracemalloc.take_snapshot().filter_traces(filtros)
+    picos = []
+    for i in range(total):
+        ocupada = tracemalloc.get_traced_memory()[0]
+        tracemalloc.reset_peak()
+        await jugar_partida(min_jugadores + i % rango, semilla + i, automaticos)
+        picos.append(tracemalloc.get_traced_memory()[1] - ocupada)
+    await historial.vaciar()
+    despues = tracemalloc.take_snapshot().filter_traces(filtros)
+    miembros._cache.clear()
+    gc.collect()
+    sin_cache = tracemalloc.take_snapshot().filter_traces(filtros)
+    return picos, despues.compare_to(antes, "filename"), sin_cache.compare_to(antes, "filename")
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de partidas completas de Mafia")
+    parser.add_argument("--partidas", type=int, default=2000)
+    parser.add_argument("--concurrentes", type=int, default=100)
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--min", type=int, default=4, help="mínimo de jugadores por partida")
+    parser.add_argument("--max", type=int, default=30, help="máximo de jugadores por partida")
+    parser.add_argument("--muestra-memoria", type=int, default=50, help="partidas a medir con tracemalloc")
+    parser.add_argument("--historial", help="carpeta donde guardar el historial de las partidas")
+    parser.add_argument("--automaticos", type=int, default=0, help="jugadores automáticos por partida")
+    parser.add_argument("--estrategia", default="sensata", help="estrategia de los jugadores automáticos")
+    parser.add_argument("--procesos", type=int, default=0, help="procesos para los jugadores automáticos (0: hilos)")
+    args = parser.parse_args()
+    if args.historial:
+        historial.abrir(args.historial)
+
+    # Sin pausas entre rondas: las fases terminan en cuanto todos los jugadores falsos actúan
+    mafia.PAUSA_ENTRE_RONDAS = 0
+    mafia.MAX_AUTOMATICOS = max(mafia.MAX_AUTOMATICOS, args.automaticos)
+    automaticos.configurar(args.estrategia, args.procesos)
+
+    inicio, inicio_cpu = time.perf_counter(), time.process_time()
+    asyncio.run(jugar_lote(args.partidas, args.concurrentes, args.semilla, args.min, args.max, args.automaticos))
+    total, total_cpu = time.perf_counter() - inicio, time.process_time() - inicio_cpu
+
+    print(f"Partidas jugadas: {args.partidas} ({args.min}-{args.max} jugadores, {args.concurrentes} concurrentes)")
+    print(f"Partidas/seg: {args.partidas / total:.1f}")
+    print(f"CPU por partida: {total_cpu / args.partidas * 1000:.3f} ms")
+    for nombre, cpu in cpu_fases.items():
+        print(f"  motor/{nombre}: {cpu / args.partidas * 1000:.4f} ms por partida")
+    enviados = metricas.resumen("mensajes_por_partida")["promedio"]
+    ahorrados = metricas.resumen("mensajes_ahorrados_por_partida")["promedio"]
+    print(f"Mensajes al canal por partida: {enviados:.1f} ({ahorrados:.1f} pedidos ahorrados por la cola)")
+    if args.automaticos:
+        decision = metricas.resumen("decision_automatico")
+        fase = metricas.resumen("decision_automaticos")
+        print(f"Jugadores automáticos ({args.estrategia}, {f'{args.procesos} procesos' if args.procesos else 'hilos'}): "
+              f"cada decisión {decision['promedio'] * 1e6:.1f} µs de promedio "
+              f"(máx {decision['maximo'] * 1000:.2f} ms); ida y vuelta al pool por fase: "
+              f"{fase['promedio'] * 1000:.2f} ms de promedio (máx {fase['maximo'] * 1000:.2f} ms)")
+
+    # Medimos memoria sobre una muestra más chica, porque tracemalloc hace todo mucho más lento
+    if args.muestra_memoria:
+        tracemalloc.start()
+        en_cache = len(miembros._cache)
+        muestra = medir_memoria(args.muestra_memoria, args.semilla, args.min, args.max, args.automaticos)
+        picos, diferencias, sin_cache = asyncio.run(muestra)
+        tracemalloc.stop()
+        retenida = sum(d.size_diff for d in sin_cache) / args.muestra_memoria / 1024
+        en_la_cache = sum(d.size_diff for d in diferencias) / args.muestra_memoria / 1024 - retenida
+        bloques = sum(d.count_diff for d in sin_cache) / args.muestra_memoria
+        print(f"Memoria pico por partida ({args.muestra_memoria} partidas de a una): "
+              f"{sum(picos) / len(picos) / 1024:.1f} KiB de promedio (máx {max(picos) / 1024:.1f} KiB)")
+        print(f"Memoria retenida por partida (lo que creció en las {args.muestra_memoria}, dividido): "
+              f"{retenida:.2f} KiB y {bloques:.1f} bloques, más {en_la_cache:.2f} KiB "
+              f"en la caché de miembros ({en_cache} jugadores antes, hasta {miembros.MAX_MIEMBROS})")
+
+    assert not mafia.partidas, "quedaron partidas sin terminar"
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+# Benchmark: cuánto tarda el bot en recuperar las partidas en curso después de un reinicio.
+# Crea muchas partidas (en noche, con algunas acciones ya hechas) usando el comando real y el Discord
+# falso, con el guardado activado en una carpeta temporal. Después "reinicia" (borra todo lo que
+# está en memoria) y mide leer la foto y el diario y volver a armar todas las partidas. Los jugadores
+# se le vuelven a pedir al Discord falso, que tarda `--latencia` segundos en contestar cada pedido.
+# Uso: python bench_recuperacion.py --partidas 1000 --latencia 0.1
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+
+import falso_discord
+import mafia
+import persistencia
+import planificador
+
+# Crea una partida con jugadores que no hacen clic solos, la arranca y hace actuar a algunos
+async def crear_partida(num_jugadores, rng):
+    servidor = falso_discord.ServidorFalso(0, rng.random())
+    for i in range(num_jugadores):
+        servidor.members.append(falso_discord.MiembroFalso(servidor, f"jugador{i + 1}", automatico=False))
+    creador, *resto = servidor.members
+    await mafia.mafia(falso_discord.ContextoFalso(creador), "crear", num_jugadores)
+    for miembro in resto:
+        await mafia.mafia(falso_discord.ContextoFalso(miembro), "unirme")
+
+    # La mitad de los que tienen que actuar ya eligieron a alguien
+    partida = mafia.partidas[servidor.canal.id]
+    for jugador in list(partida.esperados)[::2]:
+        miembro = partida.jugadores[jugador]
+        mensaje = miembro.mensajes[-1]
+        await falso_discord.clickear(miembro, mensaje)
+    return servidor
+
+# Lo que importa de una partida para comparar antes y después de recuperarla
+def resumen(partida):
+    return ([j.id for j in partida.jugadores], partida.estado, partida.fase, partida.juego.roles,
+            partida.juego.vivos, partida.acciones, partida.esperados, partida.votos)
+
+async def main():
+    parser = argparse.ArgumentParser(description="Tiempo de recuperación de partidas tras un reinicio")
+    parser.add_argument("--partidas", type=int, default=1000)
+    parser.add_argument("--semilla", type=int, default=1)
+    parser.add_argument("--eventos-por-foto", type=int, default=0,
+                        help="0 = sin fotos intermedias: todo se recupera desde el diario (el peor caso)")
+    parser.add_argument("--latencia", type=float, default=0.1, help="segundos que tarda Discord en contestar cada pedido de miembros")
+    args = parser.parse_args()
+    persistencia.EVENTOS_POR_FOTO = args.eventos_por_foto or float("inf")
+
+    rng = random.Random(args.semilla)
+    with tempfile.TemporaryDirectory() as directorio:
+        await persistencia.abrir(directorio)
+        servidores = []
+        for i in range(args.partidas):
+            servidores.append(await crear_partida(rng.randint(4, 30), rng))
+            if i % 50 == 49:
+                await persistencia.vaciar() # Una tanda cada tanto, como haría el planificador
+        await persistencia.vaciar()
+        antes = {canal: resumen(partida) for canal, partida in mafia.partidas.items()}
+        canales = {s.canal.id: s.canal for s in servidores}
+        tamanio = sum(os.path.getsize(os.path.join(directorio, a)) for a in os.listdir(directorio))
+
+        # "Reinicio": se pierde todo lo que estaba en memoria
+        mafia.partidas.clear()
+        mafia.partidas_por_servidor.clear()
+        mafia.partida_de_jugador.clear()
+        planificador.limpiar()
+        persistencia.activa = False
+        # Como el bot por defecto, no tiene a los miembros en caché: se los pide a Discord
+        falso_discord.CACHE_MIEMBROS = False
+        falso_discord.LATENCIA = args.latencia
+        jugadores = sum(len(partida[0]) for partida in antes.values())
+
+        inicio = time.perf_counter()
+        _, eventos = persistencia.leer(directorio)
+        lectura = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        await persistencia.abrir(directorio) # Vuelve a leer y además escribe una foto nueva
+        apertura = time.perf_counter() - inicio
+        inicio = time.perf_counter()
+        cantidad = await mafia.recuperar_partidas(persistencia.registros, canales.get)
+        reconstruccion = time.perf_counter() - inicio
+
+        despues = {canal: resumen(partida) for canal, partida in mafia.partidas.items()}
+        assert despues == antes, "las partidas recuperadas no coinciden con las originales"
+        persistencia.activa = False # La carpeta temporal se borra al salir: dejamos de guardar
+
+    print(f"Partidas recuperadas: {cantidad} (de {args.partidas})")
+    print(f"En disco: {tamanio / 1024:.1f} KiB, {eventos} eventos en el diario además de la foto")
+    print(f"Lectura de foto + diario: {lectura * 1000:.1f} ms")
+    print(f"Apertura (lectura + foto nueva): {apertura * 1000:.1f} ms")
+    print(f"Reconstrucción de las partidas: {reconstruccion * 1000:.1f} ms ({reconstruccion / cantidad * 1e6:.1f} µs por partida)")
+    print(f"Recuperación completa: {(apertura + reconstruccion) * 1000:.1f} ms")
+    print(f"Pedidos de miembros a Discord: {falso_discord.pedidos_miembros} para {jugadores} jugadores "
+          f"(de a uno y en fila serían {jugadores * args.latencia:.1f} s solo de esperas)")
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,88 @@
+# Comprueba que el recuento incremental de votos (motor.Recuento) da siempre lo mismo que contar de
+# cero: juega muchas votaciones al azar (votos, cambios de voto y votos retirados) y después de cada
+# paso compara el conteo, el máximo, el resultado y el orden con los de un recuento hecho a mano.
+# Sale con error en la primera diferencia, mostrando los votos con que se dio.
+# Uso: python comprobar_recuento.py --votaciones 20000 --semilla 1
+import argparse
+import random
+import sys
+
+import motor
+
+# El recuento de siempre, recorriendo todos los votos: (conteo, máximo, eliminado, candidatos)
+def contar_de_cero(votos):
+    conteo = {}
+    for elegido in votos.values():
+        conteo[elegido] = conteo.get(elegido, 0) + 1
+    maximo = max(conteo.values(), default=0)
+    candidatos = {jugador for jugador, cantidad in conteo.items() if cantidad == maximo}
+    eliminado = next(iter(candidatos)) if len(candidatos) == 1 else None
+    return conteo, maximo, eliminado, candidatos
+
+# Lo que tiene que cumplir el recuento después de cada paso. Devuelve qué no coincide, o None.
+def diferencia(recuento, votos):
+    conteo, maximo, eliminado, candidatos = contar_de_cero(votos)
+    if recuento.votos != votos:
+        return "votos"
+    if recuento.conteo != conteo:
+        return "conteo"
+    if recuento.maximo != maximo:
+        return "máximo"
+    if {cantidad: set(grupo) for cantidad, grupo in recuento.con.items()} != _agrupar(conteo):
+        return "jugadores por cantidad de votos"
+    elegido, empatados = recuento.resultado()
+    if elegido != eliminado or set(empatados) != candidatos or len(empatados) != len(candidatos):
+        return "resultado"
+    cantidades = [cantidad for _, cantidad in recuento.ordenados()]
+    if cantidades != sorted(conteo.values(), reverse=True) or {j for j, _ in recuento.ordenados()} != set(conteo):
+        return "orden"
+    if len(recuento) != len(votos):
+        return "cantidad de votantes"
+    return None
+
+def _agrupar(conteo):
+    grupos = {}
+    for jugador, cantidad in conteo.items():
+        grupos.setdefault(cantidad, set()).add(jugador)
+    return grupos
+
+# Una votación al azar entre `jugadores`, comprobando cada paso. Devuelve la diferencia encontrada
+# (con los votos en ese momento), o None si todo coincidió.
+def comprobar_votacion(rng, jugadores, pasos):
+    recuento = motor.Recuento()
+    votos = {}
+    for _ in range(pasos):
+        votante = rng.randrange(jugadores)
+        if votante in votos and rng.random() < 0.25:
+            recuento.retirar(votante)
+            del votos[votante]
+        else:
+            # Pocos elegidos posibles, así hay empates y cambios de máximo seguido
+            elegido = rng.randrange(min(jugadores, rng.choice((2, 3, jugadores))))
+            recuento.votar(votante, elegido)
+            votos[votante] = elegido
+        problema = diferencia(recuento, votos)
+        if problema:
+            return problema, dict(votos)
+    # Armarlo de una vez con los votos finales (como al recuperar una partida) también tiene que coincidir
+    problema = diferencia(motor.Recuento(votos), votos)
+    return (problema, dict(votos)) if problema else None
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara el recuento incremental de votos con contar de cero")
+    parser.add_argument("--votaciones", type=int, default=20000)
+    parser.add_argument("--semilla", type=int, default=1)
+    args = parser.parse_args()
+
+    rng = random.Random(args.semilla)
+    for numero in range(args.votaciones):
+        jugadores = rng.randint(2, 30)
+        fallo = comprobar_votacion(rng, jugadores, rng.randint(1, 4 * jugadores))
+        if fallo:
+            problema, votos = fallo
+            print(f"Votación {numero} ({jugadores} jugadores): no coincide {problema} con los votos {votos}")
+            sys.exit(1)
+    print(f"{args.votaciones} votaciones al azar: el recuento incremental coincide en cada paso")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+# Envío de mensajes privados (DMs) en paralelo, con un límite de envíos simultáneos
+import asyncio
+import aiohttp
+import discord
+import mensajes
+import metricas
+
+# Cantidad máxima de DMs en vuelo al mismo tiempo, sumando todas las partidas.
+# discord.py ya espera solo cuando un bucket de rate limit (por ruta o global) está agotado,
+# pero si disparamos todo junto el bucket compartido de "abrir DM" se agota enseguida
+# y terminamos esperando igual. Con un límite moderado los envíos fluyen sin chocar.
+MAX_DMS_CONCURRENTES = 8
+
+_semaforo = None
+
+# Creamos el semáforo la primera vez que se usa (así queda atado al event loop del bot)
+def _obtener_semaforo():
+    global _semaforo
+    if _semaforo is None:
+        _semaforo = asyncio.Semaphore(MAX_DMS_CONCURRENTES)
+    return _semaforo
+
+# Envía un DM a un jugador respetando el límite global. Devuelve True si se pudo enviar.
+async def _enviar_uno(jugador, contenido, view):
+    async with _obtener_semaforo():
+        try:
+            with metricas.medir("envio", destino="dm"):
+                if view is None:
+                    await jugador.send(contenido)
+                else:
+                    await jugador.send(contenido, view=view)
+            return True
+        except discord.HTTPException as e:
+            # Por ejemplo, el jugador tiene bloqueados los mensajes del servidor
+            metricas.contar("dms_fallidos", codigo=e.code)
+            return False
+        except (aiohttp.ClientError, OSError, asyncio.TimeoutError):
+            # Se cortó la conexión o no contestó: para ese jugador es como si tuviera los DMs cerrados,
+            # y los demás envíos siguen
+            metricas.contar("dms_fallidos", codigo="red")
+            return False
+
+# Envía todos los DMs de la lista en paralelo (salvo a los bots).
+# `envios` es una lista de tuplas (jugador, contenido) o (jugador, contenido, view).
+# Si alguno falla, avisamos en el canal con UN solo mensaje que agrupa a todos los que fallaron
+# (por la cola del canal, así puede salir junto con otros textos de la partida).
+# `metrica` es el nombre bajo el que se registra cuánto tardó todo el envío. Si `vigente` devuelve False
+# cuando terminan los envíos (por ejemplo, la partida se canceló mientras tanto), no se avisa nada.
+# Devuelve la lista de jugadores a los que no se les pudo enviar.
+async def enviar_dms(canal, envios, aviso_fallo, metrica="fanout_dms", vigente=None):
+    # Los jugadores automáticos (ver automaticos.py) no tienen DMs
+    envios = [envio for envio in envios if not envio[0].bot]
+    if not envios:
+        return []
+
+    with metricas.medir(metrica):
+        resultados = await asyncio.gather(*[
+            _enviar_uno(envio[0], envio[1], envio[2] if len(envio) > 2 else None)
+            for envio in envios
+        ])
+
+    fallidos = [envio[0] for envio, ok in zip(envios, resultados) if not ok]
+
+    # Avisamos todos los fallos juntos en lugar de un mensaje por jugador
+    if fallidos and (vigente is None or vigente()):
+        nombres = ", ".join(j.display_name for j in fallidos)
+        mensajes.encolar(canal, f"⚠️ {aviso_fallo}: {nombres}.")
+
+    return fallidos
@@ -0,0 +1,167 @@
+# Objetos falsos que imitan lo mínimo de Discord (servidor, canal, miembro, interacción)
+# para poder correr partidas completas del bot sin conexión, por ejemplo en los benchmarks.
+# Los miembros falsos pueden "jugar solos": cuando reciben botones, hacen clic en uno al azar.
+import asyncio
+import itertools
+import random
+
+import discord
+
+_ids = itertools.count(1)
+LATENCIA = 0  # Segundos que tarda cada pedido de miembros a Discord (fetch_member, query_members)
+pedidos_miembros = 0 # Cuántos pedidos de miembros se hicieron
+# Si get_member encuentra a los miembros (como discord.py con MAFIA_MIEMBROS_AL_INICIO=1). Con False hay que
+# pedírselos a Discord, como hace el bot por defecto.
+CACHE_MIEMBROS = True
+
+# Mensaje enviado a un canal o DM. Guardamos el contenido y la vista por si se quieren revisar.
+class MensajeFalso:
+    def __init__(self, canal, content=None, view=None, embed=None):
+        self.id = next(_ids)
+        self.channel = canal
+        self.content = content
+        self.view = view
+        self.embed = embed
+
+    async def edit(self, content=None, view=None, embed=None):
+        if content is not None:
+            self.content = content
+        if view is not None:
+            self.view = view
+        if embed is not None:
+            self.embed = embed
+        return self
+
+# Respuesta de una interacción: solo registra que ya se respondió
+class RespuestaFalsa:
+    def __init__(self):
+        self.respondida = False
+        self.mensajes = []
+
+    def is_done(self):
+        return self.respondida
+
+    async def send_message(self, content=None, ephemeral=False, **kwargs):
+        self.respondida = True
+        self.mensajes.append(content)
+
+    async def defer(self, **kwargs):
+        self.respondida = True
+
+# Interacción de un usuario con un componente (botón o menú)
+class InteraccionFalsa:
+    def __init__(self, user, message=None, data=None):
+        self.id = next(_ids)
+        self.user = user
+        self.message = message
+        self.data = data or {}
+        self.response = RespuestaFalsa()
+        self.created_at = discord.utils.utcnow() # Momento del clic, como el que Discord saca del id
+
+# Servidor falso: tiene miembros y un generador aleatorio propio para que las partidas sean reproducibles
+class ServidorFalso:
+    def __init__(self, num_miembros=0, semilla=None):
+        self.id = next(_ids)
+        self.rng = random.Random(semilla)
+        self.members = []
+        self.canal = CanalFalso(self)
+        for i in range(num_miembros):
+            self.members.append(MiembroFalso(self, f"jugador{i + 1}"))
+
+    def get_member(self, id):
+        return self._buscar(id) if CACHE_MIEMBROS else None
+
+    def _buscar(self, id):
+        for miembro in self.members:
+            if miembro.id == id:
+                return miembro
+        return None
+
+    async def fetch_member(self, id):
+        global pedidos_miembros
+        pedidos_miembros += 1
+        await asyncio.sleep(LATENCIA)
+        miembro = self._buscar(id)
+        if miembro is None:
+            raise discord.NotFound(_RespuestaHTTP(404), "Unknown Member")
+        return miembro
+
+    async def query_members(self, query=None, *, limit=5, user_ids=None, presences=False, cache=True):
+        global pedidos_miembros
+        pedidos_miembros += 1
+        await asyncio.sleep(LATENCIA)
+        return [miembro for miembro in self.members if miembro.id in user_ids][:limit]
+
+# Lo mínimo de una respuesta HTTP que necesitan las excepciones de discord.py
+class _RespuestaHTTP:
+    def __init__(self, status):
+        self.status = status
+        self.reason = ""
+
+# Miembro falso. Si `automatico` es True, hace clic solo en los botones que recibe por DM.
+class MiembroFalso:
+    def __init__(self, guild, nombre, automatico=True):
+        self.id = next(_ids)
+        self.guild = guild
+        self.name = nombre
+        self.display_name = nombre
+        self.mention = f"<@{self.id}>"
+        self.bot = False
+        self.automatico = automatico
+        self.mensajes = []
+
+    def __repr__(self):
+        return f"<MiembroFalso {self.display_name}>"
+
+    async def send(self, content=None, *, view=None, embed=None):
+        mensaje = MensajeFalso(self, content, view, embed)
+        self.mensajes.append(mensaje)
+        if view is not None and self.automatico:
+            _programar(clickear(self, mensaje))
+        return mensaje
+
+# Canal de texto falso. Cuando se manda un mensaje con botones, todos los miembros automáticos hacen clic.
+class CanalFalso:
+    def __init__(self, guild):
+        self.id = next(_ids)
+        self.guild = guild
+        self.mensajes = []
+
+    async def send(self, content=None, *, view=None, embed=None, embeds=None):
+        mensaje = MensajeFalso(self, content, view, embed)
+        self.mensajes.append(mensaje)
+        if view is not None:
+            for miembro in self.guild.members:
+                if miembro.automatico:
+                    _programar(clickear(miembro, mensaje))
+        return mensaje
+
+# Contexto de un comando (lo que recibe `mafia(ctx, ...)`)
+class ContextoFalso:
+    def __init__(self, autor, canal=None):
+        self.author = autor
+        self.guild = autor.guild
+        self.channel = canal or autor.guild.canal
+
+    async def send(self, content=None, **kwargs):
+        return await self.channel.send(content, **kwargs)
+
+# Tareas de clics pendientes (guardamos la referencia para que no las borre el recolector de basura)
+_tareas = set()
+
+def _programar(coro):
+    tarea = asyncio.get_running_loop().create_task(coro)
+    _tareas.add(tarea)
+    tarea.add_done_callback(_tareas.discard)
+
+# Elige al azar uno de los componentes del mensaje y hace clic como `miembro`.
+# Si es un menú desplegable, elige también una de sus opciones al azar.
+async def clickear(miembro, mensaje):
+    componentes = [c for c in mensaje.view.children if getattr(c, "callback", None)]
+    if not componentes:
+        return
+    componente = miembro.guild.rng.choice(componentes)
+    # Los menús del bot vienen envueltos en un DynamicItem: las opciones están en el ítem de adentro
+    opciones = getattr(getattr(componente, "item", componente), "options", None)
+    datos = {"values": [miembro.guild.rng.choice(opciones).value]} if opciones else None
+    await componente.callback(InteraccionFalsa(miembro, mensaje, datos))
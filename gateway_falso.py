@@ -0,0 +1,350 @@
+# Discord local para pruebas de carga: un gateway (websocket) y una API REST falsos en un solo servidor
+# aiohttp, para conectar el bot real (mafia.bot, sin cambios) sin salir de la máquina (ver bench_carga.py).
+# Corre en su propio proceso, así lo que gasta en armar eventos no se le cuenta al event loop del bot.
+#
+# Qué hace:
+#  - Gateway: HELLO, IDENTIFY, READY y un GUILD_CREATE por servidor; después, MESSAGE_CREATE con los
+#    comandos de los jugadores e INTERACTION_CREATE con sus clics. Con shards (varias conexiones, quizás
+#    desde varios procesos), cada servidor va por su shard y los clics en DMs por el shard 0, como en Discord.
+#  - REST: lo mínimo que usa el bot (login, mensajes a canales y sus ediciones, abrir DMs, responder
+#    interacciones).
+#    Una parte de los envíos responde 429 (configurable) para que discord.py tenga que esperar, y
+#    algunos jugadores tienen los DMs cerrados (403), como pasa de verdad.
+#  - Jugadores: cuando el bot manda un mensaje con menús, cada jugador (en el DM) o cada miembro del
+#    servidor (en el canal) elige una opción al azar después de "pensar" un rato.
+#  - Control: el proceso que corre el bot pide rondas de partidas y lee los resultados por HTTP.
+# Mide desde que manda cada INTERACTION_CREATE hasta que el bot responde: es lo que Discord compara
+# con su plazo de 3 segundos.
+import asyncio
+import itertools
+import json
+import random
+import time
+
+from aiohttp import web
+
+EPOCA_DISCORD = 1420070400000  # Milisegundos de 2015-01-01, desde donde cuenta Discord sus ids
+INTERVALO_LATIDO = 41250  # Milisegundos entre heartbeats que le pedimos al bot (el valor de Discord)
+
+_secuencia = itertools.count()
+
+# Id con el formato de Discord: el momento de creación va en los bits altos (discord.py lo usa para
+# `created_at`, así que la métrica de interacción a respuesta del bot también da bien)
+def nuevo_id():
+    return ((int(time.time() * 1000) - EPOCA_DISCORD) << 22) | (next(_secuencia) & 0x3FFFFF)
+
+# Respuesta JSON con el Content-Type exacto que espera discord.py (sin "; charset=...")
+def responder_json(datos, status=200, headers=None):
+    return web.Response(body=json.dumps(datos).encode(), status=status,
+                        headers={"Content-Type": "application/json", **(headers or {})})
+
+def ahora_iso():
+    return time.strftime("%Y-%m-%dT%H:%M:%S+00:00", time.gmtime())
+
+def percentiles(valores):
+    if not valores:
+        return {"cantidad": 0, "p50": 0.0, "p99": 0.0, "maximo": 0.0}
+    valores = sorted(valores)
+    return {
+        "cantidad": len(valores),
+        "p50": valores[len(valores) // 2],
+        "p99": valores[min(len(valores) - 1, len(valores) * 99 // 100)],
+        "maximo": valores[-1],
+    }
+
+class DiscordLocal:
+    # `servidores`: cuántos servidores hay (cada uno con un canal y `jugadores` miembros; juega una partida
+    # por ronda). `pensar`: segundos máximos que tarda un jugador en elegir. `actividad`: probabilidad de
+    # que un jugador elija algo. `tasa_429`: fracción de envíos que responden 429 y esperan `espera_429`.
+    # `dms_cerrados`: fracción de jugadores que no reciben DMs.
+    def __init__(self, servidores, jugadores, pensar=1.0, actividad=0.9, tasa_429=0.0, espera_429=0.5,
+                 dms_cerrados=0.0, semilla=1):
+        self.rng = random.Random(semilla)
+        self.pensar = pensar
+        self.actividad = actividad
+        self.tasa_429 = tasa_429
+        self.espera_429 = espera_429
+        self.usuario_bot = self.usuario(nuevo_id(), "mafia", bot=True)
+        self.aplicacion = nuevo_id()
+        self.conexiones = {} # shard -> websocket
+        self.shards = 1
+        self.secuencia = 0
+        self.tareas = set()
+
+        self.servidores = [] # Lista de (id del servidor, id del canal, [usuarios])
+        self.canales = {} # id del canal de texto -> posición en `servidores`
+        self.usuarios = {} # id -> datos del usuario
+        self.dms = {} # id del canal de DM -> id del usuario
+        self.dm_de = {} # id del usuario -> id de su canal de DM
+        self.sin_dm = set() # ids de usuarios con los DMs cerrados
+        for _ in range(servidores):
+            usuarios = []
+            for _ in range(jugadores):
+                usuario = self.usuario(nuevo_id(), f"jugador{len(self.usuarios) + 1}")
+                self.usuarios[int(usuario["id"])] = usuario
+                if self.rng.random() < dms_cerrados:
+                    self.sin_dm.add(int(usuario["id"]))
+                usuarios.append(usuario)
+            canal = nuevo_id()
+            self.canales[canal] = len(self.servidores)
+            self.servidores.append((nuevo_id(), canal, usuarios))
+
+        self.creadas = {} # posición del servidor -> asyncio.Event (el bot confirmó que creó la partida)
+        self.reiniciar_ronda()
+
+    # --------- Datos con el formato de Discord ---------
+    def usuario(self, usuario_id, nombre, bot=False):
+        return {"id": str(usuario_id), "username": nombre, "discriminator": "0", "global_name": None,
+                "avatar": None, "bot": bot}
+
+    def miembro(self, usuario):
+        return {"user": usuario, "roles": [], "joined_at": "2024-01-01T00:00:00+00:00", "deaf": False,
+                "mute": False, "flags": 0, "permissions": "0"}
+
+    def servidor(self, servidor_id, canal_id):
+        return {
+            "id": str(servidor_id), "name": f"servidor{servidor_id}", "member_count": 0, "large": False,
+            "unavailable": False, "owner_id": self.usuario_bot["id"], "roles": [{"id": str(servidor_id),
+            "name": "@everyone", "permissions": "0", "position": 0, "color": 0, "hoist": False, "managed": False,
+            "mentionable": False}], "channels": [{"id": str(canal_id), "type": 0, "name": "mafia", "position": 0,
+            "permission_overwrites": []}], "members": [], "emojis": [], "stickers": [], "features": [],
+            "threads": [], "presences": [], "voice_states": [],
+        }
+
+    def mensaje(self, canal_id, autor, contenido, servidor_id=None, cuerpo=None):
+        cuerpo = cuerpo or {}
+        mensaje = {
+            "id": str(nuevo_id()), "channel_id": str(canal_id), "author": autor, "content": contenido or "",
+            "timestamp": ahora_iso(), "edited_timestamp": None, "tts": False, "mention_everyone": False,
+            "mentions": [], "mention_roles": [], "attachments": [], "embeds": cuerpo.get("embeds", []),
+            "pinned": False, "type": 0, "flags": 0, "components": cuerpo.get("components", []),
+        }
+        if servidor_id is not None:
+            mensaje["guild_id"] = str(servidor_id)
+        return mensaje
+
+    # --------- Gateway ---------
+    # Shard por el que va un servidor (la cuenta de Discord); lo que no es de un servidor va por el 0
+    def shard_de(self, servidor_id):
+        return (servidor_id >> 22) % self.shards if servidor_id is not None else 0
+
+    async def despachar(self, evento, datos, servidor_id=None, ws=None):
+        self.secuencia += 1
+        ws = ws or self.conexiones[self.shard_de(servidor_id)]
+        await ws.send_str(json.dumps({"op": 0, "t": evento, "s": self.secuencia, "d": datos}))
+
+    async def gateway(self, pedido):
+        ws = web.WebSocketResponse(max_msg_size=0)
+        await ws.prepare(pedido)
+        await ws.send_str(json.dumps({"op": 10, "d": {"heartbeat_interval": INTERVALO_LATIDO}}))
+        async for mensaje in ws:
+            datos = json.loads(mensaje.data)
+            if datos["op"] == 1: # Heartbeat
+                await ws.send_str(json.dumps({"op": 11}))
+            elif datos["op"] == 2: # Identify
+                shard, self.shards = datos["d"].get("shard") or (0, 1)
+                self.conexiones[shard] = ws
+                propios = [(s, c) for s, c, _ in self.servidores if self.shard_de(s) == shard]
+                await self.despachar("READY", {
+                    "v": 10, "user": self.usuario_bot, "session_id": f"local-{shard}", "resume_gateway_url": "",
+                    "guilds": [{"id": str(s), "unavailable": True} for s, _ in propios],
+                    "application": {"id": str(self.aplicacion), "flags": 0}, "shard": [shard, self.shards],
+                }, ws=ws)
+                for servidor_id, canal_id in propios:
+                    await self.despachar("GUILD_CREATE", self.servidor(servidor_id, canal_id), ws=ws)
+        return ws
+
+    # --------- Rondas de partidas ---------
+    def reiniciar_ronda(self):
+        self.latencias = []
+        self.enviadas = {} # id de la interacción -> momento en que se mandó
+        self.pendientes = 0 # Partidas de la ronda que todavía no terminaron
+        self.duraciones = []
+        self.pedidos = 0
+        self.ediciones = 0
+        self.respuestas_429 = 0
+        self.dms_fallidos = 0
+        self.inicio_ronda = time.perf_counter()
+        self.inicio_partida = {}
+
+    def _lanzar(self, coro):
+        tarea = asyncio.get_running_loop().create_task(coro)
+        self.tareas.add(tarea)
+        tarea.add_done_callback(self.tareas.discard)
+
+    # Un servidor juega una partida: el primero la crea y, cuando el bot confirma, se unen los demás
+    async def jugar(self, posicion):
+        servidor_id, canal_id, usuarios = self.servidores[posicion]
+        creada = self.creadas[posicion] = asyncio.Event()
+        self.inicio_partida[posicion] = time.perf_counter()
+        await self.comando(servidor_id, canal_id, usuarios[0], f"!mafia crear {len(usuarios)}")
+        await creada.wait()
+        for usuario in usuarios[1:]:
+            await self.comando(servidor_id, canal_id, usuario, "!mafia unirme")
+
+    async def comando(self, servidor_id, canal_id, usuario, texto):
+        mensaje = self.mensaje(canal_id, usuario, texto, servidor_id)
+        mensaje["member"] = {k: v for k, v in self.miembro(usuario).items() if k != "user"}
+        await self.despachar("MESSAGE_CREATE", mensaje, servidor_id)
+
+    # Un jugador "piensa" y elige una opción al azar de alguno de los menús del mensaje
+    async def clickear(self, usuario, mensaje, servidor_id=None):
+        await asyncio.sleep(self.rng.uniform(0, self.pensar))
+        menus = [c for fila in mensaje["components"] for c in fila.get("components", []) if c.get("options")]
+        if not menus:
+            return
+        menu = self.rng.choice(menus)
+        interaccion_id = nuevo_id()
+        datos = {
+            "id": str(interaccion_id), "application_id": str(self.aplicacion), "type": 3, "token": f"t{interaccion_id}",
+            "version": 1, "attachment_size_limit": 8 * 1024 * 1024, "locale": "es-ES", "message": mensaje,
+            "data": {"custom_id": menu["custom_id"], "component_type": 3, "values": [self.rng.choice(menu["options"])["value"]]},
+        }
+        if servidor_id is None:
+            datos["user"] = usuario
+            datos["channel"] = {"id": mensaje["channel_id"], "type": 1, "recipients": [usuario]}
+        else:
+            datos["guild_id"] = str(servidor_id)
+            datos["member"] = self.miembro(usuario)
+            datos["channel"] = {"id": mensaje["channel_id"], "type": 0, "guild_id": str(servidor_id)}
+        self.enviadas[interaccion_id] = time.perf_counter()
+        await self.despachar("INTERACTION_CREATE", datos, servidor_id)
+
+    # Mira los mensajes del bot en los canales para saber cuándo se creó y cuándo terminó cada partida
+    def revisar_canal(self, posicion, contenido):
+        if "Partida creada" in contenido and posicion in self.creadas:
+            self.creadas[posicion].set()
+        if any(fin in contenido for fin in ("PARTIDA HA TERMINADO", "🛑", "💤", "💥", "⌛ La partida se canceló")):
+            inicio = self.inicio_partida.pop(posicion, None)
+            if inicio is not None:
+                self.duraciones.append(time.perf_counter() - inicio)
+                self.pendientes -= 1
+
+    # --------- REST ---------
+    def limitado(self):
+        if self.rng.random() >= self.tasa_429:
+            return None
+        self.respuestas_429 += 1
+        return responder_json({"message": "You are being rate limited.", "retry_after": self.espera_429,
+                                  "global": False}, status=429,
+                                 headers={"Via": "1.1 google", "Retry-After": str(self.espera_429)})
+
+    async def yo(self, pedido):
+        return responder_json(self.usuario_bot)
+
+    async def gateway_bot(self, pedido):
+        return responder_json({"url": f"ws://{pedido.host}/gateway", "shards": self.shards,
+                               "session_start_limit": {"total": 1000, "remaining": 1000, "reset_after": 0,
+                                                       "max_concurrency": 1}})
+
+    async def aplicacion_bot(self, pedido):
+        return responder_json({"id": str(self.aplicacion), "name": "mafia", "description": "", "icon": None,
+                               "bot_public": True, "bot_require_code_grant": False, "owner": self.usuario_bot,
+                               "verify_key": "", "flags": 0})
+
+    async def abrir_dm(self, pedido):
+        self.pedidos += 1
+        usuario_id = int((await pedido.json())["recipient_id"])
+        canal = self.dm_de.get(usuario_id)
+        if canal is None:
+            canal = self.dm_de[usuario_id] = nuevo_id()
+            self.dms[canal] = usuario_id
+        return responder_json({"id": str(canal), "type": 1, "recipients": [self.usuarios[usuario_id]]})
+
+    async def enviar_mensaje(self, pedido):
+        self.pedidos += 1
+        respuesta = self.limitado()
+        if respuesta is not None:
+            return respuesta
+        canal = int(pedido.match_info["canal"])
+        cuerpo = await pedido.json()
+        usuario_id = self.dms.get(canal)
+        if usuario_id in self.sin_dm:
+            self.dms_fallidos += 1
+            return responder_json({"message": "Cannot send messages to this user", "code": 50007}, status=403)
+        posicion = self.canales.get(canal)
+        servidor_id = self.servidores[posicion][0] if posicion is not None else None
+        mensaje = self.mensaje(canal, self.usuario_bot, cuerpo.get("content"), servidor_id, cuerpo)
+        if posicion is not None:
+            self.revisar_canal(posicion, mensaje["content"])
+        if mensaje["components"]:
+            if usuario_id is not None:
+                if self.rng.random() < self.actividad:
+                    self._lanzar(self.clickear(self.usuarios[usuario_id], mensaje))
+            elif posicion is not None:
+                for usuario in self.servidores[posicion][2]:
+                    if self.rng.random() < self.actividad:
+                        self._lanzar(self.clickear(usuario, mensaje, servidor_id))
+        return responder_json(mensaje)
+
+    async def editar_mensaje(self, pedido):
+        self.pedidos += 1
+        self.ediciones += 1
+        respuesta = self.limitado()
+        if respuesta is not None:
+            return respuesta
+        canal = int(pedido.match_info["canal"])
+        cuerpo = await pedido.json()
+        posicion = self.canales.get(canal)
+        servidor_id = self.servidores[posicion][0] if posicion is not None else None
+        mensaje = self.mensaje(canal, self.usuario_bot, cuerpo.get("content"), servidor_id, cuerpo)
+        mensaje["id"] = pedido.match_info["mensaje"]
+        mensaje["edited_timestamp"] = ahora_iso()
+        return responder_json(mensaje)
+
+    async def responder_interaccion(self, pedido):
+        interaccion_id = int(pedido.match_info["interaccion"])
+        enviada = self.enviadas.pop(interaccion_id, None)
+        if enviada is not None:
+            self.latencias.append(time.perf_counter() - enviada)
+        return responder_json({"interaction": {"id": str(interaccion_id), "type": 3,
+                                                  "response_message_loading": False,
+                                                  "response_message_ephemeral": True}})
+
+    # --------- Control (lo usa bench_carga.py) ---------
+    async def nueva_ronda(self, pedido):
+        partidas = min((await pedido.json())["partidas"], len(self.servidores))
+        self.reiniciar_ronda()
+        self.pendientes = partidas
+        for posicion in range(partidas):
+            self._lanzar(self.jugar(posicion))
+        return responder_json({"partidas": partidas})
+
+    async def estado(self, pedido):
+        return responder_json({
+            "pendientes": self.pendientes, "segundos": time.perf_counter() - self.inicio_ronda,
+            "respuestas": percentiles(self.latencias), "tarde": sum(1 for l in self.latencias if l > 3),
+            "sin_respuesta": len(self.enviadas), "duracion_partida": percentiles(self.duraciones),
+            "pedidos": self.pedidos, "respuestas_429": self.respuestas_429, "dms_fallidos": self.dms_fallidos,
+            "ediciones": self.ediciones,
+            "cpu": time.process_time(),
+        })
+
+    def aplicacion_web(self):
+        app = web.Application()
+        app.add_routes([
+            web.get("/gateway", self.gateway),
+            web.get("/api/v10/users/@me", self.yo),
+            web.get("/api/v10/gateway/bot", self.gateway_bot),
+            web.get("/api/v10/oauth2/applications/@me", self.aplicacion_bot),
+            web.post("/api/v10/users/@me/channels", self.abrir_dm),
+            web.post("/api/v10/channels/{canal}/messages", self.enviar_mensaje),
+            web.patch("/api/v10/channels/{canal}/messages/{mensaje}", self.editar_mensaje),
+            web.post("/api/v10/interactions/{interaccion}/{token}/callback", self.responder_interaccion),
+            web.post("/control/ronda", self.nueva_ronda),
+            web.get("/control/estado", self.estado),
+        ])
+        return app
+
+# Punto de entrada del proceso: arma el Discord local, avisa por `cola` en qué puerto quedó y atiende
+# hasta que lo terminen
+def correr(cola, opciones):
+    async def principal():
+        discord_local = DiscordLocal(**opciones)
+        corredor = web.AppRunner(discord_local.aplicacion_web(), access_log=None)
+        await corredor.setup()
+        sitio = web.TCPSite(corredor, "127.0.0.1", 0)
+        await sitio.start()
+        cola.put(sitio._server.sockets[0].getsockname()[1])
+        await asyncio.Event().wait()
+    asyncio.run(principal())
@@ -0,0 +1,67 @@
+# Historial de las partidas jugadas, para poder repetirlas después sin Discord (ver repeticion.py).
+# A diferencia del guardado de persistencia.py, que se compacta y solo sirve para retomar las partidas
+# en curso, el historial no se borra nunca: un archivo por día con un evento por línea (JSON), de
+# todas las partidas mezcladas y en orden. Los jugadores van por índice, sin ids ni nombres de Discord.
+#
+# Eventos, siempre [tipo, id del canal, datos...]:
+#   ["inicio", canal, semilla, roles]      roles: un dígito por jugador (códigos de motor.ORDEN_ROLES)
+#   ["noche", canal, acciones, muerto]     acciones: [jugador, objetivo, jugador, objetivo, ...]
+#   ["votacion", canal, votos, eliminado]  votos: [votante, elegido, ...]; eliminado: null si hubo empate
+#   ["reinicio", canal]                    el bot se reinició y la partida siguió (el rng vuelve a la semilla)
+#   ["fin", canal, ganadores]              ganadores: "Mafia", "Ciudadanos" o null (cancelada o abandonada)
+# Las acciones y los votos se anotan juntos al cerrar cada fase, en el orden en que llegaron (el orden
+# importa: por ejemplo, si hay varios doctores vale el último). Así hay una línea por fase y no una por clic.
+# Un canal tiene una sola partida a la vez, así que los eventos entre "inicio" y "fin" son de la misma.
+import asyncio
+import json
+import os
+import time
+
+import tandas
+
+INTERVALO_ESCRITURA = 1  # Segundos que juntamos eventos antes de escribirlos
+
+activo = False # Hasta que se llama a `abrir`, anotar no hace nada (por ejemplo, en los benchmarks)
+
+_directorio = None
+
+# Empieza a guardar el historial en `directorio`
+def abrir(directorio):
+    global activo, _directorio
+    os.makedirs(directorio, exist_ok=True)
+    _directorio = directorio
+    _tandas.abrir()
+    activo = True
+
+# Los eventos de cada tanda van al archivo del día en que se escriben
+async def _escribir_tanda(tanda):
+    ruta = os.path.join(_directorio, time.strftime("%Y-%m-%d.jsonl", time.gmtime()))
+    await asyncio.to_thread(tandas.agregar, ruta, tandas.lineas(tanda))
+
+_tandas = tandas.Tandas(INTERVALO_ESCRITURA, _escribir_tanda)
+
+# Anota un evento para el historial (ver tandas.py)
+def anotar(*evento):
+    if activo:
+        _tandas.anotar(evento)
+
+# Escribe ya lo que esté pendiente (lo llama mafia.apagar antes de desconectar el bot)
+async def vaciar():
+    if activo:
+        await _tandas.vaciar()
+
+# Lee los eventos de los archivos del historial, en orden. `rutas` pueden ser archivos o carpetas.
+def leer(rutas):
+    archivos = []
+    for ruta in rutas:
+        if os.path.isdir(ruta):
+            archivos += sorted(os.path.join(ruta, nombre) for nombre in os.listdir(ruta) if nombre.endswith(".jsonl"))
+        else:
+            archivos.append(ruta)
+    for nombre in archivos:
+        with open(nombre, encoding="utf-8") as archivo:
+            for linea in archivo:
+                try:
+                    yield json.loads(linea)
+                except ValueError:
+                    break # Última línea a medio escribir cuando se cortó el bot
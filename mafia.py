@@ -1,84 +1,499 @@
 #pipenv install -U discord.py
 import discord
-import random
 import asyncio
+import automaticos
 from discord.ext import commands
-from discord.ui import Button, View
+from discord.ui import DynamicItem, Select, View
+import functools
+import historial
+import itertools
 import os
+import signal
+import time
+import traceback
 from dotenv import load_dotenv
+from envios import enviar_dms
+import mensajes
+import metricas
+import miembros
+import motor
+import perfilador
+import persistencia
+import planificador
 
 
 # Cargar token
 load_dotenv()
 TOKEN = os.getenv('DISCORD_TOKEN')
-
-# Intents necesarios para detectar miembros y mensajes
-intents = discord.Intents.default()
-intents.message_content = True
-intents.members = True
-
-bot = commands.Bot(command_prefix='!', intents=intents)
-
-partidas = {}  # Diccionario de partidas por servidor
+DIRECTORIO_DATOS = os.getenv('MAFIA_DATOS', 'datos') # Donde se guardan las partidas en curso
+
+# Si es "1", al conectarse se descargan todos los miembros de todos los servidores y quedan en memoria
+# (lo que hace discord.py por defecto). Si no, el bot solo conoce a los que están jugando (ver miembros.py):
+# llegan con cada mensaje o interacción, así que no hace falta el intent de miembros ni esperar la descarga.
+MIEMBROS_AL_INICIO = os.getenv('MAFIA_MIEMBROS_AL_INICIO') == '1'
+# Puerto local donde se publican las métricas para Prometheus (ver metricas.py); "0" lo desactiva
+METRICAS_PUERTO = int(os.getenv('MAFIA_METRICAS_PUERTO', '9108'))
+# Shards: cuántos hay en total y cuáles corre este proceso (ej. "0,2"). Los pone supervisor.py al repartir
+# los shards entre varios procesos; sin MAFIA_SHARDS el bot usa una sola conexión, como siempre.
+SHARDS = int(os.getenv('MAFIA_SHARDS', '0'))
+SHARDS_PROPIOS = [int(shard) for shard in os.getenv('MAFIA_SHARDS_PROPIOS', '').split(',') if shard]
+# Jugadores automáticos (ver automaticos.py): cuántos puede tener como mucho una partida ("0" los desactiva),
+# con qué estrategia juegan y si piensan en procesos aparte (cuántos) o en hilos ("0")
+MAX_AUTOMATICOS = int(os.getenv('MAFIA_MAX_AUTOMATICOS', '10'))
+automaticos.configurar(os.getenv('MAFIA_ESTRATEGIA', 'sensata'), int(os.getenv('MAFIA_AUTOMATICOS_PROCESOS', '0')))
+# Segundos tras los que una partida en espera se completa sola con jugadores automáticos ("0": solo con `!mafia rellenar`)
+RELLENO_AUTOMATICO = int(os.getenv('MAFIA_RELLENO_AUTOMATICO', '0'))
+
+# Opciones del bot según cómo se manejan los miembros
+def opciones_bot(miembros_al_inicio):
+    # Intents necesarios para detectar mensajes (y miembros, si se descargan todos)
+    intents = discord.Intents.default()
+    intents.message_content = True
+    intents.members = miembros_al_inicio
+    if miembros_al_inicio:
+        cache = discord.MemberCacheFlags.from_intents(intents)
+    else:
+        cache = discord.MemberCacheFlags.none()
+    return {"intents": intents, "chunk_guilds_at_startup": miembros_al_inicio, "member_cache_flags": cache}
+
+# Con shards, cada servidor llega siempre por el mismo shard (Discord los reparte por id), así que cada
+# proceso recibe los comandos y clics de sus servidores y `partidas` tiene solo las partidas de esos servidores.
+if SHARDS:
+    bot = commands.AutoShardedBot(command_prefix='!', shard_count=SHARDS, shard_ids=SHARDS_PROPIOS or None,
+                                  **opciones_bot(MIEMBROS_AL_INICIO))
+else:
+    bot = commands.Bot(command_prefix='!', **opciones_bot(MIEMBROS_AL_INICIO))
+
+# Al apagarse (Ctrl+C, SIGTERM o el supervisor) el bot escribe lo que falta del guardado de las partidas y
+# del historial antes de desconectarse; si no, se perderían los últimos eventos de cada uno.
+_desconectar = bot.close
+async def apagar():
+    await persistencia.vaciar()
+    await historial.vaciar()
+    await _desconectar()
+bot.close = apagar
+
+partidas = {}  # Diccionario de partidas por canal (id del canal -> Partida)
+partidas_por_servidor = {}  # id del servidor -> cantidad de partidas abiertas en ese servidor
+partida_de_jugador = {}  # id del miembro -> Partida en la que está (cada miembro juega una sola a la vez)
+
+MAX_PARTIDAS_POR_SERVIDOR = 3  # Partidas simultáneas permitidas por servidor si no se configura otra cosa
+limite_partidas = {}  # id del servidor -> límite configurado con `!mafia limite`
+
+PAUSA_ENTRE_RONDAS = 5  # Segundos de pausa entre el final de la votación y la siguiente noche
+DURACION_FASE = 60  # Segundos que dura como máximo cada fase (noche o votación) si no se configura otra cosa
+AVISOS_FASE = (30, 10)  # Segundos restantes en los que avisamos que se está acabando el tiempo
+ESPERA_LOBBY = 600  # Segundos que una partida puede quedar esperando jugadores antes de cancelarse sola
+MAX_FASES_INACTIVAS = 4  # Fases seguidas sin ninguna acción ni voto tras las que damos la partida por abandonada
+REINTENTO_RECUPERACION = 30  # Segundos tras los que se reintenta recuperar una partida si Discord falló al buscar a sus jugadores
+LIMITE_PASO = 120  # Segundos que puede tardar un paso de la partida (mandar mensajes, DMs...) antes de darlo por trabado
+OPCIONES_POR_MENU = 25  # Discord permite como mucho 25 opciones por menú; con más jugadores usamos varios menús
+PLAZO_INTERACCION = 3  # Segundos que da Discord para responder un clic antes de mostrarle un error al usuario
+INTERVALO_RECUENTO = 5  # Segundos mínimos entre dos ediciones del recuento de votos de una partida
+MAX_EN_RECUENTO = 10  # Jugadores más votados que se muestran en el recuento
+ESTADOS = ("esperando", "noche", "dia")  # Estados de una partida en curso (para la métrica de partidas activas)
+SUBCOMANDOS = ("crear", "unirme", "iniciar", "rellenar", "tiempo", "limite", "cancelar", "perfilar")
+
+recuperadas = False # on_ready se repite en cada reconexión: las partidas se recuperan solo la primera vez
 
 @bot.event
 async def on_ready():
+    global recuperadas
     print(f'{bot.user} ha iniciado sesión')
+    if not recuperadas:
+        recuperadas = True
+        historial.abrir(os.path.join(DIRECTORIO_DATOS, "historial"))
+        automaticos.preparar()
+        registros = await persistencia.abrir(DIRECTORIO_DATOS)
+        cantidad = await recuperar_partidas(registros, bot.get_channel)
+        if cantidad:
+            print(f'Se recuperaron {cantidad} partidas en curso')
+        # Las métricas van al final: si el puerto está ocupado, el bot sigue (y guardando las partidas) sin ellas
+        if METRICAS_PUERTO:
+            try:
+                await metricas.servir(METRICAS_PUERTO)
+            except OSError as e:
+                print(f'No se pudieron publicar las métricas en el puerto {METRICAS_PUERTO}: {e}')
 
 @bot.command()
 async def hola(ctx):
     await ctx.send(f'¡Hola {ctx.author.mention}! ¿Cómo estás? 👋')
 
-# Requisitos para crear una partida
-def crear_partida(ctx):
-    partidas[ctx.guild.id] = {
-        "jugadores": [ctx.author],
-        "estado": "esperando",
-        "creador": ctx.author,
-        "canal": ctx.channel,
-        "roles": {},
-        "vivos": set(),
-        "acciones": {},
-        "num_jugadores": None
+# Empezamos a contar desde el reloj (en microsegundos) para no repetir números de fase de antes de un
+# reinicio: los menús viejos que queden en Discord nunca coinciden con una fase nueva.
+_fases = itertools.count(time.time_ns() // 1000)
+
+# Datos de una partida. Cada jugador se identifica con su índice en `jugadores` (su orden de llegada);
+# roles y vivos viven en `juego` (motor.EstadoJuego) una vez que la partida arranca.
+class Partida:
+    __slots__ = ("id", "servidor", "jugadores", "indices", "estado", "creador", "canal", "juego", "acciones", "esperados",
+                 "recuento", "mensaje_votos", "texto_votos", "edicion_programada", "ultima_edicion", "fase", "inactivas",
+                 "num_jugadores", "duracion_fase", "primera_accion", "semilla", "rng")
+
+    def __init__(self, creador, canal, num_jugadores, semilla=None):
+        self.id = canal.id # Cada canal tiene como mucho una partida, así que usamos su id
+        self.servidor = canal.guild.id
+        self.jugadores = [creador] # Lista de miembros; la posición de cada uno es su índice
+        self.indices = {creador.id: 0} # id del miembro -> índice, para encontrarlo en O(1)
+        self.estado = "esperando"
+        self.creador = creador
+        self.canal = canal
+        self.juego = None # motor.EstadoJuego, se crea al repartir los roles
+        self.acciones = {} # Acciones de la noche: índice -> (rol, índice del objetivo)
+        self.esperados = set() # Índices de los que tienen que actuar en la noche actual
+        self.recuento = motor.Recuento() # Votos del día, contados a medida que llegan
+        self.mensaje_votos = None # Mensaje de la votación, donde se muestra el recuento
+        self.texto_votos = None # Texto original de ese mensaje (sin el recuento)
+        self.edicion_programada = False # Si ya hay una edición del recuento esperando en el planificador
+        self.ultima_edicion = 0.0 # Momento (monotonic) de la última edición del recuento
+        # Número de la fase actual, único entre todas las partidas. Cambia en cada paso de la partida
+        # y sirve para descartar clics en menús viejos y plazos que ya no corresponden.
+        self.fase = next(_fases)
+        self.inactivas = 0 # Fases seguidas en las que nadie actuó ni votó
+        self.num_jugadores = num_jugadores
+        self.duracion_fase = DURACION_FASE # El creador la puede cambiar con `!mafia tiempo`
+        self.primera_accion = None # Momento de la primera acción o voto de la fase (para la métrica)
+        # Cada partida tiene su propio generador aleatorio; guardando la semilla se puede reproducir
+        self.semilla, self.rng = motor.crear_rng(semilla)
+
+    # Agrega un jugador y devuelve su índice
+    def agregar(self, miembro):
+        self.indices[miembro.id] = len(self.jugadores)
+        self.jugadores.append(miembro)
+        return self.indices[miembro.id]
+
+    # Índice del miembro en la partida, o None si no está
+    def indice(self, miembro):
+        return self.indices.get(miembro.id)
+
+    # Votos del día: índice del votante -> índice del elegido
+    @property
+    def votos(self):
+        return self.recuento.votos
+
+# Métricas que se calculan al publicarlas: no cuestan nada mientras nadie las pide
+def contar_partidas():
+    cantidades = dict.fromkeys(ESTADOS, 0)
+    for partida in partidas.values():
+        cantidades[partida.estado] = cantidades.get(partida.estado, 0) + 1
+    return cantidades
+
+metricas.medidor("partidas_activas", contar_partidas, etiqueta="estado")
+metricas.medidor("jugadores_en_partida", lambda: len(partida_de_jugador))
+metricas.medidor("plazos_pendientes", planificador.cantidad)
+metricas.medidor("colas_de_canal", lambda: len(mensajes.colas))
+metricas.medidor("miembros_en_cache", miembros.cantidad)
+metricas.escuchar_rate_limits()
+
+# Requisitos para crear una partida: la registramos por canal, la contamos para el servidor
+# y anotamos al creador en el índice de jugadores
+def crear_partida(ctx, num_jugadores, semilla=None):
+    partida = Partida(ctx.author, ctx.channel, num_jugadores, semilla)
+    partidas[partida.id] = partida
+    partidas_por_servidor[partida.servidor] = partidas_por_servidor.get(partida.servidor, 0) + 1
+    partida_de_jugador[ctx.author.id] = partida
+    persistencia.anotar("crear", partida.id, partida.servidor, ctx.author.id, num_jugadores, partida.semilla,
+                        partida.fase, partida.duracion_fase)
+    # Si no se llena ni se inicia a tiempo, se cancela sola
+    programar_paso(partida, ESPERA_LOBBY, expirar_lobby)
+    if RELLENO_AUTOMATICO and MAX_AUTOMATICOS:
+        planificador.programar(RELLENO_AUTOMATICO, rellenar_lobby, partida.id, partida.fase,
+                               grupo=(partida.id, partida.fase))
+    return partida
+
+# Suma un jugador a la partida y lo anota en el índice de jugadores
+def unir_jugador(partida, miembro):
+    partida.agregar(miembro)
+    partida_de_jugador[miembro.id] = partida
+    persistencia.anotar("unir", partida.id, miembro.id)
+
+# Borra la partida de todos los registros (al terminar o al cancelarla).
+# `ganadores` es el bando que ganó, o None si la partida se canceló o se abandonó.
+def terminar_partida(partida, ganadores=None):
+    if partidas.get(partida.id) is not partida:
+        return
+    del partidas[partida.id]
+    partida.estado = "terminada"
+    planificador.descartar((partida.id, partida.fase))
+    partida.fase = next(_fases) # Los plazos y menús pendientes de esta partida dejan de valer
+    persistencia.anotar("fin", partida.id)
+    if partida.juego is not None:
+        historial.anotar("fin", partida.id, ganadores)
+    restantes = partidas_por_servidor.get(partida.servidor, 0) - 1
+    if restantes > 0:
+        partidas_por_servidor[partida.servidor] = restantes
+    else:
+        partidas_por_servidor.pop(partida.servidor, None)
+    for jugador in partida.jugadores:
+        # Solo borramos la entrada si todavía apunta a esta partida
+        if partida_de_jugador.get(jugador.id) is partida:
+            del partida_de_jugador[jugador.id]
+        # Mientras jugaba lo tenía la partida; ahora queda en la caché de miembros por si vuelve a jugar
+        if not automaticos.es_automatico(jugador):
+            miembros.guardar(jugador)
+    # Si se estaba perfilando, guardamos lo que se juntó
+    perfil = perfilador.desactivar(partida.id)
+    if perfil:
+        planificador.programar(0, perfilador.guardar, perfil, ruta_perfil(partida))
+
+# Archivo donde se guarda el perfil de una partida (ver perfilador.py)
+def ruta_perfil(partida):
+    return os.path.join(DIRECTORIO_DATOS, "perfiles", f"{partida.id}-{partida.semilla}.txt")
+
+# Menú desplegable con una página de jugadores (hasta 25). Todos los menús del bot usan esta clase:
+# el custom_id ("mafia:<canal>:<página>:<servidor>") dice de qué partida es, así que discord.py crea el ítem
+# a partir del id en cada clic y no hace falta un callback por jugador ni guardar vistas por mensaje.
+# El valor de cada opción es "<fase>:<índice del jugador>". Los menús de antes de agregar el servidor no lo tienen.
+class MenuJugadores(DynamicItem[Select], template=r"mafia:(?P<canal>[0-9]+):(?P<pagina>[0-9]+)(?::(?P<servidor>[0-9]+))?"):
+    def __init__(self, canal, pagina, opciones=(), texto=None, servidor=None):
+        custom_id = f"mafia:{canal}:{pagina}" if servidor is None else f"mafia:{canal}:{pagina}:{servidor}"
+        super().__init__(Select(custom_id=custom_id, placeholder=texto, options=list(opciones)))
+        self.canal = canal
+        self.servidor = servidor
+
+    @classmethod
+    async def from_custom_id(cls, interaction, item, match):
+        servidor = int(match["servidor"]) if match["servidor"] else None
+        return cls(int(match["canal"]), int(match["pagina"]), servidor=servidor)
+
+    async def callback(self, interaction):
+        # Con shards en varios procesos, Discord manda los clics en DMs siempre al shard 0: si la partida es
+        # de un servidor de otro proceso, se lo pasamos a ese proceso y él responde
+        if reenviar_clic is not None and self.servidor is not None and shard_de(self.servidor) not in SHARDS_PROPIOS:
+            reenviar_clic(shard_de(self.servidor), datos_clic(interaction))
+            return
+        await atender_clic(interaction, self.canal)
+
+async def atender_clic(interaction, canal_id):
+    with metricas.medir("menu"):
+        await despachar(interaction, partidas.get(canal_id))
+    # Desde el clic del usuario (según Discord) hasta que respondimos: tiene que ser menos de 3 segundos
+    demora = time.time() - interaction.created_at.timestamp()
+    metricas.observar("interaccion_a_respuesta_segundos", demora)
+    if demora > PLAZO_INTERACCION:
+        metricas.contar("interacciones_tarde")
+
+bot.add_dynamic_items(MenuJugadores)
+
+# --------- Shards en varios procesos (ver supervisor.py) ---------
+# Función (shard, datos del clic) que manda un clic al proceso dueño de ese shard. La pone supervisor.py;
+# con un solo proceso queda en None y cada clic se atiende acá.
+reenviar_clic = None
+
+# Shard por el que llegan los eventos de un servidor (la cuenta que hace Discord)
+def shard_de(servidor_id):
+    return (servidor_id >> 22) % SHARDS
+
+# Lo que hace falta de un clic para volver a armarlo en otro proceso, con el formato del gateway
+def datos_clic(interaction):
+    usuario = interaction.user
+    return {
+        "id": str(interaction.id), "application_id": str(interaction.application_id), "type": 3,
+        "token": interaction.token, "version": interaction.version, "channel_id": str(interaction.channel_id),
+        "locale": str(interaction.locale), "attachment_size_limit": getattr(interaction, "attachment_size_limit", 0),
+        "data": interaction.data, "user": {"id": str(usuario.id), "username": usuario.name,
+        "discriminator": usuario.discriminator, "global_name": usuario.global_name, "avatar": None},
     }
 
-# Lógica para asignar roles basada en la cantidad de jugadores
-def obtener_roles(jugadores):
-    # Obtenemos la cantidad total de jugadores que se unieron a la partida
-    num_jugadores = len(jugadores)
-
-    # Asignamos la cantidad de mafiosos: al menos 1, y aproximadamente el 25% del total
-    # Usamos // (división entera) para evitar decimales, y max para garantizar al menos 1 mafia
-    mafiosos = max(1, num_jugadores // 4) 
-
-    # La cantidad de doctores y detectives escala según el número de jugadores:
-    # - 1 para hasta 6 jugadores
-    # - 2 entre 7 y 12
-    # - 3 para más de 13
-    doctores = 1 if num_jugadores <= 6 else 2 if num_jugadores <= 12 else 3
-    detectives = doctores # Usamos la misma cantidad de detectives que de doctores
-
-    # Construimos la lista de roles:
-    roles = (["mafia"] * mafiosos +  #Asignamos la cantidad de jugadores que seran mafia
-    ["doctor"] * doctores +     #Asignamos la cantidad de jugadores que seran doctores
-    ["detective"] * detectives +    #Asignamos la cantidad de jugadores que seran detectives
-    ["ciudadano"] * (num_jugadores - mafiosos - doctores - detectives)) #A la cantidad total de jugadores, le restamos la cantidad total de roles especiales
-                                                                        #el resultado sera la cantidad de ciudadanos.    
-    # Mezclamos los roles de la lista al azar para que la asignación no sea predecible
-    random.shuffle(roles)
-
-    # Asignamos cada rol a un jugador usando zip y lo convertimos en un diccionario
-    return dict(zip(jugadores, roles))
-
-@bot.command() 
+# Atiende un clic que recibió otro proceso. La respuesta va por HTTP con el token del clic, así que
+# puede salir de cualquier proceso.
+async def recibir_clic(datos):
+    interaction = discord.Interaction(data=datos, state=bot._connection)
+    await atender_clic(interaction, int(datos["data"]["custom_id"].split(":")[1]))
+
+# Arma la vista con los menús de la fase actual: una sola vista por fase, que se manda igual a todos
+# los que tienen que elegir. `objetivos` son los índices de los jugadores que se pueden elegir.
+def armar_menus(partida, objetivos):
+    view = View(timeout=None)
+    for pagina, inicio in enumerate(range(0, len(objetivos), OPCIONES_POR_MENU)):
+        tramo = objetivos[inicio:inicio + OPCIONES_POR_MENU]
+        opciones = [discord.SelectOption(label=partida.jugadores[i].display_name, value=f"{partida.fase}:{i}") for i in tramo]
+        texto = "Elegí a un jugador" if len(objetivos) <= OPCIONES_POR_MENU else f"Jugadores {inicio + 1} a {inicio + len(tramo)}"
+        view.add_item(MenuJugadores(partida.id, pagina, opciones, texto, partida.servidor))
+    return view
+
+# Recibe la elección de cualquier menú de una partida y la manda a la acción nocturna o al voto
+async def despachar(interaction, partida):
+    fase, _, objetivo = interaction.data["values"][0].partition(":")
+    # El menú es de una partida que ya terminó o de una fase anterior
+    if partida is None or partida.juego is None or int(fase) != partida.fase:
+        await interaction.response.send_message("⌛ Esta fase ya terminó.", ephemeral=True)
+        return
+
+    jugador = partida.indice(interaction.user)
+    if partida.estado == "noche":
+        await elegir_objetivo(interaction, partida, jugador, int(objetivo))
+    else:
+        await votar(interaction, partida, jugador, int(objetivo))
+
+# Acción nocturna de mafia, doctor o detective
+async def elegir_objetivo(interaction, partida, jug, obj):
+    await interaction.response.send_message(registrar_accion(partida, jug, obj), ephemeral=True)
+
+# Anota la acción nocturna de `jug` (un clic o un jugador automático) y devuelve el texto con que se le contesta
+def registrar_accion(partida, jug, obj):
+    # Si alguien que no tiene que actuar esta noche intenta usar el menú, se le niega
+    if jug not in partida.esperados:
+        return "🚫 Este menú no es para vos."
+
+    # Si el jugador ya eligió antes, no puede volver a elegir
+    if jug in partida.acciones:
+        return "⚠️ Ya has elegido a tu objetivo."
+
+    # Guardamos la acción del jugador: qué rol tiene y a quién apuntó
+    partida.acciones[jug] = (partida.juego.rol(jug), obj)
+    persistencia.anotar("accion", partida.id, jug, obj)
+
+    # Guardamos cuándo llegó la primera acción de la noche (para la métrica)
+    if partida.primera_accion is None:
+        partida.primera_accion = time.monotonic()
+
+    # Si ya actuaron todos los que tenían que actuar, terminamos la noche sin esperar
+    if partida.esperados <= partida.acciones.keys():
+        planificador.programar(0, avanzar, partida.id, partida.fase, cerrar_noche)
+
+    # Confirmamos al jugador su elección en un mensaje privado
+    return f"✅ Elegiste a **{partida.jugadores[obj].display_name}**."
+
+# Voto del día
+async def votar(interaction, partida, votante, obj):
+    await interaction.response.send_message(registrar_voto(partida, votante, obj), ephemeral=True)
+
+# Anota el voto de `votante` (un clic o un jugador automático) y devuelve el texto con que se le contesta
+def registrar_voto(partida, votante, obj):
+    # Validamos que el votante esté vivo
+    if votante is None or not partida.juego.esta_vivo(votante):
+        return "🚫 No estás vivo en la partida."
+
+    # Elegir otra vez al mismo jugador retira el voto; elegir a otro lo cambia
+    recuento = partida.recuento
+    if recuento.votos.get(votante) == obj:
+        recuento.retirar(votante)
+        persistencia.anotar("retiro", partida.id, votante)
+        respuesta = "↩️ Retiraste tu voto."
+    else:
+        anterior = recuento.votar(votante, obj)
+        persistencia.anotar("voto", partida.id, votante, obj)
+        accion = "Votaste por" if anterior is None else "Cambiaste tu voto a"
+        respuesta = f"✅ {accion} **{partida.jugadores[obj].display_name}**."
+
+    if partida.primera_accion is None:
+        partida.primera_accion = time.monotonic()
+    programar_recuento(partida)
+
+    # Si ya votaron todos los vivos, cerramos la votación sin esperar
+    if len(recuento) >= partida.juego.num_vivos:
+        planificador.programar(0, avanzar, partida.id, partida.fase, cerrar_votacion)
+    return respuesta
+
+# Los jugadores automáticos `indices` eligen en la fase actual: la estrategia piensa en el pool (ver
+# automaticos.py) y lo que elige entra como un clic más. Si la fase terminó mientras pensaban, no hace nada.
+async def jugar_automaticos(canal_id, fase, indices):
+    partida = partidas.get(canal_id)
+    if partida is None or partida.fase != fase:
+        return
+    juego = partida.juego
+    momento = "noche" if partida.estado == "noche" else "dia"
+    votos = partida.recuento.ordenados() if momento == "dia" else ()
+    vivos = list(juego.indices_vivos())
+    situaciones = [automaticos.situacion(momento, juego.rol(i), i, vivos, partida.jugadores[i].conocidos, votos)
+                   for i in indices]
+    elecciones = await automaticos.decidir(situaciones)
+    if partidas.get(canal_id) is not partida or partida.fase != fase:
+        return
+    registrar = registrar_accion if momento == "noche" else registrar_voto
+    for jugador, elegido in zip(indices, elecciones):
+        if elegido is not None and juego.esta_vivo(elegido):
+            registrar(partida, jugador, elegido)
+
+# Índices de los jugadores automáticos vivos, de los que cumplen `condicion` (con el índice)
+def automaticos_vivos(partida, condicion=lambda i: True):
+    return [i for i in partida.juego.indices_vivos() if automaticos.es_automatico(partida.jugadores[i]) and condicion(i)]
+
+# Suma `cantidad` jugadores automáticos a una partida en espera y, si se llena, la arranca
+async def rellenar(partida, cantidad):
+    for _ in range(cantidad):
+        unir_jugador(partida, automaticos.JugadorAutomatico(partida.id, len(partida.jugadores)))
+    mensajes.encolar(partida.canal, f"🤖 Se sumaron **{cantidad}** jugadores automáticos.\n👥 Jugadores actuales: **{len(partida.jugadores)}/{partida.num_jugadores}**")
+    if len(partida.jugadores) >= partida.num_jugadores:
+        mensajes.encolar(partida.canal, "✅ **¡Estamos listos!** 🚀 Iniciando...")
+        await avanzar(partida.id, partida.fase, iniciar_partida)
+
+# Cuántos jugadores automáticos se le pueden sumar todavía a una partida en espera
+def lugares_automaticos(partida):
+    ya = sum(1 for jugador in partida.jugadores if automaticos.es_automatico(jugador))
+    return max(0, min(partida.num_jugadores - len(partida.jugadores), MAX_AUTOMATICOS - ya))
+
+# Plazo del relleno automático: si la partida sigue esperando, la completa con jugadores automáticos
+async def rellenar_lobby(canal_id, fase):
+    partida = partidas.get(canal_id)
+    if partida is None or partida.fase != fase or partida.estado != "esperando":
+        return
+    cantidad = lugares_automaticos(partida)
+    if cantidad:
+        await rellenar(partida, cantidad)
+
+# El recuento se muestra editando el mensaje de la votación. Por muchos votos que lleguen, cada partida
+# edita como mucho una vez cada INTERVALO_RECUENTO segundos: el primer voto programa la edición y los
+# que llegan mientras tanto salen todos juntos en ella.
+def programar_recuento(partida):
+    if partida.edicion_programada or partida.mensaje_votos is None:
+        return
+    partida.edicion_programada = True
+    demora = max(0, partida.ultima_edicion + INTERVALO_RECUENTO - time.monotonic())
+    planificador.programar(demora, actualizar_recuento, partida.id, partida.fase, grupo=(partida.id, partida.fase))
+
+async def actualizar_recuento(canal_id, fase):
+    partida = partidas.get(canal_id)
+    # La votación ya se cerró
+    if partida is None or partida.fase != fase:
+        return
+    partida.edicion_programada = False
+    partida.ultima_edicion = time.monotonic()
+    texto = f"{partida.texto_votos}\n{texto_recuento(partida)}"
+    if len(texto) <= mensajes.LIMITE_MENSAJE:
+        await mensajes.editar(partida.mensaje_votos, texto)
+
+# Texto del recuento: los más votados y quién va perdiendo (o si hay empate)
+def texto_recuento(partida):
+    recuento, jugadores = partida.recuento, partida.jugadores
+    if not len(recuento):
+        return f"📊 **Votos: 0/{partida.juego.num_vivos}**"
+    votados = " · ".join(f"{jugadores[j].display_name} **{n}**" for j, n in itertools.islice(recuento.ordenados(), MAX_EN_RECUENTO))
+    eliminado, _ = recuento.resultado()
+    situacion = f"Va quedando afuera **{jugadores[eliminado].display_name}**" if eliminado is not None else "Por ahora hay empate"
+    return f"📊 **Votos: {len(recuento)}/{partida.juego.num_vivos}** — {votados}\n⚖️ {situacion}"
+
+# Mide cuánto tarda cada subcomando de `!mafia`. Los que no existen van juntos como "otro",
+# así nadie puede llenar las métricas de etiquetas inventadas.
+def medir_comando(comando):
+    @functools.wraps(comando)
+    async def medido(ctx, subcomando=None, num=None):
+        with metricas.medir("comando", subcomando=subcomando if subcomando in SUBCOMANDOS else "otro"):
+            await comando(ctx, subcomando, num)
+    return medido
+
+@bot.command()
+@medir_comando
 async def mafia(ctx, subcomando=None, num: int = None): # Comando principal del juego Mafia. Con subcomandos como 'crear', 'unirme', 'iniciar', 'cancelar', etc.
     
     # Subcomando para crear una nueva partida
     if subcomando == "crear":
 
-        # Verificamos si ya existe una partida activa en este servidor
-        if ctx.guild.id in partidas:
-            await ctx.send("⚠️ Ya hay una partida en curso en este servidor.")
+        # Verificamos si ya existe una partida activa en este canal
+        if ctx.channel.id in partidas:
+            await ctx.send("⚠️ Ya hay una partida en curso en este canal.")
+            return
+
+        # Verificamos que el servidor no haya llegado a su límite de partidas simultáneas
+        limite = limite_partidas.get(ctx.guild.id, MAX_PARTIDAS_POR_SERVIDOR)
+        if partidas_por_servidor.get(ctx.guild.id, 0) >= limite:
+            await ctx.send(f"⚠️ Este servidor ya tiene **{limite}** partidas en curso. Esperá a que termine alguna.")
+            return
+
+        # Cada miembro puede estar en una sola partida a la vez
+        if ctx.author.id in partida_de_jugador:
+            await ctx.send("ℹ️ Ya estás en una partida. Terminala o cancelala antes de crear otra.")
             return
 
         # Validamos que se haya indicado un número de jugadores válido (entre 4 y 30)
@@ -86,10 +501,8 @@ async def mafia(ctx, subcomando=None, num: int = None): # Comando principal del
             await ctx.send("❌ Debes especificar un número de jugadores (mínimo 4, maximo 30). Ej: `!mafia crear 6`")
             return
 
-        # Creamos la partida inicializando su estructura interna
-        crear_partida(ctx)
-        # Guardamos el número de jugadores especificado por el creador
-        partidas[ctx.guild.id]["num_jugadores"] = num
+        # Creamos la partida inicializando su estructura interna, con el número de jugadores especificado por el creador
+        crear_partida(ctx, num)
 
         # Enviamos un mensaje informativo
         await ctx.send(
@@ -97,73 +510,135 @@ async def mafia(ctx, subcomando=None, num: int = None): # Comando principal del
             f"📢 Usa `!mafia unirme` para participar.\n"
             f"👤 **{ctx.author.display_name}** se ha unido. Faltan **{num - 1}** jugadores...\n"
             f"⚠️ En caso de no llenar la partida, el creador puede iniciarla manualmente con `!mafia iniciar` (solo para partidas de 5 o más).\n"
-            f"⚠️ El creador puede cancelar la partida usando `!mafia cancelar`."
+            f"🤖 El creador puede completarla con jugadores automáticos usando `!mafia rellenar`.\n"
+            f"⚠️ El creador puede cancelar la partida usando `!mafia cancelar`.\n"
+            f"⏱️ El creador puede cambiar la duración de cada fase con `!mafia tiempo <segundos>` (por defecto {DURACION_FASE})."
         )
     
     # Subcomando para que los jugadores se unan a una partida en curso
     elif subcomando == "unirme":
-        # Obtenemos la partida del servidor actual
-        partida = partidas.get(ctx.guild.id)
+        # Obtenemos la partida del canal actual
+        partida = partidas.get(ctx.channel.id)
 
          # Verificamos que exista una partida y que esté en estado "esperando"
-        if not partida or partida["estado"] != "esperando":
+        if not partida or partida.estado != "esperando":
             await ctx.send("❌ No hay partida disponible para unirse.")
             return
 
-         # Si el jugador ya se unió anteriormente, se lo informamos
-        if ctx.author in partida["jugadores"]:
+         # Si el jugador ya se unió anteriormente (a esta o a otra partida), se lo informamos
+        actual = partida_de_jugador.get(ctx.author.id)
+        if actual is partida:
             await ctx.send("ℹ️ Ya estás en la partida.")
             return
+        if actual is not None:
+            await ctx.send("ℹ️ Ya estás en otra partida.")
+            return
          
           # Agregamos al jugador a la lista de participantes
-        partida["jugadores"].append(ctx.author)
+        unir_jugador(partida, ctx.author)
         
         # Calculamos cuántos jugadores faltan para completar la partida
-        faltan = partida["num_jugadores"] - len(partida["jugadores"])
+        faltan = partida.num_jugadores - len(partida.jugadores)
 
          
          # Si aún faltan jugadores, mostramos el progreso actual
         if faltan > 0:
-            await ctx.send(f"✅ **{ctx.author.display_name}** se ha unido a la partida.\n👥 Jugadores actuales: **{len(partida['jugadores'])}/{partida['num_jugadores']}**\n⏳ Faltan **{faltan}** para comenzar...")
+            mensajes.encolar(ctx.channel, f"✅ **{ctx.author.display_name}** se ha unido a la partida.\n👥 Jugadores actuales: **{len(partida.jugadores)}/{partida.num_jugadores}**\n⏳ Faltan **{faltan}** para comenzar...")
         
         # Si se completó la cantidad de jugadores, iniciamos la partida automáticamente
         else:
             
-            await ctx.send("✅ **¡Estamos listos!** 🚀 Iniciando...")
+            mensajes.encolar(ctx.channel, "✅ **¡Estamos listos!** 🚀 Iniciando...")
              # Llamamos a la función que inicia la lógica principal del juego
-            await iniciar_partida(ctx, partida)
+            await avanzar(partida.id, partida.fase, iniciar_partida)
 
     # Subcomando para que el creador inicie manualmente la partida, útil si no se llena pero hay suficientes jugadores
     elif subcomando == "iniciar":
-        # Obtenemos la partida del servidor actual
-        partida = partidas.get(ctx.guild.id)
+        # Obtenemos la partida del canal actual
+        partida = partidas.get(ctx.channel.id)
 
         # Verificamos que haya una partida creada
         if not partida:
-            await ctx.send("❌ No hay ninguna partida creada en este servidor.")
+            await ctx.send("❌ No hay ninguna partida creada en este canal.")
             return
 
         # Verificamos que la partida no haya sido ya iniciada
-        if partida["estado"] != "esperando":
+        if partida.estado != "esperando":
             await ctx.send("⚠️ La partida ya fue iniciada.")
             return
 
         # Solo el creador puede iniciar la partida manualmente
-        if ctx.author != partida["creador"]:
+        if ctx.author != partida.creador:
             await ctx.send("🚫 Solo el creador de la partida puede iniciarla manualmente.")
             return
         # Validamos que haya al menos el mínimo de jugadores para que el juego tenga sentido (4 jugadores)
-        if len(partida["jugadores"]) < 4:
+        if len(partida.jugadores) < 4:
             await ctx.send("🚫 Se necesitan al menos 4 jugadores para comenzar la partida.")
             return
         # Si todo está en orden, se inicia la partida manualmente
-        await ctx.send("✅ **¡Estamos listos!** 🚀 Iniciando...")
-        await iniciar_partida(ctx, partida)
+        mensajes.encolar(ctx.channel, "✅ **¡Estamos listos!** 🚀 Iniciando...")
+        await avanzar(partida.id, partida.fase, iniciar_partida)
+
+    # Subcomando para que el creador complete la partida con jugadores automáticos (todos los que falten, o `num`)
+    elif subcomando == "rellenar":
+        partida = partidas.get(ctx.channel.id)
+
+        if not partida or partida.estado != "esperando":
+            await ctx.send("❌ No hay ninguna partida en espera para rellenar.")
+            return
+
+        if ctx.author != partida.creador:
+            await ctx.send("🚫 Solo el creador de la partida puede sumar jugadores automáticos.")
+            return
+
+        lugares = lugares_automaticos(partida)
+        if lugares == 0:
+            await ctx.send(f"❌ No se pueden sumar más jugadores automáticos (como mucho **{MAX_AUTOMATICOS}** por partida).")
+            return
+        if num is not None and num < 1:
+            await ctx.send("❌ Debes indicar cuántos jugadores automáticos sumar. Ej: `!mafia rellenar 3`")
+            return
+
+        await rellenar(partida, lugares if num is None else min(num, lugares))
+
+    # Subcomando para que el creador cambie cuántos segundos dura como máximo cada fase
+    elif subcomando == "tiempo":
+        partida = partidas.get(ctx.channel.id)
+
+        if not partida or partida.estado != "esperando":
+            await ctx.send("❌ No hay ninguna partida en espera para configurar.")
+            return
+
+        if ctx.author != partida.creador:
+            await ctx.send("🚫 Solo el creador de la partida puede cambiar la duración de las fases.")
+            return
+
+        # Validamos que la duración tenga sentido (entre 15 segundos y 5 minutos)
+        if num is None or num < 15 or num > 300:
+            await ctx.send("❌ Debes indicar una duración entre 15 y 300 segundos. Ej: `!mafia tiempo 90`")
+            return
+
+        partida.duracion_fase = num
+        persistencia.anotar("tiempo", partida.id, num)
+        await ctx.send(f"⏱️ Cada fase durará como máximo **{num} segundos**. Si todos actúan antes, se pasa a la siguiente.")
+
+    # Subcomando para que un administrador cambie cuántas partidas simultáneas se permiten en el servidor
+    elif subcomando == "limite":
+        if not ctx.author.guild_permissions.manage_guild:
+            await ctx.send("🚫 Solo quien puede administrar el servidor puede cambiar el límite de partidas.")
+            return
+
+        if num is None or num < 1 or num > 50:
+            await ctx.send("❌ Debes indicar un límite entre 1 y 50. Ej: `!mafia limite 5`")
+            return
+
+        limite_partidas[ctx.guild.id] = num
+        await ctx.send(f"🎲 Ahora se pueden jugar hasta **{num}** partidas a la vez en este servidor (una por canal).")
 
     # Subcomando para cancelar una partida antes de que comience, útil si no se llenan los jugadores o hay cambios de planes
     elif subcomando == "cancelar":
-        # Obtenemos la partida actual del servidor
-        partida = partidas.get(ctx.guild.id)
+        # Obtenemos la partida actual del canal
+        partida = partidas.get(ctx.channel.id)
 
         # Verificamos que haya una partida activa que se pueda cancelar
         if not partida:
@@ -171,14 +646,35 @@ async def mafia(ctx, subcomando=None, num: int = None): # Comando principal del
             return
 
         # Solo el creador de la partida tiene permiso para cancelarla
-        if ctx.author != partida.get("creador"):
+        if ctx.author != partida.creador:
             await ctx.send("🚫 Solo el creador de la partida puede cancelarla.")
             return
         
-        # Eliminamos la partida del diccionario global para borrarla completamente
-        del partidas[ctx.guild.id]
-        # Avisamos que la partida fue cancelada correctamente
-        await ctx.send("🛑 La partida ha sido cancelada por el creador.")
+        # Eliminamos la partida de los registros globales para borrarla completamente
+        terminar_partida(partida)
+        # Avisamos que la partida fue cancelada correctamente (junto con lo que quedaba en la cola del canal)
+        mensajes.encolar(ctx.channel, "🛑 La partida ha sido cancelada por el creador.")
+        await mensajes.cerrar(ctx.channel)
+
+    # Subcomando para perfilar la partida del canal (prender o apagar). El perfil se guarda al terminar o al apagarlo.
+    elif subcomando == "perfilar":
+        partida = partidas.get(ctx.channel.id)
+
+        if not partida:
+            await ctx.send("❌ No hay ninguna partida en este canal.")
+            return
+
+        if ctx.author != partida.creador and not ctx.author.guild_permissions.manage_guild:
+            await ctx.send("🚫 Solo el creador de la partida o quien administra el servidor puede perfilarla.")
+            return
+
+        perfil = perfilador.desactivar(partida.id)
+        if perfil is None:
+            perfilador.activar(partida.id)
+            await ctx.send("🔬 Perfilando esta partida. El perfil se guarda al terminar (o con `!mafia perfilar` otra vez).")
+        else:
+            await perfilador.guardar(perfil, ruta_perfil(partida))
+            await ctx.send(f"🔬 Perfil guardado con **{sum(perfil.values())}** muestras.")
 
     #En caso de que el no haya comando(ejemplo: !mafia )
     elif subcomando is None:
@@ -188,241 +684,393 @@ async def mafia(ctx, subcomando=None, num: int = None): # Comando principal del
         # Subcomando no reconocido
         await ctx.send(f"**{ctx.author.mention}**, Utiliza `!mafia crear` para crear una partida o usa `!mafia unirme` para unirte a una ya existente. :D")
 
-# Esta función gestiona todo el flujo del juego: asigna roles, controla las fases de noche y día, y verifica condiciones de victoria
-async def iniciar_partida(ctx, partida):
-    jugadores = partida["jugadores"]
-    # Creamos un conjunto con los jugadores vivos al inicio
-    partida["vivos"] = set(jugadores)
-    # Asignamos roles de forma aleatoria y balanceada
-    partida["roles"] = obtener_roles(jugadores)
-
-    # Enviamos a cada jugador un mensaje privado con su rol
-    for jugador in jugadores:
-        try:
-            await jugador.send(f"🎭 **¡Tu rol ha sido asignado!**\n🔒 Eres **{partida['roles'][jugador].upper()}**.\n🤫 ¡Guardá el secreto!")
-        except:
-            # Si no se puede mandar DM (por ejemplo, tiene bloqueado los mensajes del servidor)
-            await ctx.send(f"⚠️ No se pudo enviar el rol a {jugador.display_name}.")
+# La partida avanza por pasos: esperando -> noche -> dia -> noche -> ... -> terminada.
+# Cada paso es una función corta que hace lo suyo (mensajes, DMs, reglas) y programa en el
+# planificador el plazo que lleva al siguiente; no hay ninguna corrutina esperando entre fases.
+# Cada plazo guarda el número de fase en que se programó: si la partida ya avanzó (porque todos
+# actuaron antes, o se canceló) el plazo se descarta.
+async def avanzar(canal_id, fase, paso):
+    partida = partidas.get(canal_id)
+    if partida is None or partida.fase != fase:
+        return
+    planificador.descartar((partida.id, fase)) # Los otros plazos de la fase (avisos, recuento) ya no van
+    partida.fase = next(_fases) # Cambiamos de fase antes de cualquier await, así el paso corre una sola vez
+    try:
+        with metricas.medir("paso", paso=paso.__name__):
+            await asyncio.wait_for(paso(partida), LIMITE_PASO)
+    except Exception:
+        metricas.contar("pasos_fallidos", paso=paso.__name__)
+        # Si un paso falla o se traba, cerramos la partida en lugar de dejarla colgada en `partidas`
+        traceback.print_exc()
+        terminar_partida(partida)
+        mensajes.encolar(partida.canal, "💥 Ocurrió un error inesperado y la partida se canceló.")
+        await mensajes.cerrar(partida.canal)
+
+# Programa el próximo paso de la partida dentro de `demora` segundos (con `avisos`, también los avisos
+# de tiempo restante). El plazo queda anotado para poder volver a programarlo si el bot se reinicia;
+# con `anotar=False` no (al recuperar un plazo que ya estaba anotado: anotarlo de nuevo borraría las
+# acciones o los votos guardados de la fase, ver persistencia.aplicar).
+def programar_paso(partida, demora, paso, avisos=False, anotar=True):
+    if avisos:
+        for restante in AVISOS_FASE:
+            if restante < demora:
+                planificador.programar(demora - restante, avisar, partida.id, partida.fase, restante,
+                                       grupo=(partida.id, partida.fase))
+    planificador.programar(demora, avanzar, partida.id, partida.fase, paso, grupo=(partida.id, partida.fase))
+    if anotar:
+        persistencia.anotar("plazo", partida.id, partida.fase, partida.estado, paso.__name__, time.time() + demora)
+
+# Aviso de que se está acabando el tiempo (no cambia de fase)
+async def avisar(canal_id, fase, restante):
+    partida = partidas.get(canal_id)
+    if partida is not None and partida.fase == fase:
+        mensajes.encolar(partida.canal, f"⏰ ¡Quedan **{restante} segundos**!")
+
+# Cuenta las fases seguidas sin actividad. Devuelve True si la partida se dio por abandonada.
+async def revisar_abandono(partida, hubo_actividad):
+    partida.inactivas = 0 if hubo_actividad else partida.inactivas + 1
+    if partida.inactivas < MAX_FASES_INACTIVAS:
+        return False
+    terminar_partida(partida)
+    mensajes.encolar(partida.canal, "💤 Nadie actuó ni votó en las últimas fases: la partida se dio por abandonada.")
+    await mensajes.cerrar(partida.canal)
+    return True
+
+# Paso de la partida en espera que nunca se llenó ni se inició
+async def expirar_lobby(partida):
+    terminar_partida(partida)
+    mensajes.encolar(partida.canal, f"⌛ La partida se canceló porque pasaron {ESPERA_LOBBY // 60} minutos sin que comenzara.")
+    await mensajes.cerrar(partida.canal)
+
+# Primer paso de la partida: reparte los roles y arranca la primera noche
+# Si la partida sigue en curso. Los pasos lo revisan después de cada await: mientras esperaban a Discord
+# la partida pudo cancelarse, expirar o darse por abandonada, y entonces no tienen que seguir.
+def sigue(partida):
+    return partidas.get(partida.id) is partida and partida.estado != "terminada"
+
+async def iniciar_partida(partida):
+    # A partir de acá nadie más se puede unir
+    partida.estado = "noche"
+    jugadores = partida.jugadores
+    # Asignamos roles de forma aleatoria y balanceada (todos empiezan vivos)
+    juego = partida.juego = motor.repartir_roles(len(jugadores), partida.rng)
+    roles = "".join(str(codigo) for codigo in juego.roles)
+    persistencia.anotar("roles", partida.id, roles)
+    historial.anotar("inicio", partida.id, partida.semilla, roles)
 
     # Obtenemos el canal original donde se creó la partida
-    canal = partida["canal"]
+    canal = partida.canal
+
+    # Enviamos a cada jugador un mensaje privado con su rol (todos en paralelo)
+    # Si no se puede mandar DM (por ejemplo, tiene bloqueado los mensajes del servidor) se avisa en un solo mensaje
+    await enviar_dms(canal, [
+        (jugador, f"🎭 **¡Tu rol ha sido asignado!**\n🔒 Eres **{juego.rol(i).upper()}**.\n🤫 ¡Guardá el secreto!")
+        for i, jugador in enumerate(jugadores)
+    ], "No se pudo enviar el rol a", metrica="fanout_roles", vigente=lambda: sigue(partida))
+    if not sigue(partida):
+        return
+
     # Anunciamos públicamente el inicio del juego
-    await canal.send("🎉 **¡La partida ha comenzado!** 🔥 Que comience la masacre...\n🌙 **Cae la noche...** Los roles especiales están actuando...")
-
-    #El bucle continuara hasta que se cierre con un break
-    while True:
-        # --------- FASE DE NOCHE ---------
-        partida["estado"] = "noche"
-        partida["acciones"] = {}  # Reiniciamos las acciones nocturnas
-
-        # Anuncio general de que comenzó la noche
-        await canal.send("----------🌕**NOCHE**🌕----------\n🌌 **NOCHE** ha caído sobre el pueblo...\n⏳ Aquellos con habilidades tienen **60 segundos** para actuar.⏳\n😴 Los ciudadanos... duermen sin sospechar.")
-
-        vivos = list(partida["vivos"]) # Convertimos el set de vivos a lista
-
-        # Enviamos botones de acción a mafia, doctor y detective
-        for jugador in vivos:
-
-            # Obtenemos el rol del jugador actual
-            rol = partida["roles"][jugador]
-
-            # Solo enviamos botones a los que tienen rol activo en la noche
-            if rol in ["doctor", "detective", "mafia"]:
-                # Creamos una vista (grupo de botones) con un timeout de 90 segundos
-                view = View(timeout=90)
-                # Por cada jugador vivo, generamos un botón como posible objetivo
-                for objetivo in vivos:
-                    
-                    # Creamos un botón con el nombre del objetivo
-                    button = Button(label=objetivo.display_name, style=discord.ButtonStyle.primary)
-                    # Definimos lo que pasa cuando alguien clickea el botón
-                    async def callback(interaction, obj=objetivo, jug=jugador, rol=rol):
-
-                        # Si alguien distinto al dueño del botón intenta usarlo, se le niega
-                        if interaction.user != jug:
-                            await interaction.response.send_message("🚫 Este botón no es para vos.", ephemeral=True)
-                            return
-
-                        # Si el jugador ya eligió antes, no puede volver a elegir
-                        if jug in partida["acciones"]:
-                            await interaction.response.send_message("⚠️ Ya has elegido a tu objetivo.", ephemeral=True)
-                            return
-
-                        # Guardamos la acción del jugador: qué rol tiene y a quién apuntó
-                        partida["acciones"][jug] = (rol, obj)
-
-                        # Confirmamos al jugador su elección en un mensaje privado
-                        await interaction.response.send_message(f"✅ Elegiste a **{obj.display_name}**.", ephemeral=True)
-                       
-                    # Asociamos el callback al botón
-                    button.callback = callback
-                    # Agregamos el botón a la vista
-                    view.add_item(button)
-                
-                # Le enviamos al jugador por DM la vista con los botones para que elija
-                try:
-                    await jugador.send(f"🕹️ **¡Hora de actuar, {rol.upper()}!**\nElegí a quién usar tu habilidad:\n⬇️⬇️⬇️", view=view)
-                # Si no se puede enviar (por DMs bloqueados, por ejemplo), avisamos en el canal
-                except:
-                    await canal.send(f"⚠️ No se pudo enviar opciones a {jugador.display_name}.")
-
-        # Esperamos 60 segundos para que todos tengan tiempo de elegir
-        await asyncio.sleep(60)
-
-        # Recopilamos los objetivos elegidos por los mafiosos
-        mafia_targets = [accion[1] for jug, accion in partida["acciones"].items() if accion[0] == "mafia"]
-        # Seleccionamos aleatoriamente a una víctima de entre las elecciones de los mafiosos
-        objetivo_mafia = random.choice(mafia_targets) if mafia_targets else None
-
-        # Inicializamos la variable que almacenará a quién curó el doctor
-        objetivo_curado = None
-
-        # Recorremos todas las acciones realizadas durante la noche
-        for jug, (accion, obj) in partida["acciones"].items():
-
-            # Si el rol es doctor, guardamos a quién curó (puede haber varios doctores, pero el último sobrescribirá)
-            if accion == "doctor":
-                objetivo_curado = obj
-        
-        # Recorremos otra vez las acciones para procesar lo que hizo el detective
-        for jug, (accion, obj) in partida["acciones"].items():
-            if accion == "detective":
-
-                # Obtenemos el rol de la persona investigada por el detective
-                rol_obj = partida["roles"].get(obj)
-                try:
-                     # Enviamos por DM el resultado de la investigación
-                    await jug.send(f"🔍 **Investigación completada**:\n🧑‍✈️ **{obj.display_name}** es... **{rol_obj.upper()}**.")
-                except:
-                    await canal.send(f"⚠️ No se pudo enviar el resultado al detective {jug.display_name}.")
-
-        # Inicializamos la variable que almacenará a la víctima de la mafia
-        muerto = None
-        # Si la mafia eligió a alguien, y ese alguien no fue curado por el doctor, y sigue vivo...
-        if objetivo_mafia and objetivo_mafia != objetivo_curado and objetivo_mafia in partida["vivos"]:
-            # ...entonces esa persona muere (la removemos de la lista de vivos)
-            partida["vivos"].remove(objetivo_mafia)
-            muerto = objetivo_mafia # Y la guardamos como "muerto" para anunciarlo luego
-
-        # Actualizamos el estado de la partida a "día" para iniciar la siguiente fase
-        partida["estado"] = "dia"
-
-        # Si hay un jugador muerto (es decir, la mafia mató a alguien que no fue curado)
-        if muerto:
-            # Anunciamos el inicio del día y el nombre del jugador asesinado
-            await canal.send(f"----------☀️**DIA**☀️----------\n☀️ **¡Amanece un nuevo día!**\n💀 Durante la noche, **{muerto.display_name}** fue encontrado... sin vida.")
-            # Obtenemos los roles de los jugadores que siguen vivos
-            vivos_roles = [partida["roles"][j] for j in partida["vivos"]]
-            mafias = vivos_roles.count("mafia") # Contamos cuántas mafias quedan vivas
-            no_mafias = len(partida["vivos"]) - mafias # Calculamos cuántos no-mafias quedan
-
-            # Condición de victoria: si no quedan mafias vivas, gana el pueblo
-            if mafias == 0:
-                await anunciar_fin(canal, partida, ganadores="Ciudadanos")
-                break
-            # Condición de victoria: si las mafias son igual o más que los no-mafias, gana la mafia
-            elif mafias >= no_mafias:
-                await anunciar_fin(canal, partida, ganadores="Mafia")
-                break
+    mensajes.encolar(canal, "🎉 **¡La partida ha comenzado!** 🔥 Que comience la masacre...\n🌙 **Cae la noche...** Los roles especiales están actuando...")
+    await empezar_noche(partida)
+
+# --------- FASE DE NOCHE ---------
+async def empezar_noche(partida):
+    fase = partida.fase # Los plazos de esta noche se programan con esta fase, aunque la partida avance mientras mandamos DMs
+    juego, jugadores, canal = partida.juego, partida.jugadores, partida.canal
+    partida.estado = "noche"
+    partida.acciones = {}  # Reiniciamos las acciones nocturnas
+    partida.primera_accion = None
+    duracion = partida.duracion_fase
+
+    # Anuncio general de que comenzó la noche
+    mensajes.encolar(canal, f"----------🌕**NOCHE**🌕----------\n🌌 **NOCHE** ha caído sobre el pueblo...\n⏳ Aquellos con habilidades tienen **{duracion} segundos** para actuar.⏳\n😴 Los ciudadanos... duermen sin sospechar.")
+
+    vivos = list(juego.indices_vivos()) # Índices de los vivos, en orden de llegada
+    # Armamos los menús una sola vez: todos los roles activos reciben la misma vista
+    view = armar_menus(partida, vivos)
+
+    # Solo enviamos el menú a los que tienen rol activo en la noche
+    envios = [
+        (jugadores[i], f"🕹️ **¡Hora de actuar, {juego.rol(i).upper()}!**\nElegí a quién usar tu habilidad:\n⬇️⬇️⬇️", view)
+        for i in vivos if juego.rol(i) in motor.ROLES_NOCTURNOS
+    ]
+
+    # Esperamos que actúen todos los que reciben el menú
+    partida.esperados = {partida.indice(envio[0]) for envio in envios}
+    # Programamos el final de la noche antes de mandar los DMs, así el plazo corre desde el anuncio
+    programar_paso(partida, duracion, cerrar_noche, avisos=True)
+    # Los jugadores automáticos con rol nocturno no reciben el menú: eligen mientras se mandan los DMs
+    nocturnos = automaticos_vivos(partida, lambda i: juego.rol(i) in motor.ROLES_NOCTURNOS)
+    if nocturnos:
+        planificador.programar(0, jugar_automaticos, partida.id, fase, nocturnos)
+
+    # Le enviamos a todos los roles activos el menú en paralelo
+    # Si no se puede enviar (por DMs bloqueados, por ejemplo), avisamos en el canal
+    fallidos = await enviar_dms(canal, envios, "No se pudo enviar opciones a", metrica="fanout_noche",
+                                vigente=lambda: sigue(partida))
+    if not sigue(partida):
+        return
+
+    # Los que no recibieron el menú no pueden actuar, así que no los esperamos
+    partida.esperados -= {partida.indice(j) for j in fallidos}
+    persistencia.anotar("esperados", partida.id, sorted(partida.esperados))
+    # Si ya actuaron todos (o nadie puede actuar), terminamos la noche sin esperar
+    if partida.fase == fase and partida.esperados <= partida.acciones.keys():
+        planificador.programar(0, avanzar, partida.id, fase, cerrar_noche)
+
+# Fin de la noche: se resuelve quién muere y empieza el día
+async def cerrar_noche(partida):
+    juego, jugadores, canal = partida.juego, partida.jugadores, partida.canal
+    if partida.primera_accion is not None:
+        metricas.duracion("noche_primera_accion_a_resolucion", time.monotonic() - partida.primera_accion)
+    if await revisar_abandono(partida, bool(partida.acciones)):
+        return
+
+    # Resolvemos la noche con las reglas del juego: quién muere y qué averiguaron los detectives
+    muerto, investigaciones = motor.resolver_noche(juego, partida.acciones, partida.rng)
+    # Los detectives automáticos se acuerdan de lo que averiguaron (a los demás se les manda por DM)
+    for jug, obj, rol_obj in investigaciones:
+        if automaticos.es_automatico(jugadores[jug]):
+            jugadores[jug].conocidos[obj] = rol_obj
+    historial.anotar("noche", partida.id, [dato for jug, (_, obj) in partida.acciones.items() for dato in (jug, obj)], muerto)
+
+    # Actualizamos el estado de la partida a "día" para iniciar la siguiente fase
+    partida.estado = "dia"
+    # Si la mafia mató a alguien que no fue curado, lo removemos de los vivos
+    if muerto is not None:
+        juego.matar(muerto)
+        persistencia.anotar("muerte", partida.id, muerto)
+
+    # Reiniciamos los votos antes de cualquier await
+    partida.recuento = motor.Recuento()
+    partida.mensaje_votos = None
+    partida.edicion_programada = False
+    partida.primera_accion = None
+
+    # Enviamos por DM los resultados de todas las investigaciones en paralelo
+    await enviar_dms(canal, [
+        (jugadores[jug], f"🔍 **Investigación completada**:\n🧑‍✈️ **{jugadores[obj].display_name}** es... **{rol_obj.upper()}**.")
+        for jug, obj, rol_obj in investigaciones
+    ], "No se pudo enviar el resultado al detective", metrica="fanout_detectives", vigente=lambda: sigue(partida))
+    if not sigue(partida):
+        return
+
+    # Si hay un jugador muerto (es decir, la mafia mató a alguien que no fue curado)
+    if muerto is not None:
+        # Anunciamos el inicio del día y el nombre del jugador asesinado
+        mensajes.encolar(canal, f"----------☀️**DIA**☀️----------\n☀️ **¡Amanece un nuevo día!**\n💀 Durante la noche, **{jugadores[muerto].display_name}** fue encontrado... sin vida.")
+        # Verificamos si con esta muerte alguno de los bandos ganó
+        ganadores = motor.verificar_victoria(juego)
+        if ganadores:
+            await anunciar_fin(canal, partida, ganadores=ganadores)
+            return
+    else:
+        mensajes.encolar(canal, "----------☀️**DIA**☀️----------\n☀️ **¡Amanece un nuevo día!**\n😮 Pero esta vez... **¡nadie murió!**\n🧐 ¿Una protección o un error de cálculo?")
+
+    mensajes.encolar(canal, "🗳️ **Es hora de votar**: ¿quién creés que es parte de la mafia?")
+
+    # Un solo mensaje con los menús de votación, con un jugador vivo por opción
+    view = armar_menus(partida, list(juego.indices_vivos()))
+    programar_paso(partida, partida.duracion_fase, cerrar_votacion, avisos=True)
+    mensaje = await mensajes.enviar(canal, f"⏳Tienen solo **{partida.duracion_fase} segundos**⏳\n🔻 Elegí en el menú al jugador que querés eliminar (elegilo otra vez para retirar tu voto):", view=view)
+    if not sigue(partida):
+        return
+    # Guardamos el texto tal como salió (con los avisos que se juntaron) para agregarle el recuento al editarlo
+    partida.mensaje_votos, partida.texto_votos = mensaje, mensaje.content
+    # Votos que llegaron antes de que volviera el envío
+    if len(partida.recuento):
+        programar_recuento(partida)
+    # Los jugadores automáticos votan después de los menús, así ven el recuento si ya votó alguien
+    votantes = automaticos_vivos(partida)
+    if votantes:
+        planificador.programar(0, jugar_automaticos, partida.id, partida.fase, votantes)
+
+# Fin de la votación: se cuenta, se elimina al más votado y se programa la próxima noche
+async def cerrar_votacion(partida):
+    juego, jugadores, canal, votos = partida.juego, partida.jugadores, partida.canal, partida.votos
+    if partida.primera_accion is not None:
+        metricas.duracion("voto_primer_voto_a_resolucion", time.monotonic() - partida.primera_accion)
+    if await revisar_abandono(partida, bool(votos)):
+        return
+
+    # Si hubo al menos un voto durante la votación
+    if votos:
+        # El recuento ya está hecho: si hay empate no se elimina a nadie
+        eliminado, candidatos = partida.recuento.resultado()
+        historial.anotar("votacion", partida.id, [dato for par in votos.items() for dato in par], eliminado)
+
+        # Si solo hay un jugador con más votos, ese jugador es eliminado
+        if eliminado is not None:
+            juego.matar(eliminado) # Lo eliminamos de los vivos
+            persistencia.anotar("muerte", partida.id, eliminado)
+            mensajes.encolar(canal, f"⚰️ **{jugadores[eliminado].display_name}** fue eliminado por votación del pueblo.")
         else:
-            await canal.send("----------☀️**DIA**☀️----------\n☀️ **¡Amanece un nuevo día!**\n😮 Pero esta vez... **¡nadie murió!**\n🧐 ¿Una protección o un error de cálculo?")
-
-        await canal.send("🗳️ **Es hora de votar**: ¿quién creés que es parte de la mafia?")
-
-        # Diccionario para guardar los votos realizados
-        votos = {}
-        # Creamos una vista con botones para que los jugadores voten
-        view = View()
-
-        # Por cada jugador vivo, agregamos un botón para votar por él
-        for objetivo in partida["vivos"]:
-            button = Button(label=objetivo.display_name, style=discord.ButtonStyle.danger)
-
-            # Función que se ejecuta cuando se hace clic en un botón de voto
-            async def callback(interaction, obj=objetivo):
-                votante = interaction.user
-
-                # Validamos que el votante esté vivo
-                if votante not in partida["vivos"]:
-                    await interaction.response.send_message("🚫 No estás vivo en la partida.", ephemeral=True)
-                    return
-                
-                # Validamos que no haya votado ya
-                if votante in votos:
-                    await interaction.response.send_message("⚠️ Ya votaste.", ephemeral=True)
-                    return
-
-                # Registramos el voto
-                votos[votante] = obj
-                await interaction.response.send_message(f"✅ Votaste por **{obj.display_name}**.", ephemeral=True)
-
-            # Asignamos el callback al botón
-            button.callback = callback
-            view.add_item(button)
-
-        # Enviamos el mensaje con los botones de votación
-        await canal.send("⏳Tienen solo **60 segundos**⏳\n🔻 Hacé clic en el nombre del jugador que querés eliminar:", view=view)
-        await asyncio.sleep(60) # Esperamos 60 segundos para que todos voten
-
-        # Si hubo al menos un voto durante la votación
-        if votos:
-            conteo = {} # Diccionario para contar cuántos votos recibió cada jugador
-            # Recorremos todos los votos y sumamos los votos para cada jugador
-            for elegido in votos.values():
-                conteo[elegido] = conteo.get(elegido, 0) + 1
-
-            # Buscamos el número máximo de votos recibidos por un jugador
-            max_votos = max(conteo.values())
-            
-            # Buscamos quiénes recibieron ese número máximo de votos (por si hay empate)
-            candidatos = [jug for jug, votos in conteo.items() if votos == max_votos]
-            
-            # Si solo hay un jugador con más votos, ese jugador es eliminado
-            if len(candidatos) == 1:
-                eliminado = candidatos[0] # Lo eliminamos de la lista de vivos
-                partida["vivos"].discard(eliminado)
-                await canal.send(f"⚰️ **{eliminado.display_name}** fue eliminado por votación del pueblo.")
-            else:
-                # Si hay un empate, no se elimina a nadie y se informa
-                empatados = ", ".join(j.display_name for j in candidatos)
-                await canal.send(f"⚖️ ¡Empate entre **{empatados}**!\n😶 Nadie será eliminado hoy.")
+            # Si hay un empate, no se elimina a nadie y se informa
+            empatados = ", ".join(jugadores[j].display_name for j in candidatos)
+            mensajes.encolar(canal, f"⚖️ ¡Empate entre **{empatados}**!\n😶 Nadie será eliminado hoy.")
+    else:
+        historial.anotar("votacion", partida.id, [], None)
+        mensajes.encolar(canal, "😶 Nadie votó. El pueblo decide no eliminar a nadie hoy.")
+
+    # Volvemos a verificar la victoria después de la votación
+    ganadores = motor.verificar_victoria(juego)
+    if ganadores:
+        await anunciar_fin(canal, partida, ganadores=ganadores)
+        return
+
+    # Pausa entre rondas: la próxima noche la arranca el planificador
+    programar_paso(partida, PAUSA_ENTRE_RONDAS, empezar_noche)
+
+# Pasos que se pueden volver a programar al recuperar una partida, por nombre
+PASOS = {paso.__name__: paso for paso in (expirar_lobby, empezar_noche, cerrar_noche, cerrar_votacion)}
+
+# Vuelve a armar una partida a partir de su registro guardado (ver persistencia.py).
+# `jugadores` son los miembros en orden de índice. El generador aleatorio arranca de nuevo desde la semilla.
+def restaurar_partida(canal, jugadores, registro):
+    partida = Partida(jugadores[0], canal, registro["num_jugadores"], registro["semilla"])
+    for miembro in jugadores[1:]:
+        partida.agregar(miembro)
+    partida.estado = registro["estado"]
+    partida.fase = registro["fase"] # La misma fase de antes, así los menús que ya están en Discord siguen andando
+    partida.duracion_fase = registro["duracion"]
+    if registro["roles"] is not None:
+        juego = partida.juego = motor.EstadoJuego([motor.ORDEN_ROLES[int(codigo)] for codigo in registro["roles"]])
+        for i in range(len(jugadores)):
+            if not registro["vivos"] >> i & 1:
+                juego.matar(i)
+        partida.acciones = {jug: (juego.rol(jug), obj) for jug, obj in registro["acciones"].items()}
+        partida.recuento = motor.Recuento(registro["votos"])
+        if registro["esperados"] is not None:
+            partida.esperados = set(registro["esperados"])
         else:
-            await canal.send("😶 Nadie votó. El pueblo decide no eliminar a nadie hoy.")
-
-        # Volvemos a calcular cuántas mafias y no-mafias quedan vivos después de la votación
-        vivos_roles = [partida["roles"][j] for j in partida["vivos"]]
-        mafias = vivos_roles.count("mafia")
-        no_mafias = len(partida["vivos"]) - mafias
-
-        if mafias == 0:
-            await anunciar_fin(canal, partida, ganadores="Ciudadanos")
-            break
-        elif mafias >= no_mafias:
-            await anunciar_fin(canal, partida, ganadores="Mafia")
-            break
-
-        await asyncio.sleep(5)
+            partida.esperados = {i for i in juego.indices_vivos() if juego.rol(i) in motor.ROLES_NOCTURNOS}
+
+    partidas[partida.id] = partida
+    partidas_por_servidor[partida.servidor] = partidas_por_servidor.get(partida.servidor, 0) + 1
+    for miembro in jugadores:
+        partida_de_jugador[miembro.id] = partida
+    return partida
+
+# Recupera las partidas que estaban en curso cuando el bot se apagó y vuelve a programar sus plazos.
+# Los menús que ya estaban en Discord siguen funcionando solos: MenuJugadores encuentra la partida por
+# el id del canal que lleva en su custom_id. Devuelve cuántas partidas se recuperaron.
+async def recuperar_partidas(registros, obtener_canal):
+    global _fases
+    # Los jugadores se buscan juntos por servidor (ver miembros.obtener_varios), y todos los servidores a la vez
+    canales = {canal_id: obtener_canal(canal_id) for canal_id in registros}
+    por_servidor = {}
+    for canal_id, canal in canales.items():
+        if canal is not None:
+            _, ids = por_servidor.setdefault(canal.guild.id, (canal.guild, []))
+            ids.extend(j for j in registros[canal_id]["jugadores"] if not automaticos.es_id_automatico(j))
+    encontrados = dict(zip(por_servidor, await asyncio.gather(
+        *(miembros.obtener_varios(servidor, ids) for servidor, ids in por_servidor.values()), return_exceptions=True)))
+
+    restauradas = []
+    for canal_id, registro in list(registros.items()):
+        canal = canales[canal_id]
+        hallados = encontrados[canal.guild.id] if canal else {}
+        if isinstance(hallados, BaseException):
+            if not isinstance(hallados, (discord.HTTPException, OSError, asyncio.TimeoutError)):
+                raise hallados
+            # Discord no contestó bien (no es que alguien se haya ido): la partida sigue guardada y se reintenta
+            print(f'No se pudieron buscar los jugadores de la partida del canal {canal_id}: {hallados!r}')
+            planificador.programar(REINTENTO_RECUPERACION, reintentar_recuperacion, canal_id, obtener_canal)
+            continue
+        jugadores = [automaticos.JugadorAutomatico(canal_id, i) if automaticos.es_id_automatico(j)
+                     else hallados.get(j) for i, j in enumerate(registro["jugadores"])] if canal else []
+        # Si el canal o algún jugador ya no existe, la partida no puede seguir
+        if canal is None or None in jugadores:
+            persistencia.anotar("fin", canal_id)
+            continue
+        restauradas.append((restaurar_partida(canal, jugadores, registro), registro))
+
+    # Las fases nuevas tienen que ser mayores que todas las recuperadas
+    if restauradas:
+        _fases = itertools.count(max(next(_fases), max(p.fase for p, _ in restauradas) + 1))
+
+    ahora = time.time()
+    for partida, registro in restauradas:
+        paso = PASOS.get(registro["paso"])
+        demora = max(0, registro["momento"] - ahora) if registro["momento"] else 0
+        # Se cortó justo después de repartir los roles, antes de programar la primera noche
+        if partida.juego is not None and partida.estado == "esperando":
+            partida.estado, paso, demora = "noche", empezar_noche, 0
+        # Si todos ya habían actuado o votado, la fase se cierra ya
+        if paso is cerrar_noche and partida.esperados <= partida.acciones.keys():
+            demora = 0
+        elif paso is cerrar_votacion and len(partida.votos) >= partida.juego.num_vivos:
+            demora = 0
+        # Si sigue el mismo paso de la misma fase, su plazo ya está anotado (con las acciones y votos de la fase)
+        paso = paso or expirar_lobby
+        programar_paso(partida, demora, paso, avisos=paso in (cerrar_noche, cerrar_votacion),
+                       anotar=paso.__name__ != registro["paso"])
+        # Los jugadores automáticos que todavía no habían elegido vuelven a pensar
+        if paso is cerrar_noche:
+            pendientes = automaticos_vivos(partida, lambda i: i in partida.esperados and i not in partida.acciones)
+        elif paso is cerrar_votacion:
+            pendientes = automaticos_vivos(partida, lambda i: i not in partida.votos)
+        else:
+            pendientes = []
+        if pendientes and demora:
+            planificador.programar(0, jugar_automaticos, partida.id, partida.fase, pendientes)
+        # El mensaje de la votación quedó en el proceso anterior: mandamos uno nuevo para seguir mostrando el recuento
+        if paso is cerrar_votacion and demora:
+            planificador.programar(0, reponer_votacion, partida.id, partida.fase)
+        # El relleno automático corre desde que se creó la partida (su plazo de espera menos ESPERA_LOBBY)
+        if paso is expirar_lobby and RELLENO_AUTOMATICO and MAX_AUTOMATICOS and registro["momento"]:
+            relleno = max(0, registro["momento"] - ESPERA_LOBBY + RELLENO_AUTOMATICO - ahora)
+            planificador.programar(relleno, rellenar_lobby, partida.id, partida.fase, grupo=(partida.id, partida.fase))
+        if partida.juego is not None:
+            historial.anotar("reinicio", partida.id) # Desde acá el rng vuelve a empezar desde la semilla
+        mensajes.encolar(partida.canal, "♻️ El bot se reinició, pero la partida sigue donde estaba.")
+    return len(restauradas)
+
+# Manda de nuevo el mensaje de la votación (con sus menús) de una partida recuperada en pleno día, y lo
+# deja como el que se edita con el recuento. Los votos de antes siguen contando.
+async def reponer_votacion(canal_id, fase):
+    partida = partidas.get(canal_id)
+    if partida is None or partida.fase != fase:
+        return
+    view = armar_menus(partida, list(partida.juego.indices_vivos()))
+    mensaje = await mensajes.enviar(partida.canal, "🗳️ **La votación sigue**: los votos de antes cuentan.\n🔻 Elegí en el menú al jugador que querés eliminar (elegilo otra vez para retirar tu voto):", view=view)
+    if not sigue(partida) or partida.fase != fase:
+        return
+    partida.mensaje_votos, partida.texto_votos = mensaje, mensaje.content
+    if len(partida.recuento):
+        programar_recuento(partida)
+
+# Vuelve a intentar recuperar una partida que no se pudo armar porque Discord falló, si sigue guardada
+async def reintentar_recuperacion(canal_id, obtener_canal):
+    registro = persistencia.registros.get(canal_id)
+    if registro is not None and canal_id not in partidas:
+        await recuperar_partidas({canal_id: registro}, obtener_canal)
 
 # Función que se llama cuando la partida termina, para anunciar a los ganadores y mostrar los roles
 async def anunciar_fin(canal, partida, ganadores):
-    # Mensaje inicial anunciando el fin de la partida y quién ganó
-    await canal.send(f"🏁 **¡LA PARTIDA HA TERMINADO!**\n🥇 **GANADORES: {ganadores.upper()}** 🎉\n🔎 Revelando roles...")
-
-    resumen = {} # Diccionario que agrupará los nombres de los jugadores por rol
-    
-    # Recorremos todos los jugadores y sus roles
-    for jugador, rol in partida["roles"].items():
-        resumen.setdefault(rol, []).append(jugador.display_name) # Agrupamos por rol
-
-    # Mostramos en el canal qué jugadores tenía cada rol (en orden)
-    for rol in ["mafia", "doctor", "detective", "ciudadano"]:
-        if rol in resumen:
-            jugadores = ", ".join(resumen[rol])
-            await canal.send(f"🔹 **{rol.capitalize()}s**: {jugadores}")
-    
+    # Los roles se revelan en un solo embed, con un campo por rol (en orden)
+    embed = discord.Embed(title="🔎 Roles de la partida", color=discord.Color.gold())
+    nombres = [j.display_name for j in partida.jugadores]
+    for rol, nombres_rol in motor.resumen_roles(partida.juego, nombres).items():
+        embed.add_field(name=f"🔹 {rol.capitalize()}s", value=", ".join(nombres_rol), inline=False)
     # Mensaje final de cierre, invitando a jugar otra vez
-    await canal.send("🕹️ ¡Gracias por jugar! Volvé a organizar otra partida con `!mafia crear`.")
+    embed.set_footer(text="🕹️ ¡Gracias por jugar! Volvé a organizar otra partida con !mafia crear")
+
+    # Un solo mensaje anunciando el fin de la partida, quién ganó y los roles
+    await mensajes.enviar(canal, f"🏁 **¡LA PARTIDA HA TERMINADO!**\n🥇 **GANADORES: {ganadores.upper()}** 🎉", embed=embed)
+
+    terminar_partida(partida, ganadores) # Eliminamos la partida de los registros globales, ya que terminó
 
-    del partidas[canal.guild.id] # Eliminamos la partida del registro global, ya que terminó
+    # Cerramos la cola del canal y anotamos cuántos pedidos a la API nos ahorramos en esta partida
+    enviados, ahorrados = await mensajes.cerrar(canal)
+    # En las muestras para los benchmarks, y como histogramas para las métricas publicadas
+    metricas.registrar("mensajes_por_partida", enviados)
+    metricas.registrar("mensajes_ahorrados_por_partida", ahorrados)
+    metricas.observar("mensajes_por_partida", enviados, baldes=metricas.BALDES_CANTIDAD)
+    metricas.observar("mensajes_ahorrados_por_partida", ahorrados, baldes=metricas.BALDES_CANTIDAD)
 
-bot.run(TOKEN) # Corremos el bot
+if __name__ == "__main__":
+    # SIGTERM (un deploy, systemd, docker stop) apaga el bot igual que Ctrl+C, pasando por `apagar`
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    bot.run(TOKEN) # Corremos el bot
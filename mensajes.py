@@ -0,0 +1,110 @@
+# Cola de mensajes salientes por canal.
+# Cada canal.send es un pedido a la API y todos comparten el rate limit global del bot, así que
+# los textos que una partida manda seguidos se juntan en un solo mensaje (hasta 2000 caracteres).
+# Los textos esperan una ventana corta por si llegan más; un mensaje con vista o embed sale en el
+# momento, después de los textos pendientes (que viajan como su contenido si entran), así no se
+# desordena nada.
+import asyncio
+import discord
+import metricas
+import planificador
+
+LIMITE_MENSAJE = 2000  # Caracteres máximos de un mensaje de Discord
+VENTANA = 0.5  # Segundos que esperamos a que lleguen más textos antes de enviar
+
+# Colas abiertas: id del canal -> ColaCanal
+colas = {}
+
+class ColaCanal:
+    __slots__ = ("canal", "textos", "programada", "candado", "enviados", "ahorrados")
+
+    def __init__(self, canal):
+        self.canal = canal
+        self.textos = [] # Textos que todavía no se enviaron, en orden
+        self.programada = False # Si ya hay un envío programado en el planificador para cuando se cumpla la ventana
+        self.candado = asyncio.Lock() # Un envío a la vez, para respetar el orden
+        self.enviados = 0 # Pedidos a la API que hicimos
+        self.ahorrados = 0 # Pedidos que nos ahorramos por juntar textos
+
+def _cola(canal):
+    cola = colas.get(canal.id)
+    if cola is None:
+        cola = colas[canal.id] = ColaCanal(canal)
+    return cola
+
+# Junta los textos en la menor cantidad de mensajes posible, sin pasar el límite y sin cambiar el orden
+def _juntar(textos):
+    trozos = []
+    for texto in textos:
+        if trozos and len(trozos[-1]) + 1 + len(texto) <= LIMITE_MENSAJE:
+            trozos[-1] += "\n" + texto
+        else:
+            trozos.append(texto)
+    return trozos
+
+async def _mandar(cola, contenido, **kwargs):
+    cola.enviados += 1
+    with metricas.medir("envio", destino="canal"):
+        return await cola.canal.send(contenido, **kwargs)
+
+# Envía los textos pendientes. Lo llama el plazo de la ventana o `cerrar`.
+async def _vaciar(cola):
+    async with cola.candado:
+        textos, cola.textos = cola.textos, []
+        trozos = _juntar(textos)
+        cola.ahorrados += len(textos) - len(trozos)
+        for trozo in trozos:
+            try:
+                await _mandar(cola, trozo)
+            except discord.HTTPException as e:
+                # Nadie espera este envío, así que solo lo dejamos registrado
+                print(f"No se pudo enviar un mensaje al canal {cola.canal.id}: {e}")
+
+# Se cumplió la ventana del canal. Si `enviar` o `cerrar` ya se llevaron los textos, no hay nada que hacer.
+async def _vaciar_luego(canal_id):
+    cola = colas.get(canal_id)
+    if cola is not None:
+        cola.programada = False
+        await _vaciar(cola)
+
+# Agrega un texto a la cola del canal. Sale junto con los que lleguen dentro de la ventana.
+def encolar(canal, texto):
+    cola = _cola(canal)
+    cola.textos.append(texto)
+    if not cola.programada:
+        cola.programada = True
+        planificador.programar(VENTANA, _vaciar_luego, canal.id)
+
+# Envía ya un mensaje (normalmente con vista o embed), después de los textos pendientes.
+# Si los textos pendientes entran, se mandan como parte del contenido de este mismo mensaje.
+# Devuelve el mensaje enviado.
+async def enviar(canal, contenido=None, **kwargs):
+    cola = _cola(canal)
+    async with cola.candado:
+        textos, cola.textos = cola.textos, []
+        sin_juntar = len(textos) + 1 # Pedidos que haríamos sin la cola
+        if contenido is not None:
+            textos.append(contenido)
+        trozos = _juntar(textos) or [None]
+        cola.ahorrados += sin_juntar - len(trozos)
+        for trozo in trozos[:-1]:
+            await _mandar(cola, trozo)
+        return await _mandar(cola, trozos[-1], **kwargs)
+
+# Edita un mensaje ya enviado (por ejemplo, el del recuento de votos). Nadie espera el resultado,
+# así que si falla solo queda registrado.
+async def editar(mensaje, contenido):
+    try:
+        with metricas.medir("envio", destino="edicion"):
+            await mensaje.edit(content=contenido)
+    except discord.HTTPException as e:
+        print(f"No se pudo editar un mensaje del canal {mensaje.channel.id}: {e}")
+
+# Envía lo pendiente y cierra la cola del canal (al terminar o cancelar una partida).
+# Devuelve (pedidos enviados, pedidos ahorrados) desde que se abrió la cola.
+async def cerrar(canal):
+    cola = colas.pop(canal.id, None)
+    if cola is None:
+        return 0, 0
+    await _vaciar(cola)
+    return cola.enviados, cola.ahorrados
@@ -0,0 +1,192 @@
+# Registro simple de métricas en memoria para poder ver qué tan rápido responde el bot.
+# Además de las muestras de siempre, cada métrica se acumula como las entiende Prometheus
+# (histogramas, contadores y medidores, con etiquetas) y `servir` las publica en un puerto local
+# para que las lea un Prometheus o, a mano, un `curl localhost:9108/metrics`.
+import asyncio
+import bisect
+import logging
+import os
+import resource
+import time
+from collections import deque
+
+# Cantidad máxima de muestras que guardamos por métrica (las más viejas se descartan)
+MAX_MUESTRAS = 1000
+
+# Límites de los baldes de los histogramas, en segundos. Incluye 3 porque es el plazo que da
+# Discord para responder una interacción.
+BALDES = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2, 3, 5, 10, 30)
+# Límites de los baldes para histogramas de cantidades (por ejemplo, mensajes por partida)
+BALDES_CANTIDAD = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# Diccionario con las muestras de cada métrica: nombre -> deque de valores
+muestras = {}
+
+# Para Prometheus: (nombre, etiquetas) -> datos. Las etiquetas son una tupla ordenada de (clave, valor).
+histogramas = {} # -> [cantidad por balde (el último es "más que todos"), suma, cantidad, límites de los baldes]
+contadores = {} # -> total
+medidores = {} # nombre -> (función, etiqueta). Se calculan recién al publicar.
+
+# Guarda un valor (por ejemplo una duración en segundos) bajo el nombre de la métrica
+def registrar(nombre, valor):
+    muestras.setdefault(nombre, deque(maxlen=MAX_MUESTRAS)).append(valor)
+
+# Registra una duración (en segundos) medida a mano: en las muestras, como `medir`, y en el histograma
+# "<nombre>_segundos" para que salga en las métricas publicadas
+def duracion(nombre, segundos, **etiquetas):
+    registrar(nombre, segundos)
+    observar(f"{nombre}_segundos", segundos, **etiquetas)
+
+# Devuelve un pequeño resumen de una métrica: cantidad de muestras, promedio y máximo
+def resumen(nombre):
+    valores = muestras.get(nombre)
+    if not valores:
+        return {"cantidad": 0, "promedio": 0.0, "maximo": 0.0}
+    return {
+        "cantidad": len(valores),
+        "promedio": sum(valores) / len(valores),
+        "maximo": max(valores),
+    }
+
+# Suma una observación (en segundos, o con `baldes` propios) al histograma `nombre` con esas etiquetas
+def observar(nombre, valor, baldes=BALDES, **etiquetas):
+    _observar((nombre, tuple(sorted(etiquetas.items())) if etiquetas else ()), valor, baldes)
+
+def _observar(clave, valor, baldes=BALDES):
+    histograma = histogramas.get(clave)
+    if histograma is None:
+        histograma = histogramas[clave] = [[0] * (len(baldes) + 1), 0.0, 0, baldes]
+    histograma[0][bisect.bisect_left(histograma[3], valor)] += 1
+    histograma[1] += valor
+    histograma[2] += 1
+
+# Suma `cantidad` al contador `nombre` con esas etiquetas
+def contar(nombre, cantidad=1, **etiquetas):
+    clave = (nombre, tuple(sorted(etiquetas.items())))
+    contadores[clave] = contadores.get(clave, 0) + cantidad
+
+# Registra un medidor: un valor que se calcula en el momento de publicar (por ejemplo, partidas activas).
+# Con `etiqueta`, `funcion` devuelve un diccionario valor de la etiqueta -> número.
+def medidor(nombre, funcion, etiqueta=None):
+    medidores[nombre] = (funcion, etiqueta)
+
+# Context manager para medir cuánto tarda un bloque de código. Ej:
+#   with medir("fanout_roles"):
+#       ...
+# La duración queda en las muestras y en el histograma "<nombre>_segundos" (con las etiquetas que se pasen).
+class medir:
+    __slots__ = ("nombre", "clave", "inicio", "duracion")
+
+    def __init__(self, nombre, **etiquetas):
+        self.nombre = nombre
+        self.clave = (f"{nombre}_segundos", tuple(sorted(etiquetas.items())) if etiquetas else ())
+
+    def __enter__(self):
+        self.inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.duracion = time.perf_counter() - self.inicio
+        registrar(self.nombre, self.duracion)
+        _observar(self.clave, self.duracion)
+        return False
+
+# --------- Proceso ---------
+# Memoria del proceso en MiB (RSS actual; si no hay /proc, el máximo que usó)
+def memoria():
+    try:
+        with open("/proc/self/statm") as archivo:
+            return int(archivo.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+# Mide todo el tiempo cuánto más de `intervalo` tarda en despertar una tarea que duerme (el retraso
+# del event loop) y lo va dejando en `retrasos`
+async def medir_retraso(retrasos, intervalo=0.01):
+    while True:
+        inicio = time.perf_counter()
+        await asyncio.sleep(intervalo)
+        retrasos.append(time.perf_counter() - inicio - intervalo)
+
+# --------- Esperas por rate limit ---------
+# discord.py espera solo cuando Discord le responde 429, y lo único que deja es un aviso en el log.
+# Escuchamos ese aviso para contar las esperas y cuánto duraron.
+class _EscuchaRateLimits(logging.Handler):
+    def emit(self, registro):
+        mensaje = registro.msg
+        if not isinstance(mensaje, str) or not registro.args:
+            return
+        if mensaje.startswith("We are being rate limited.") and "Retrying in" in mensaje:
+            observar("rate_limit_espera_segundos", float(registro.args[-1]))
+        elif mensaje.startswith("Global rate limit has been hit."):
+            contar("rate_limits_globales")
+
+# Empieza a contar las esperas por rate limit de discord.py (llamar una sola vez)
+def escuchar_rate_limits():
+    logging.getLogger("discord.http").addHandler(_EscuchaRateLimits(logging.WARNING))
+
+# --------- Formato de Prometheus ---------
+def _etiquetas(pares):
+    if not pares:
+        return ""
+    return "{" + ",".join(f'{clave}="{valor}"' for clave, valor in pares) + "}"
+
+def _numero(valor):
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+# Devuelve todas las métricas en el formato de texto de Prometheus
+def texto():
+    lineas = []
+    tipos = set()
+
+    def encabezado(nombre, tipo):
+        if nombre not in tipos:
+            tipos.add(nombre)
+            lineas.append(f"# TYPE {nombre} {tipo}")
+
+    for (nombre, pares), (en_baldes, suma, cantidad, baldes) in sorted(histogramas.items()):
+        nombre = f"mafia_{nombre}"
+        encabezado(nombre, "histogram")
+        acumulado = 0
+        for limite, en_balde in zip(baldes, en_baldes):
+            acumulado += en_balde
+            lineas.append(f"{nombre}_bucket{_etiquetas(pares + (('le', limite),))} {acumulado}")
+        lineas.append(f"{nombre}_bucket{_etiquetas(pares + (('le', '+Inf'),))} {cantidad}")
+        lineas.append(f"{nombre}_sum{_etiquetas(pares)} {_numero(suma)}")
+        lineas.append(f"{nombre}_count{_etiquetas(pares)} {cantidad}")
+
+    for (nombre, pares), total in sorted(contadores.items()):
+        nombre = f"mafia_{nombre}_total"
+        encabezado(nombre, "counter")
+        lineas.append(f"{nombre}{_etiquetas(pares)} {_numero(total)}")
+
+    for nombre, (funcion, etiqueta) in sorted(medidores.items()):
+        nombre = f"mafia_{nombre}"
+        encabezado(nombre, "gauge")
+        if etiqueta is None:
+            lineas.append(f"{nombre} {_numero(funcion())}")
+        else:
+            for valor_etiqueta, valor in funcion().items():
+                lineas.append(f"{nombre}{_etiquetas(((etiqueta, valor_etiqueta),))} {_numero(valor)}")
+    return "\n".join(lineas) + "\n"
+
+# --------- Servidor HTTP ---------
+# Un servidor HTTP mínimo sobre asyncio: cualquier GET devuelve las métricas. Corre en el mismo event
+# loop que el bot y solo arma el texto cuando alguien lo pide, así que no le cuesta nada al bot.
+async def _atender(lector, escritor):
+    try:
+        # Leemos el pedido hasta la línea vacía (no nos importa la ruta ni los encabezados)
+        while (await asyncio.wait_for(lector.readline(), 5)).strip():
+            pass
+        cuerpo = texto().encode()
+        escritor.write(b"HTTP/1.0 200 OK\r\nContent-Type: text/plain; version=0.0.4; charset=utf-8\r\n"
+                       + f"Content-Length: {len(cuerpo)}\r\n\r\n".encode() + cuerpo)
+        await escritor.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        escritor.close()
+
+# Publica las métricas en http://<host>:<puerto>/metrics. Devuelve el servidor de asyncio.
+async def servir(puerto, host="127.0.0.1"):
+    return await asyncio.start_server(_atender, host, puerto)
@@ -0,0 +1,71 @@
+# Caché chica de miembros de Discord.
+# El bot no descarga ni guarda a todos los miembros de cada servidor (ver la configuración del bot en
+# mafia.py): los que están jugando ya los tiene la partida, y al terminar pasan a esta caché por si
+# vuelven a jugar pronto. Cuando se llena, se descartan los que hace más tiempo que no se usan.
+import asyncio
+from collections import OrderedDict
+
+import discord
+
+MAX_MIEMBROS = 5000  # Miembros que guardamos como mucho, sumando todos los servidores
+POR_CONSULTA = 100  # Miembros que se pueden pedir como mucho en cada consulta por el gateway
+# Desde cuántos miembros de un servidor conviene pedirlos por el gateway y no de a uno por la API: el
+# gateway deja mandar unos 120 pedidos por minuto en cada shard y la API unos 50 por segundo en total
+CONSULTA_DESDE = 25
+PEDIDOS_A_LA_VEZ = 50  # Pedidos de a uno a la API en vuelo a la vez, sumando todos los servidores
+
+_cache = OrderedDict() # (id del servidor, id del miembro) -> miembro, del menos al más usado
+_pedidos = asyncio.Semaphore(PEDIDOS_A_LA_VEZ)
+
+# Guarda (o refresca) un miembro en la caché, descartando al menos usado si se pasa del límite
+def guardar(miembro):
+    clave = (miembro.guild.id, miembro.id)
+    _cache[clave] = miembro
+    _cache.move_to_end(clave)
+    while len(_cache) > MAX_MIEMBROS:
+        _cache.popitem(last=False)
+
+# Busca un miembro en la caché o en la caché de discord.py (si se descargan todos al iniciar)
+def _conocido(servidor, miembro_id):
+    clave = (servidor.id, miembro_id)
+    miembro = _cache.get(clave)
+    if miembro is not None:
+        _cache.move_to_end(clave)
+        return miembro
+    return servidor.get_member(miembro_id)
+
+async def _pedir(servidor, miembro_id):
+    async with _pedidos:
+        try:
+            return [await servidor.fetch_member(miembro_id)]
+        except discord.NotFound:
+            return []
+
+# Busca varios miembros de un servidor (por ejemplo, los de las partidas a recuperar). Los que no estén en
+# ninguna caché se le piden a Discord todos a la vez: de a uno por la API si son pocos, o por el gateway de
+# a POR_CONSULTA si son muchos (no hace falta el intent de miembros). Devuelve {id: miembro} solo con los
+# que siguen en el servidor. Si Discord falla por otra cosa que un miembro que no está (un 5xx, un corte,
+# sin respuesta del gateway), el error sigue de largo, porque no sabemos quién se fue.
+async def obtener_varios(servidor, ids):
+    encontrados = {}
+    faltan = []
+    for miembro_id in dict.fromkeys(ids):
+        miembro = _conocido(servidor, miembro_id)
+        if miembro is None:
+            faltan.append(miembro_id)
+        else:
+            encontrados[miembro_id] = miembro
+    if len(faltan) < CONSULTA_DESDE:
+        pedidos = [_pedir(servidor, miembro_id) for miembro_id in faltan]
+    else:
+        pedidos = [servidor.query_members(user_ids=faltan[i:i + POR_CONSULTA], limit=POR_CONSULTA, cache=False)
+                   for i in range(0, len(faltan), POR_CONSULTA)]
+    # No los guardamos en la caché: mientras dure la partida los tiene ella
+    for tanda in await asyncio.gather(*pedidos):
+        for miembro in tanda:
+            if miembro is not None:
+                encontrados[miembro.id] = miembro
+    return encontrados
+
+def cantidad():
+    return len(_cache)
@@ -0,0 +1,221 @@
+# Motor del juego Mafia: las reglas puras, sin Discord, sin mensajes y sin esperas.
+# Los comandos del bot (mafia.py) solo se encargan de hablar con Discord y llaman a estas funciones.
+# Todo lo aleatorio usa el generador `rng` que se le pasa, así una partida con la misma semilla
+# y las mismas acciones siempre da el mismo resultado.
+import random
+
+# Roles que actúan durante la noche
+ROLES_NOCTURNOS = ("mafia", "doctor", "detective")
+
+# Orden en el que se revelan los roles al terminar la partida
+ORDEN_ROLES = ("mafia", "doctor", "detective", "ciudadano")
+
+# Crea el generador de números aleatorios de una partida. Sin semilla, se elige una al azar.
+# Devuelve (semilla, rng) para poder guardar la semilla y reproducir la partida después.
+def crear_rng(semilla=None):
+    if semilla is None:
+        semilla = random.randrange(2**32)
+    return semilla, random.Random(semilla)
+
+# Calcula cuántos jugadores de cada rol especial hay según el total de jugadores
+def cantidad_roles(num_jugadores):
+    # Asignamos la cantidad de mafiosos: al menos 1, y aproximadamente el 25% del total
+    # Usamos // (división entera) para evitar decimales, y max para garantizar al menos 1 mafia
+    mafiosos = max(1, num_jugadores // 4)
+
+    # La cantidad de doctores y detectives escala según el número de jugadores:
+    # - 1 para hasta 6 jugadores
+    # - 2 entre 7 y 12
+    # - 3 para más de 13
+    doctores = 1 if num_jugadores <= 6 else 2 if num_jugadores <= 12 else 3
+    detectives = doctores # Usamos la misma cantidad de detectives que de doctores
+
+    return mafiosos, doctores, detectives
+
+# Lógica para asignar roles basada en la cantidad de jugadores
+def obtener_roles(jugadores, rng=random):
+    # Obtenemos la cantidad total de jugadores que se unieron a la partida
+    num_jugadores = len(jugadores)
+    mafiosos, doctores, detectives = cantidad_roles(num_jugadores)
+
+    # Construimos la lista de roles:
+    roles = (["mafia"] * mafiosos +  #Asignamos la cantidad de jugadores que seran mafia
+    ["doctor"] * doctores +     #Asignamos la cantidad de jugadores que seran doctores
+    ["detective"] * detectives +    #Asignamos la cantidad de jugadores que seran detectives
+    ["ciudadano"] * (num_jugadores - mafiosos - doctores - detectives)) #A la cantidad total de jugadores, le restamos la cantidad total de roles especiales
+                                                                        #el resultado sera la cantidad de ciudadanos.
+    # Mezclamos los roles de la lista al azar para que la asignación no sea predecible
+    rng.shuffle(roles)
+
+    # Asignamos cada rol a un jugador usando zip y lo convertimos en un diccionario
+    return dict(zip(jugadores, roles))
+
+# Códigos de cada rol dentro del arreglo de roles de EstadoJuego
+MAFIA, DOCTOR, DETECTIVE, CIUDADANO = range(4)
+CODIGO_ROL = {rol: codigo for codigo, rol in enumerate(ORDEN_ROLES)}
+
+# Estado de una partida en curso. Cada jugador se identifica con un índice (su orden de llegada):
+# los roles se guardan en un arreglo de bytes, los vivos en un entero usado como conjunto de bits
+# y llevamos la cuenta de vivos por rol, así verificar la victoria no tiene que recorrer a nadie.
+class EstadoJuego:
+    __slots__ = ("roles", "vivos", "vivos_por_rol", "num_vivos")
+
+    # `roles` es la lista con el nombre del rol de cada jugador, en orden de índice
+    def __init__(self, roles):
+        self.roles = bytes(CODIGO_ROL[rol] for rol in roles)
+        self.vivos = (1 << len(roles)) - 1 # Todos empiezan vivos
+        self.vivos_por_rol = [0, 0, 0, 0]
+        for codigo in self.roles:
+            self.vivos_por_rol[codigo] += 1
+        self.num_vivos = len(roles)
+
+    # Nombre del rol del jugador `i`
+    def rol(self, i):
+        return ORDEN_ROLES[self.roles[i]]
+
+    def esta_vivo(self, i):
+        return bool(self.vivos >> i & 1)
+
+    # Saca al jugador `i` de los vivos y actualiza los contadores
+    def matar(self, i):
+        if self.vivos >> i & 1:
+            self.vivos &= ~(1 << i)
+            self.vivos_por_rol[self.roles[i]] -= 1
+            self.num_vivos -= 1
+
+    # Índices de los jugadores vivos, de menor a mayor (recorre solo los bits prendidos)
+    def indices_vivos(self):
+        restantes = self.vivos
+        while restantes:
+            bit = restantes & -restantes
+            yield bit.bit_length() - 1
+            restantes ^= bit
+
+# Reparte los roles entre `num_jugadores` jugadores y devuelve el estado inicial de la partida
+def repartir_roles(num_jugadores, rng=random):
+    roles = obtener_roles(range(num_jugadores), rng)
+    return EstadoJuego([roles[i] for i in range(num_jugadores)])
+
+# Resuelve la noche a partir de las acciones: {jugador: (rol, objetivo)}, todos como índices
+# Devuelve (muerto, investigaciones), donde `muerto` es el índice del jugador asesinado (o None si
+# nadie murió) e `investigaciones` es una lista de (detective, investigado, rol_del_investigado).
+# No modifica nada: quien la llama decide qué hacer con el resultado.
+def resolver_noche(juego, acciones, rng=random):
+    # Recopilamos los objetivos elegidos por los mafiosos
+    mafia_targets = [obj for rol, obj in acciones.values() if rol == "mafia"]
+    # Seleccionamos aleatoriamente a una víctima de entre las elecciones de los mafiosos
+    objetivo_mafia = rng.choice(mafia_targets) if mafia_targets else None
+
+    objetivo_curado = None
+    investigaciones = []
+    for jug, (rol, obj) in acciones.items():
+        # Si el rol es doctor, guardamos a quién curó (puede haber varios doctores, pero el último sobrescribirá)
+        if rol == "doctor":
+            objetivo_curado = obj
+        # Si es detective, anotamos el rol de la persona investigada
+        elif rol == "detective":
+            investigaciones.append((jug, obj, juego.rol(obj)))
+
+    # Si la mafia eligió a alguien, y ese alguien no fue curado por el doctor, y sigue vivo, muere
+    muerto = None
+    if objetivo_mafia is not None and objetivo_mafia != objetivo_curado and juego.esta_vivo(objetivo_mafia):
+        muerto = objetivo_mafia
+
+    return muerto, investigaciones
+
+# Recuento de los votos del día que se actualiza con cada voto, sin volver a contar todo.
+# Para cada jugador lleva cuántos votos tiene y, para cada cantidad de votos, qué jugadores la tienen
+# (en el orden en que llegaron a ella), así votar, cambiar o retirar un voto y saber quién va ganando
+# y si hay empate cuestan O(1).
+class Recuento:
+    __slots__ = ("votos", "conteo", "con", "maximo")
+
+    # `votos` opcional: {votante: elegido} para empezar (por ejemplo, al recuperar una partida)
+    def __init__(self, votos=None):
+        self.votos = {} # índice del votante -> índice del elegido
+        self.conteo = {} # índice del elegido -> cantidad de votos
+        self.con = {} # cantidad de votos -> {elegido: None} (un diccionario como conjunto ordenado)
+        self.maximo = 0 # La mayor cantidad de votos que tiene alguien
+        for votante, elegido in (votos or {}).items():
+            self.votar(votante, elegido)
+
+    def __len__(self):
+        return len(self.votos)
+
+    # Registra el voto de `votante` (o lo cambia, si ya había votado). Devuelve a quién votaba antes, o None.
+    def votar(self, votante, elegido):
+        anterior = self.votos.get(votante)
+        if anterior == elegido:
+            return anterior
+        if anterior is not None:
+            self._sumar(anterior, -1)
+        self.votos[votante] = elegido
+        self._sumar(elegido, 1)
+        return anterior
+
+    # Retira el voto de `votante`. Devuelve a quién votaba, o None si no había votado.
+    def retirar(self, votante):
+        elegido = self.votos.pop(votante, None)
+        if elegido is not None:
+            self._sumar(elegido, -1)
+        return elegido
+
+    def _sumar(self, jugador, cambio):
+        antes = self.conteo.get(jugador, 0)
+        despues = antes + cambio
+        if antes:
+            grupo = self.con[antes]
+            del grupo[jugador]
+            if not grupo:
+                del self.con[antes]
+        if despues:
+            self.conteo[jugador] = despues
+            self.con.setdefault(despues, {})[jugador] = None
+        else:
+            del self.conteo[jugador]
+        # Al perder un voto, el máximo baja solo si era el único con esa cantidad (y entonces queda uno menos)
+        if despues > self.maximo:
+            self.maximo = despues
+        elif antes == self.maximo and antes not in self.con:
+            self.maximo -= 1
+
+    # Devuelve (eliminado, candidatos), como contar_votos
+    def resultado(self):
+        if not self.maximo:
+            return None, []
+        candidatos = list(self.con[self.maximo])
+        return (candidatos[0] if len(candidatos) == 1 else None), candidatos
+
+    # (jugador, votos) de los que tienen algún voto, de más votos a menos
+    def ordenados(self):
+        for cantidad in range(self.maximo, 0, -1):
+            for jugador in self.con.get(cantidad, ()):
+                yield jugador, cantidad
+
+# Cuenta los votos del día: {votante: elegido}
+# Devuelve (eliminado, candidatos). Si hay empate (o nadie votó) `eliminado` es None
+# y `candidatos` tiene a los empatados.
+def contar_votos(votos):
+    return Recuento(votos).resultado()
+
+# Verifica si la partida terminó. Devuelve "Ciudadanos", "Mafia" o None si sigue.
+# Usa los contadores de vivos por rol, así que no recorre a los jugadores.
+def verificar_victoria(juego):
+    mafias = juego.vivos_por_rol[MAFIA] # Cuántas mafias quedan vivas
+    no_mafias = juego.num_vivos - mafias # Cuántos no-mafias quedan
+
+    # Condición de victoria: si no quedan mafias vivas, gana el pueblo
+    if mafias == 0:
+        return "Ciudadanos"
+    # Condición de victoria: si las mafias son igual o más que los no-mafias, gana la mafia
+    if mafias >= no_mafias:
+        return "Mafia"
+    return None
+
+# Agrupa los nombres de los jugadores por rol para revelarlos al final: {rol: [nombres]}
+# `nombres` es la lista de nombres en orden de índice
+def resumen_roles(juego, nombres):
+    resumen = {}
+    for i, nombre in enumerate(nombres):
+        resumen.setdefault(juego.rol(i), []).append(nombre)
+    return {rol: resumen[rol] for rol in ORDEN_ROLES if rol in resumen}
@@ -0,0 +1,67 @@
+# Perfilador por muestreo, opcional y por partida (se activa con `!mafia perfilar`).
+# Mientras haya alguna partida perfilándose, un hilo mira cada INTERVALO segundos qué está ejecutando
+# el hilo del bot. Si en la pila hay una función trabajando con una partida perfilada (una variable
+# local `partida`), la muestra se le cuenta a esa partida. Al terminar se guardan las pilas en formato
+# "plegado" (una línea por pila: funciones separadas por ";" y la cantidad de muestras), el que leen
+# flamegraph.pl o speedscope.
+# No toca el código de la partida ni agrega nada al event loop: si no se perfila nada, no hay hilo.
+import asyncio
+import os
+import sys
+import threading
+from collections import Counter
+
+INTERVALO = 0.005  # Segundos entre muestras
+
+_perfiles = {} # id de la partida -> Counter de pila plegada -> muestras
+_hilo = None
+_detener = None
+_hilo_bot = None # Id del hilo donde corre el event loop del bot
+
+def activo(partida_id):
+    return partida_id in _perfiles
+
+# Empieza a perfilar una partida (hay que llamarlo desde el hilo del bot)
+def activar(partida_id):
+    global _hilo, _detener, _hilo_bot
+    _perfiles.setdefault(partida_id, Counter())
+    if _hilo is None:
+        _hilo_bot = threading.get_ident()
+        _detener = threading.Event()
+        _hilo = threading.Thread(target=_muestrear, args=(_detener,), name="perfilador", daemon=True)
+        _hilo.start()
+
+# Deja de perfilar una partida y devuelve sus muestras (o None si no se estaba perfilando)
+def desactivar(partida_id):
+    global _hilo
+    perfil = _perfiles.pop(partida_id, None)
+    if not _perfiles and _hilo is not None:
+        _detener.set()
+        _hilo = None
+    return perfil
+
+def _muestrear(detener):
+    while not detener.wait(INTERVALO):
+        marco = sys._current_frames().get(_hilo_bot)
+        pila = []
+        perfil = None
+        while marco is not None:
+            codigo = marco.f_code
+            pila.append(f"{os.path.basename(codigo.co_filename)}:{codigo.co_name}")
+            # Solo miramos las variables de las funciones que tienen una `partida`
+            if perfil is None and "partida" in codigo.co_varnames:
+                partida = marco.f_locals.get("partida")
+                perfil = _perfiles.get(getattr(partida, "id", None))
+            marco = marco.f_back
+        if perfil is not None:
+            perfil[";".join(reversed(pila))] += 1
+
+# Escribe las muestras en `ruta` en formato plegado (en otro hilo, para no frenar al bot)
+async def guardar(perfil, ruta):
+    lineas = "".join(f"{pila} {cantidad}\n" for pila, cantidad in perfil.most_common())
+    await asyncio.to_thread(_escribir, ruta, lineas)
+
+def _escribir(ruta, lineas):
+    os.makedirs(os.path.dirname(ruta), exist_ok=True)
+    with open(ruta, "w", encoding="utf-8") as archivo:
+        archivo.write(lineas)
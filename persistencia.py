@@ -0,0 +1,175 @@
+# Guardado de las partidas en disco para no perderlas si el bot se reinicia.
+# Cada cambio (crear, unirse, roles, plazos, acciones, votos y votos retirados, muertes, fin) se anota como un evento.
+# Los eventos se juntan en memoria y se escriben en tandas (ver tandas.py) en un diario (un JSON por
+# línea) desde un hilo aparte, así los callbacks de los menús nunca esperan al disco. Cada tanto se guarda una foto
+# completa y se empieza un diario nuevo. Al arrancar: foto + diario = partidas que estaban en curso.
+#
+# Los diarios van numerados (diario-<generación>.jsonl) y la foto dice con qué diario sigue. Así, si el
+# bot se corta justo después de guardar una foto, el diario anterior (que ya está en la foto) no se
+# vuelve a aplicar: eventos como "unir" no se pueden aplicar dos veces.
+#
+# Los eventos se aplican también a `registros`, una copia liviana de las partidas hecha solo de
+# números y textos (ids de Discord, índices). La foto es esa copia, y recuperar es volver a aplicar
+# los mismos eventos con la misma función, así lo que se guarda y lo que se recupera no se desfasan.
+import asyncio
+import json
+import os
+
+import tandas
+
+INTERVALO_ESCRITURA = 0.5  # Segundos que juntamos eventos antes de escribirlos
+EVENTOS_POR_FOTO = 20000  # Cada cuántos eventos escritos guardamos una foto nueva y vaciamos el diario
+
+activa = False # Hasta que se llama a `abrir`, anotar no hace nada (por ejemplo, en los benchmarks)
+registros = {} # id del canal -> registro de la partida (ver `aplicar`)
+
+_directorio = None
+_eventos_en_diario = 0
+_generacion = 0 # Número del diario en el que se está escribiendo
+
+def _nombre_diario(generacion):
+    # Las fotos de antes de numerar los diarios no tienen generación: las sigue diario.jsonl
+    return "diario.jsonl" if generacion is None else f"diario-{generacion}.jsonl"
+
+def _ruta(nombre):
+    return os.path.join(_directorio, nombre)
+
+# Aplica un evento a los registros. Cada evento es una lista: [tipo, id del canal, datos...]
+def aplicar(registros, evento):
+    tipo, canal = evento[0], evento[1]
+    if tipo == "crear":
+        _, _, servidor, creador, num_jugadores, semilla, fase, duracion = evento
+        registros[canal] = {
+            "servidor": servidor, "jugadores": [creador], "num_jugadores": num_jugadores,
+            "semilla": semilla, "duracion": duracion, "estado": "esperando", "fase": fase,
+            "roles": None, "vivos": None, "acciones": {}, "esperados": None, "votos": {},
+            "paso": None, "momento": None,
+        }
+        return
+    registro = registros.get(canal)
+    if registro is None:
+        return
+    if tipo == "unir":
+        registro["jugadores"].append(evento[2])
+    elif tipo == "tiempo":
+        registro["duracion"] = evento[2]
+    elif tipo == "roles":
+        registro["roles"] = evento[2]
+        registro["vivos"] = (1 << len(evento[2])) - 1
+    elif tipo == "plazo":
+        # Nuevo plazo: [plazo, canal, fase, estado, paso, momento]. Al empezar la noche o la votación
+        # se reinician sus acciones o votos.
+        _, _, fase, estado, paso, momento = evento
+        if paso == "cerrar_noche":
+            registro["acciones"] = {}
+            registro["esperados"] = None
+        elif paso == "cerrar_votacion":
+            registro["votos"] = {}
+        registro.update(fase=fase, estado=estado, paso=paso, momento=momento)
+    elif tipo == "esperados":
+        registro["esperados"] = evento[2]
+    elif tipo == "accion":
+        registro["acciones"][evento[2]] = evento[3]
+    elif tipo == "voto":
+        registro["votos"][evento[2]] = evento[3]
+    elif tipo == "retiro":
+        registro["votos"].pop(evento[2], None)
+    elif tipo == "muerte":
+        registro["vivos"] &= ~(1 << evento[2])
+    elif tipo == "fin":
+        del registros[canal]
+
+# Anota un evento. No espera al disco: se escribe con la próxima tanda.
+def anotar(*evento):
+    if not activa:
+        return
+    aplicar(registros, evento)
+    _tandas.anotar(evento)
+
+async def _escribir_tanda(tanda):
+    global _eventos_en_diario
+    if _eventos_en_diario + len(tanda) >= EVENTOS_POR_FOTO:
+        # La foto ya incluye esta tanda (los eventos se aplican al anotarlos), así que no hace
+        # falta escribirla en el diario. La armamos acá para que sea consistente, y la escribimos en otro hilo.
+        await _nueva_foto()
+    else:
+        await asyncio.to_thread(tandas.agregar, _ruta(_nombre_diario(_generacion)), tandas.lineas(tanda), True)
+        _eventos_en_diario += len(tanda)
+
+_tandas = tandas.Tandas(INTERVALO_ESCRITURA, _escribir_tanda)
+
+# Guarda una foto de los registros, que sigue con un diario nuevo
+async def _nueva_foto():
+    global _generacion, _eventos_en_diario
+    _generacion += 1
+    foto = json.dumps({"generacion": _generacion, "partidas": registros}, separators=(",", ":"))
+    await asyncio.to_thread(_escribir_foto, foto, _generacion)
+    _eventos_en_diario = 0
+
+# Escribe la foto de forma atómica (archivo temporal + reemplazo) y recién después borra los diarios
+# anteriores. Si se corta en el medio, la foto nueva ya no los lee y la vieja sigue con su diario.
+def _escribir_foto(foto, generacion):
+    temporal = _ruta("foto.json.tmp")
+    with open(temporal, "w", encoding="utf-8") as archivo:
+        archivo.write(foto)
+        archivo.flush()
+        os.fsync(archivo.fileno())
+    os.replace(temporal, _ruta("foto.json"))
+    for nombre in os.listdir(_directorio):
+        if nombre.startswith("diario") and nombre.endswith(".jsonl") and nombre != _nombre_diario(generacion):
+            os.remove(_ruta(nombre))
+
+# Lee la foto y el diario de `directorio` y devuelve los registros de las partidas en curso y cuántos
+# eventos había en el diario
+def leer(directorio):
+    leidos, eventos, _ = _leer(directorio)
+    return leidos, eventos
+
+def _leer(directorio):
+    leidos = {}
+    generacion = 0
+    try:
+        with open(os.path.join(directorio, "foto.json"), encoding="utf-8") as archivo:
+            foto = json.load(archivo)
+        if "generacion" in foto:
+            generacion, foto = foto["generacion"], foto["partidas"]
+        else:
+            generacion = None
+        for canal, registro in foto.items():
+            # JSON guarda las claves de los diccionarios como texto; las volvemos a números
+            registro["acciones"] = {int(j): o for j, o in registro["acciones"].items()}
+            registro["votos"] = {int(j): o for j, o in registro["votos"].items()}
+            leidos[int(canal)] = registro
+    except FileNotFoundError:
+        pass
+
+    eventos = 0
+    try:
+        with open(os.path.join(directorio, _nombre_diario(generacion)), encoding="utf-8") as archivo:
+            for linea in archivo:
+                try:
+                    evento = json.loads(linea)
+                except ValueError:
+                    break # Última línea a medio escribir cuando se cortó el bot
+                aplicar(leidos, evento)
+                eventos += 1
+    except FileNotFoundError:
+        pass
+    return leidos, eventos, generacion or 0
+
+# Activa el guardado en `directorio` y devuelve los registros de las partidas que estaban en curso
+async def abrir(directorio):
+    global activa, registros, _directorio, _generacion
+    os.makedirs(directorio, exist_ok=True)
+    _directorio = directorio
+    registros, _, _generacion = await asyncio.to_thread(_leer, directorio)
+    # Empezamos con una foto nueva y un diario vacío (así tampoco queda una línea cortada en el medio)
+    await _nueva_foto()
+    _tandas.abrir()
+    activa = True
+    return registros
+
+# Escribe ya lo que esté pendiente (lo llama mafia.apagar antes de desconectar el bot)
+async def vaciar():
+    if activa:
+        await _tandas.vaciar()
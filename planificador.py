@@ -0,0 +1,125 @@
+# Planificador de plazos: una sola tarea que despierta cuando vence el próximo plazo de cualquier partida.
+# En lugar de que cada partida tenga su propia corrutina dormida (y cada menú su temporizador),
+# todos los plazos van a un heap ordenado por momento. Agregar un plazo cuesta O(log n) y
+# la tarea duerme hasta el primero, así el costo no crece con la cantidad de partidas.
+#
+# Un plazo puede ir en un `grupo` (por ejemplo, la fase de una partida). Cuando ese grupo deja de valer
+# (la partida cambió de fase o terminó), `descartar` saca sus plazos de la cuenta y, cuando los descartados
+# son la mitad del heap, lo rearma sin ellos; si no, se tiran al vencer, sin ejecutarlos.
+import asyncio
+import heapq
+import itertools
+import time
+import traceback
+
+# Heap de plazos pendientes: (momento, número, función, argumentos, grupo)
+pendientes = []
+_numeros = itertools.count() # Desempata plazos con el mismo momento (y mantiene el orden de llegada)
+_por_grupo = {} # grupo -> cuántos plazos suyos hay en el heap
+_descartados = {} # grupo descartado -> cuántos plazos suyos quedan en el heap
+_cantidad_descartados = 0
+MIN_REARMAR = 1000  # Con menos plazos descartados que esto no vale la pena rearmar el heap
+
+_tarea = None # La tarea del planificador
+_despertar = None # Evento para avisarle que llegó un plazo más cercano que el que estaba esperando
+_corriendo = set() # Funciones vencidas que se están ejecutando (guardamos la referencia para el recolector)
+
+# Programa `funcion(*args)` (una corrutina) para dentro de `demora` segundos.
+# Los argumentos conviene que sean ids y no objetos, así un plazo viejo no mantiene viva una partida.
+# Con `grupo`, el plazo se puede descartar antes de que venza (ver `descartar`).
+def programar(demora, funcion, *args, grupo=None):
+    momento = time.monotonic() + demora
+    heapq.heappush(pendientes, (momento, next(_numeros), funcion, args, grupo))
+    if grupo is not None:
+        _por_grupo[grupo] = _por_grupo.get(grupo, 0) + 1
+    _asegurar_tarea()
+    # Si este plazo es ahora el primero, despertamos al planificador para que recalcule cuánto dormir
+    if pendientes[0][0] == momento:
+        _despertar.set()
+
+# Los plazos de `grupo` que todavía no vencieron ya no se ejecutan
+def descartar(grupo):
+    global _cantidad_descartados
+    cantidad = _por_grupo.pop(grupo, 0)
+    if not cantidad:
+        return
+    _descartados[grupo] = cantidad
+    _cantidad_descartados += cantidad
+    if _cantidad_descartados >= MIN_REARMAR and _cantidad_descartados * 2 >= len(pendientes):
+        pendientes[:] = [plazo for plazo in pendientes if plazo[4] not in _descartados]
+        heapq.heapify(pendientes)
+        _descartados.clear()
+        _cantidad_descartados = 0
+
+# Plazos que todavía valen (sin los descartados que siguen en el heap)
+def cantidad():
+    return len(pendientes) - _cantidad_descartados
+
+# Olvida todos los plazos (por ejemplo, para simular un reinicio en los benchmarks)
+def limpiar():
+    global _cantidad_descartados
+    pendientes.clear()
+    _por_grupo.clear()
+    _descartados.clear()
+    _cantidad_descartados = 0
+
+# Saca del heap el primer plazo y lo quita de la cuenta de su grupo. Devuelve None si estaba descartado.
+def _sacar():
+    global _cantidad_descartados
+    plazo = heapq.heappop(pendientes)
+    grupo = plazo[4]
+    if grupo is None:
+        return plazo
+    if grupo in _descartados:
+        _cantidad_descartados -= 1
+        if _descartados[grupo] == 1:
+            del _descartados[grupo]
+        else:
+            _descartados[grupo] -= 1
+        return None
+    if _por_grupo[grupo] == 1:
+        del _por_grupo[grupo]
+    else:
+        _por_grupo[grupo] -= 1
+    return plazo
+
+# Arranca la tarea del planificador si todavía no corre en este event loop
+def _asegurar_tarea():
+    global _tarea, _despertar
+    loop = asyncio.get_running_loop()
+    if _tarea is None or _tarea.done() or _tarea.get_loop() is not loop:
+        _despertar = asyncio.Event()
+        _tarea = loop.create_task(_bucle())
+
+async def _bucle():
+    while True:
+        ahora = time.monotonic()
+        # Lanzamos todo lo que ya venció, en orden
+        while pendientes and pendientes[0][0] <= ahora:
+            plazo = _sacar()
+            if plazo is None:
+                continue
+            _, _, funcion, args, _ = plazo
+            tarea = asyncio.create_task(_ejecutar(funcion, args))
+            _corriendo.add(tarea)
+            tarea.add_done_callback(_corriendo.discard)
+
+        # Dormimos hasta el próximo plazo o hasta que alguien programe uno más cercano.
+        # Usamos call_later en lugar de wait_for: no crea otra tarea y, si cancelan al planificador
+        # (al cerrar el event loop), la cancelación no se pierde.
+        _despertar.clear()
+        alarma = None
+        if pendientes:
+            alarma = asyncio.get_running_loop().call_later(pendientes[0][0] - ahora, _despertar.set)
+        try:
+            await _despertar.wait()
+        finally:
+            if alarma is not None:
+                alarma.cancel()
+
+async def _ejecutar(funcion, args):
+    try:
+        await funcion(*args)
+    except Exception:
+        # Un error en una partida no puede frenar al resto
+        traceback.print_exc()
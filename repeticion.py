@@ -0,0 +1,113 @@
+# Repite las partidas del historial (ver historial.py) con las reglas de motor.py: sin Discord, sin
+# plazos y sin esperas. Con la semilla de cada partida y sus acciones y votos en el mismo orden, las
+# reglas tienen que dar el mismo reparto de roles, las mismas muertes y el mismo ganador.
+# Sirve para dos cosas:
+#  - Probar un cambio en las reglas: se repiten las partidas ya jugadas y se listan las que ahora
+#    terminan distinto (y en qué ronda se separaron).
+#  - Estadísticas: qué porcentaje de las veces gana cada rol según la cantidad de jugadores.
+# Uso: python repeticion.py datos/historial
+import argparse
+import random
+import sys
+import time
+
+import historial
+import motor
+
+# Estado de una partida mientras se repite
+class Repeticion:
+    __slots__ = ("semilla", "rng", "juego", "rondas", "diferencias")
+
+    def __init__(self, semilla, roles):
+        self.semilla, self.rng = motor.crear_rng(semilla)
+        # El reparto tiene que salir igual que el guardado; si no, seguimos con el guardado
+        self.juego = motor.repartir_roles(len(roles), self.rng)
+        self.diferencias = []
+        if self.juego.roles != bytes(int(codigo) for codigo in roles):
+            self.diferencias.append("reparto de roles")
+            self.juego = motor.EstadoJuego([motor.ORDEN_ROLES[int(codigo)] for codigo in roles])
+        self.rondas = 0
+
+    # Aplica el resultado guardado (para seguir igual que la partida real) y anota si las reglas dieron otro
+    def comparar(self, momento, calculado, guardado):
+        if calculado != guardado:
+            self.diferencias.append(f"{momento} de la ronda {self.rondas}: guardado {guardado}, ahora {calculado}")
+        if guardado is not None:
+            self.juego.matar(guardado)
+
+# Repite todos los eventos y devuelve, por cada partida terminada, una tupla
+# (canal, semilla, roles, ganadores guardados, ganadores calculados, rondas, diferencias)
+def repetir(eventos):
+    en_curso = {} # id del canal -> Repeticion
+    for evento in eventos:
+        tipo, canal = evento[0], evento[1]
+        if tipo == "inicio":
+            en_curso[canal] = Repeticion(evento[2], evento[3])
+            continue
+        partida = en_curso.get(canal)
+        if partida is None:
+            continue # La partida empezó antes del primer archivo que se leyó
+        if tipo == "noche":
+            partida.rondas += 1
+            datos, juego = evento[2], partida.juego
+            acciones = {datos[i]: (juego.rol(datos[i]), datos[i + 1]) for i in range(0, len(datos), 2)}
+            muerto, _ = motor.resolver_noche(juego, acciones, partida.rng)
+            partida.comparar("noche", muerto, evento[3])
+        elif tipo == "votacion":
+            datos = evento[2]
+            eliminado, _ = motor.contar_votos(dict(zip(datos[::2], datos[1::2])))
+            partida.comparar("votación", eliminado, evento[3])
+        elif tipo == "reinicio":
+            partida.rng = random.Random(partida.semilla)
+        elif tipo == "fin":
+            del en_curso[canal]
+            ganadores = evento[2] and motor.verificar_victoria(partida.juego)
+            if ganadores != evento[2]:
+                partida.diferencias.append(f"ganadores: guardado {evento[2]}, ahora {ganadores}")
+            yield (canal, partida.semilla, partida.juego.roles, evento[2], ganadores, partida.rondas, partida.diferencias)
+
+def main():
+    parser = argparse.ArgumentParser(description="Repite las partidas del historial con las reglas actuales")
+    parser.add_argument("rutas", nargs="+", help="archivos o carpetas del historial")
+    parser.add_argument("--diferencias", type=int, default=10, help="cuántas partidas distintas mostrar")
+    args = parser.parse_args()
+
+    # jugadores -> [partidas terminadas, rondas, victorias por rol, jugadores por rol]
+    por_jugadores = {}
+    total = canceladas = 0
+    distintas = []
+    inicio = time.perf_counter()
+    for canal, semilla, roles, guardado, ganadores, rondas, diferencias in repetir(historial.leer(args.rutas)):
+        total += 1
+        if diferencias:
+            distintas.append((canal, semilla, diferencias))
+        if guardado is None:
+            canceladas += 1
+            continue
+        datos = por_jugadores.setdefault(len(roles), [0, 0, [0] * len(motor.ORDEN_ROLES), [0] * len(motor.ORDEN_ROLES)])
+        datos[0] += 1
+        datos[1] += rondas
+        # Cada rol gana con su bando
+        gano_mafia = guardado == "Mafia"
+        for codigo in roles:
+            datos[3][codigo] += 1
+            if (codigo == motor.MAFIA) == gano_mafia:
+                datos[2][codigo] += 1
+    segundos = time.perf_counter() - inicio
+
+    print(f"Partidas repetidas: {total} ({canceladas} canceladas o abandonadas) "
+          f"en {segundos:.2f} s ({total / max(segundos, 1e-9):.0f} partidas/seg)")
+    print("Jugadores  Partidas  Rondas  " + "  ".join(f"{rol:>9}" for rol in motor.ORDEN_ROLES) + "   (% de victorias)")
+    for jugadores, (partidas, rondas, victorias, cantidad) in sorted(por_jugadores.items()):
+        porcentajes = "  ".join(f"{100 * v / c:8.1f}%" if c else f"{'-':>9}" for v, c in zip(victorias, cantidad))
+        print(f"{jugadores:9}  {partidas:8}  {rondas / partidas:6.1f}  {porcentajes}")
+
+    if distintas:
+        print(f"\n{len(distintas)} partidas terminan distinto con las reglas actuales:")
+        for canal, semilla, diferencias in distintas[:args.diferencias]:
+            print(f"  canal {canal}, semilla {semilla}: {'; '.join(diferencias)}")
+        sys.exit(1)
+    print("Todas las partidas dan el mismo resultado con las reglas actuales.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+# Simulador de balance: juega millones de partidas al azar para ver qué tan equilibradas son las
+# proporciones de roles de `motor.cantidad_roles`, para cada cantidad de jugadores de 4 a 30.
+# Usa las mismas reglas de noche que el bot: la víctima de la mafia sale al azar entre lo que
+# eligieron los mafiosos, gana la cura del último doctor, y se verifica la victoria igual que en el motor.
+#
+# Las estrategias no distinguen a un jugador de otro con el mismo rol, así que una partida queda
+# descrita solo por cuántos vivos quedan de cada rol y cuántos mafiosos vivos fueron descubiertos
+# por un detective. En lugar de jugar cada partida por separado, agrupamos las partidas que están
+# en el mismo estado y repartimos ese grupo entre los resultados posibles con una multinomial
+# (NumPy, todos los grupos a la vez). Es exactamente lo mismo que sortear partida por partida,
+# pero el costo depende de cuántos estados distintos hay (unos cientos), no de cuántas partidas.
+#
+# Requiere NumPy (está en las dependencias de desarrollo: pipenv install --dev). Uso:
+#   python simulador.py --partidas 1000000 --voto aleatorio
+#   python simulador.py --partidas 1000000 --voto informado --mafia inteligente --procesos 4
+import argparse
+import math
+import time
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache
+
+import numpy as np
+
+import motor
+
+# Posición de cada dato dentro de un estado: (mafia, doctores, detectives, ciudadanos, descubiertos)
+MAFIA, DOCTOR, DETECTIVE, CIUDADANO, DESCUBIERTOS = 0, 1, 2, 3, 4
+
+# Resultado de la verificación de victoria
+SIGUE, GANA_PUEBLO, GANA_MAFIA = "sigue", "Ciudadanos", "Mafia"
+
+# --------- Conteo exacto de votaciones ---------
+
+# Cantidad de formas de repartir `votos` votos (de votantes distintos) entre `candidatos`
+# candidatos, de modo que ninguno reciba `tope` votos o más.
+# Es votos! por el coeficiente de x^votos en (1 + x + x²/2! + ... + x^(tope-1)/(tope-1)!)^candidatos
+@lru_cache(maxsize=None)
+def _formas(votos, candidatos, tope):
+    if candidatos == 0:
+        return 1.0 if votos == 0 else 0.0
+    if tope <= 0:
+        return 0.0
+    serie = np.array([1.0 / math.factorial(j) for j in range(min(tope, votos + 1))])
+    polinomio = np.array([1.0])
+    for _ in range(candidatos):
+        polinomio = np.convolve(polinomio, serie)[:votos + 1]
+    return math.factorial(votos) * polinomio[votos] if votos < len(polinomio) else 0.0
+
+# Probabilidad de que, con `votos` votos al azar entre `candidatos`, uno solo saque más de `piso` votos
+# y más que todos los demás (si no, hay empate o nadie supera el piso).
+@lru_cache(maxsize=None)
+def _prob_ganador_unico(votos, candidatos, piso=0):
+    if candidatos == 0:
+        return 0.0
+    total = 0.0
+    for t in range(piso + 1, votos + 1):
+        total += candidatos * math.comb(votos, t) * _formas(votos - t, candidatos - 1, t)
+    return total / candidatos ** votos
+
+# Probabilidad exacta de que haya un único jugador con más votos (si no, es empate y nadie muere)
+def prob_sin_empate(votantes, candidatos):
+    return _prob_ganador_unico(votantes, candidatos)
+
+# La mafia suma `votos_mafia` votos a un candidato X y el pueblo reparte `votos_pueblo` votos al azar
+# entre los `vivos`. Devuelve (probabilidad de que muera X, probabilidad de que muera otro).
+@lru_cache(maxsize=None)
+def _prob_votacion_coordinada(votos_pueblo, vivos, votos_mafia):
+    muere_x = muere_otro = 0.0
+    otros = vivos - 1
+    for i in range(votos_pueblo + 1):
+        # El pueblo le da i votos a X y el resto se reparte entre los demás
+        p_i = math.comb(votos_pueblo, i) * (1 / vivos) ** i * (otros / vivos) ** (votos_pueblo - i)
+        resto = votos_pueblo - i
+        votos_x = i + votos_mafia
+        reparto = otros ** resto if otros else 1.0
+        if votos_x > 0:
+            muere_x += p_i * _formas(resto, otros, votos_x) / reparto
+        muere_otro += p_i * _prob_ganador_unico(resto, otros, votos_x)
+    return muere_x, muere_otro
+
+# Probabilidad de que voten exactamente k de n jugadores si cada uno se abstiene con probabilidad p
+def _binomial(n, p):
+    return [math.comb(n, k) * (1 - p) ** k * p ** (n - k) for k in range(n + 1)]
+
+# --------- Transiciones ---------
+# Cada función recibe un estado y devuelve una lista de (probabilidad, nuevo_estado).
+
+# Muere un jugador del rol indicado. Si es un mafioso, con probabilidad descubiertos/mafias es uno
+# de los descubiertos.
+def _muertes(estado, rol, probabilidad):
+    if probabilidad <= 0:
+        return []
+    nuevo = list(estado)
+    nuevo[rol] -= 1
+    if rol != MAFIA:
+        return [(probabilidad, tuple(nuevo))]
+    mafias, descubiertos = estado[MAFIA], estado[DESCUBIERTOS]
+    descubierto = list(nuevo)
+    descubierto[DESCUBIERTOS] -= 1
+    return [(probabilidad * (mafias - descubiertos) / mafias, tuple(nuevo)),
+            (probabilidad * descubiertos / mafias, tuple(descubierto))]
+
+# Muere alguien elegido con probabilidad proporcional a `pesos` (uno por rol)
+def _muerte_proporcional(estado, pesos, probabilidad):
+    total = sum(pesos)
+    transiciones = []
+    for rol, peso in enumerate(pesos):
+        if peso:
+            transiciones += _muertes(estado, rol, probabilidad * peso / total)
+    return transiciones
+
+# El detective número `indice` (si sigue vivo) investiga a un jugador vivo al azar
+def investigacion(estado, indice):
+    if estado[DETECTIVE] <= indice:
+        return [(1.0, estado)]
+    vivos = sum(estado[:DESCUBIERTOS])
+    acierta = (estado[MAFIA] - estado[DESCUBIERTOS]) / vivos
+    descubre = list(estado)
+    descubre[DESCUBIERTOS] += 1
+    return [(1 - acierta, estado), (acierta, tuple(descubre))]
+
+# --------- Estrategias de la mafia (a quién atacan de noche) ---------
+# Devuelven los pesos por rol de la víctima.
+
+# Como en el bot: cada mafioso puede tocar cualquier botón, incluso el de un compañero o el propio
+def mafia_aleatoria(estado):
+    return estado[:DESCUBIERTOS]
+
+# Los mafiosos solo atacan a jugadores que no son mafia
+def mafia_inteligente(estado):
+    return (0,) + estado[DOCTOR:DESCUBIERTOS]
+
+ESTRATEGIAS_MAFIA = {
+    "aleatoria": mafia_aleatoria,
+    "inteligente": mafia_inteligente,
+}
+
+# La noche: la mafia ataca y el último doctor en elegir cura a cualquier vivo al azar
+def noche(estado, mafia):
+    vivos = sum(estado[:DESCUBIERTOS])
+    salva = 1 / vivos if estado[DOCTOR] else 0.0
+    return [(salva, estado)] + _muerte_proporcional(estado, ESTRATEGIAS_MAFIA[mafia](estado), 1 - salva)
+
+# --------- Estrategias de votación ---------
+
+# Todos votan a cualquier jugador vivo al azar; sin empate, por simetría, muere cualquiera de los vivos
+def voto_aleatorio(estado, abstencion):
+    vivos = sum(estado[:DESCUBIERTOS])
+    muere = sum(p * prob_sin_empate(votantes, vivos) for votantes, p in enumerate(_binomial(vivos, abstencion)))
+    return [(1 - muere, estado)] + _muerte_proporcional(estado, estado[:DESCUBIERTOS], muere)
+
+# La mafia se pone de acuerdo y vota a un mismo no-mafioso X; el pueblo vota al azar
+def voto_mafia_coordinada(estado, abstencion):
+    vivos = sum(estado[:DESCUBIERTOS])
+    mafias = estado[MAFIA]
+    muere_x = muere_otro = 0.0
+    for votos_mafia, p_m in enumerate(_binomial(mafias, abstencion)):
+        for votos_pueblo, p_p in enumerate(_binomial(vivos - mafias, abstencion)):
+            x, otro = _prob_votacion_coordinada(votos_pueblo, vivos, votos_mafia)
+            muere_x += p_m * p_p * x
+            muere_otro += p_m * p_p * otro
+
+    transiciones = [(1 - muere_x - muere_otro, estado)]
+    # X es un no-mafioso cualquiera
+    transiciones += _muerte_proporcional(estado, mafia_inteligente(estado), muere_x)
+    # Si muere otro, es cualquiera de los vivos menos X
+    no_mafias = vivos - mafias
+    for rol_x in (DOCTOR, DETECTIVE, CIUDADANO):
+        if estado[rol_x]:
+            resto = list(estado[:DESCUBIERTOS])
+            resto[rol_x] -= 1
+            transiciones += _muerte_proporcional(estado, resto, muere_otro * estado[rol_x] / no_mafias)
+    return transiciones
+
+# Como la anterior, pero si hay un mafioso vivo descubierto por un detective, el pueblo entero lo vota:
+# quedan dos candidatos y gana el que tenga más votos (si empatan no muere nadie)
+def voto_informado(estado, abstencion):
+    if not estado[DESCUBIERTOS]:
+        return voto_mafia_coordinada(estado, abstencion)
+    mafias = estado[MAFIA]
+    no_mafias = sum(estado[DOCTOR:DESCUBIERTOS])
+    muere_sospechoso = muere_x = 0.0
+    for votos_mafia, p_m in enumerate(_binomial(mafias, abstencion)):
+        for votos_pueblo, p_p in enumerate(_binomial(no_mafias, abstencion)):
+            if votos_pueblo > votos_mafia:
+                muere_sospechoso += p_m * p_p
+            elif votos_mafia > votos_pueblo:
+                muere_x += p_m * p_p
+    sospechoso = list(estado)
+    sospechoso[MAFIA] -= 1
+    sospechoso[DESCUBIERTOS] -= 1
+    return ([(1 - muere_sospechoso - muere_x, estado), (muere_sospechoso, tuple(sospechoso))]
+            + _muerte_proporcional(estado, mafia_inteligente(estado), muere_x))
+
+ESTRATEGIAS_VOTO = {
+    "aleatorio": voto_aleatorio,
+    "mafia_coordinada": voto_mafia_coordinada,
+    "informado": voto_informado,
+}
+
+def votacion(estado, voto, abstencion):
+    return ESTRATEGIAS_VOTO[voto](estado, abstencion)
+
+# Misma regla que motor.verificar_victoria, a partir de los conteos
+def verificar_victoria(estado):
+    mafias = estado[MAFIA]
+    no_mafias = sum(estado[DOCTOR:DESCUBIERTOS])
+    if mafias == 0:
+        return GANA_PUEBLO
+    if mafias >= no_mafias:
+        return GANA_MAFIA
+    return SIGUE
+
+# --------- Simulación ---------
+
+# Máximo de resultados posibles de una transición (las filas se rellenan con ceros hasta este ancho)
+ANCHO_TRANSICIONES = 24
+
+# Cada estado distinto recibe un número, así los grupos de partidas son dos arreglos:
+# los números de estado y cuántas partidas hay en cada uno
+_estados = []
+_numeros = {}
+_ganadores = []
+
+def _numero(estado):
+    numero = _numeros.get(estado)
+    if numero is None:
+        numero = _numeros[estado] = len(_estados)
+        _estados.append(estado)
+        _ganadores.append(verificar_victoria(estado))
+    return numero
+
+# Transición de un estado ya convertida a arreglos: (probabilidades, números de estado destino)
+@lru_cache(maxsize=None)
+def _fila(transicion, numero, args):
+    opciones = transicion(_estados[numero], *args)
+    probabilidades = np.zeros(ANCHO_TRANSICIONES)
+    destinos = np.zeros(ANCHO_TRANSICIONES, dtype=np.intp)
+    for k, (probabilidad, estado) in enumerate(opciones):
+        probabilidades[k] = max(probabilidad, 0.0)
+        destinos[k] = _numero(estado)
+    probabilidades /= probabilidades.sum()
+    return probabilidades, destinos
+
+# Reparte cada grupo de partidas entre los resultados posibles de su estado
+# con una multinomial por grupo (todas juntas) y vuelve a juntar los que caen en el mismo estado
+def _avanzar(rng, numeros, cantidades, transicion, *args):
+    filas = [_fila(transicion, numero, args) for numero in numeros.tolist()]
+    probabilidades = np.array([f[0] for f in filas])
+    destinos = np.array([f[1] for f in filas])
+    repartos = rng.multinomial(cantidades, probabilidades)
+    totales = np.bincount(destinos.ravel(), weights=repartos.ravel(), minlength=len(_estados))
+    numeros = np.flatnonzero(totales)
+    return numeros, totales[numeros].astype(np.int64)
+
+# Saca las partidas que terminaron y las suma a `resultados`
+def _separar_terminadas(numeros, cantidades, resultados, ronda):
+    ganadores = np.array(_ganadores, dtype=object)[numeros]
+    for ganador in (GANA_PUEBLO, GANA_MAFIA):
+        terminadas = int(cantidades[ganadores == ganador].sum())
+        resultados[ganador] += terminadas
+        resultados["rondas"] += terminadas * ronda
+    siguen = ganadores == SIGUE
+    return numeros[siguen], cantidades[siguen]
+
+# Simula `partidas` partidas con `num_jugadores` jugadores.
+# Devuelve un diccionario con los porcentajes de victoria y la duración promedio.
+def simular(num_jugadores, partidas, semilla=None, mafia="aleatoria", voto="aleatorio", abstencion=0.0):
+    rng = np.random.default_rng(semilla)
+    mafiosos, doctores, detectives = motor.cantidad_roles(num_jugadores)
+    ciudadanos = num_jugadores - mafiosos - doctores - detectives
+    numeros = np.array([_numero((mafiosos, doctores, detectives, ciudadanos, 0))])
+    cantidades = np.array([partidas], dtype=np.int64)
+    resultados = {GANA_PUEBLO: 0, GANA_MAFIA: 0, "rondas": 0}
+
+    # Cada vuelta es una noche y un día, hasta que terminan todas las partidas
+    ronda = 0
+    while numeros.size:
+        ronda += 1
+        # --------- NOCHE ---------
+        for indice in range(detectives):
+            numeros, cantidades = _avanzar(rng, numeros, cantidades, investigacion, indice)
+        numeros, cantidades = _avanzar(rng, numeros, cantidades, noche, mafia)
+        numeros, cantidades = _separar_terminadas(numeros, cantidades, resultados, ronda)
+        # --------- DÍA ---------
+        if numeros.size:
+            numeros, cantidades = _avanzar(rng, numeros, cantidades, votacion, voto, abstencion)
+            numeros, cantidades = _separar_terminadas(numeros, cantidades, resultados, ronda)
+
+    return {
+        "jugadores": num_jugadores,
+        "mafia": mafiosos,
+        "doctores": doctores,
+        "detectives": detectives,
+        "gana_mafia": resultados[GANA_MAFIA] / partidas,
+        "gana_pueblo": resultados[GANA_PUEBLO] / partidas,
+        "rondas": resultados["rondas"] / partidas,
+    }
+
+def _simular_args(argumentos):
+    return simular(*argumentos)
+
+# Corre el barrido de 4 a 30 jugadores, opcionalmente repartido en varios procesos
+def barrido(partidas, semilla=0, mafia="aleatoria", voto="aleatorio", abstencion=0.0,
+            procesos=1, minimo=4, maximo=30):
+    cantidades = list(range(minimo, maximo + 1))
+    # Una semilla independiente por cantidad de jugadores, así el resultado no depende de los procesos
+    semillas = np.random.SeedSequence(semilla).spawn(len(cantidades))
+    argumentos = [(n, partidas, s, mafia, voto, abstencion) for n, s in zip(cantidades, semillas)]
+    if procesos > 1:
+        with ProcessPoolExecutor(procesos) as pool:
+            return list(pool.map(_simular_args, argumentos))
+    return [simular(*a) for a in argumentos]
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulador de balance de roles de Mafia")
+    parser.add_argument("--partidas", type=int, default=1_000_000, help="partidas por cantidad de jugadores")
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--mafia", choices=ESTRATEGIAS_MAFIA, default="aleatoria")
+    parser.add_argument("--voto", choices=ESTRATEGIAS_VOTO, default="aleatorio")
+    parser.add_argument("--abstencion", type=float, default=0.0, help="probabilidad de que un jugador no vote")
+    parser.add_argument("--procesos", type=int, default=1)
+    parser.add_argument("--min", type=int, default=4)
+    parser.add_argument("--max", type=int, default=30)
+    args = parser.parse_args()
+
+    inicio = time.perf_counter()
+    tabla = barrido(args.partidas, args.semilla, args.mafia, args.voto, args.abstencion,
+                    args.procesos, args.min, args.max)
+    duracion = time.perf_counter() - inicio
+
+    print(f"{'Jug':>4} {'Maf':>4} {'Doc':>4} {'Det':>4} {'Gana mafia':>11} {'Gana pueblo':>12} {'Rondas':>7}")
+    for fila in tabla:
+        print(f"{fila['jugadores']:>4} {fila['mafia']:>4} {fila['doctores']:>4} {fila['detectives']:>4} "
+              f"{fila['gana_mafia']:>10.1%} {fila['gana_pueblo']:>12.1%} {fila['rondas']:>7.2f}")
+    total = args.partidas * len(tabla)
+    print(f"\n{total:,} partidas en {duracion:.2f} s ({total / duracion:,.0f} partidas/seg)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,263 @@
+# Supervisor: reparte los shards del bot entre varios procesos, uno por núcleo, para que una partida
+# ocupada en un servidor no frene las partidas de todos los demás (cada proceso tiene su event loop).
+# Cada proceso (trabajador) corre mafia.bot con sus shards y es dueño de las partidas de sus servidores:
+# Discord manda los eventos de cada servidor siempre al mismo shard. Guarda las partidas y el historial en
+# su propia carpeta (dentro de MAFIA_DATOS), así al reiniciarse recupera las suyas.
+#
+# Cada trabajador se comunica con el supervisor por un Pipe:
+#  - Cada INTERVALO_LATIDO segundos manda un latido con sus números (partidas por estado, jugadores,
+#    retraso del event loop, memoria, latencia con Discord). Con eso el supervisor publica las métricas
+#    de todos juntos en MAFIA_METRICAS_PUERTO (cada trabajador publica las suyas en los puertos siguientes).
+#  - Si un trabajador se muere o pasa LIMITE_SILENCIO segundos sin latir (event loop trabado), se reinicia.
+#  - Los clics en menús por DM llegan todos al shard 0; si la partida es de otro proceso, el supervisor
+#    se los pasa al dueño (ver mafia.reenviar_clic).
+# Uso: python supervisor.py --procesos 4 [--shards 8]   (sin --shards, los que recomienda Discord)
+import argparse
+import asyncio
+import multiprocessing
+import os
+import time
+
+import aiohttp
+from dotenv import load_dotenv
+
+import metricas
+
+INTERVALO_LATIDO = 1  # Segundos entre latidos de cada trabajador
+LIMITE_SILENCIO = 30  # Segundos sin latidos tras los que damos al trabajador por trabado y lo reiniciamos
+INTERVALO_REVISION = 2  # Cada cuántos segundos revisamos que los trabajadores sigan vivos
+ESPERA_CIERRE = 10  # Segundos que le damos a un trabajador para apagarse solo (y guardar lo pendiente) antes de terminarlo
+ESPERA_ARRANQUE = 60  # Segundos que esperamos a que un trabajador se conecte antes de arrancar el siguiente
+INTERVALO_RETRASO = 0.05  # Cada cuánto mide cada trabajador el retraso de su event loop
+
+# --------- Lado del trabajador ---------
+# Punto de entrada de cada proceso trabajador. La configuración de shards, carpeta y puerto llega por
+# variables de entorno (las lee mafia.py al importarse). `preparar` es un (función, argumentos) opcional
+# que se llama con el módulo mafia antes de conectar (lo usa bench_carga.py).
+def correr_trabajador(conexion, preparar=None):
+    import mafia
+    if preparar is not None:
+        funcion, argumentos = preparar
+        funcion(mafia, *argumentos)
+    asyncio.run(_trabajar(conexion, mafia))
+
+async def _trabajar(conexion, mafia):
+    import planificador
+    loop = asyncio.get_running_loop()
+
+    # Clics que otro proceso recibió y son de partidas nuestras
+    def leer():
+        try:
+            while conexion.poll():
+                mensaje = conexion.recv()
+                if "clic" in mensaje:
+                    planificador.programar(0, mafia.recibir_clic, mensaje["clic"])
+                elif "cerrar" in mensaje:
+                    # Nos apagan: mafia.apagar guarda lo pendiente y bot.start termina
+                    loop.create_task(mafia.bot.close())
+        except (EOFError, OSError):
+            # Se fue el supervisor: no tiene sentido seguir solos
+            loop.remove_reader(conexion.fileno())
+            loop.create_task(mafia.bot.close())
+    loop.add_reader(conexion.fileno(), leer)
+    mafia.reenviar_clic = lambda shard, datos: conexion.send({"clic": datos, "shard": shard})
+
+    retrasos = []
+    tareas = [asyncio.create_task(metricas.medir_retraso(retrasos, INTERVALO_RETRASO)),
+              asyncio.create_task(_latir(conexion, mafia, retrasos))]
+    try:
+        async with mafia.bot:
+            await mafia.bot.start(mafia.TOKEN)
+    finally:
+        for tarea in tareas:
+            tarea.cancel()
+
+async def _latir(conexion, mafia, retrasos):
+    while True:
+        conexion.send({
+            "listo": mafia.bot.is_ready(), "partidas": mafia.contar_partidas(),
+            "jugadores": len(mafia.partida_de_jugador), "retrasos": retrasos[:], "memoria": metricas.memoria(),
+            "latencia": mafia.bot.latency,
+        })
+        retrasos.clear()
+        await asyncio.sleep(INTERVALO_LATIDO)
+
+# --------- Lado del supervisor ---------
+class Trabajador:
+    __slots__ = ("numero", "propios", "entorno", "proceso", "conexion", "ultimo_latido", "estado", "reinicios")
+
+    def __init__(self, numero, propios, entorno):
+        self.numero = numero
+        self.propios = propios # Shards que corre este trabajador
+        self.entorno = entorno # Variables de entorno con las que arranca
+        self.proceso = None
+        self.conexion = None
+        self.ultimo_latido = 0.0
+        self.estado = {} # El último latido
+        self.reinicios = 0
+
+class Supervisor:
+    # `shards`: cuántos shards hay en total; se reparten salteados entre `procesos` trabajadores (el 0, 4, 8...
+    # al primero) para que los servidores grandes no caigan todos en el mismo. `directorio`: dónde guarda cada
+    # trabajador sus partidas (una carpeta por trabajador). `puerto_metricas`: el del supervisor; los
+    # trabajadores usan los siguientes (0 los apaga a todos).
+    def __init__(self, shards, procesos, directorio, puerto_metricas=0, preparar=None):
+        self.contexto = multiprocessing.get_context("spawn")
+        self.preparar = preparar
+        self.trabajadores = []
+        self.dueno = {} # shard -> trabajador
+        self.retrasos = [] # Retrasos del event loop de todos los trabajadores, desde que alguien los vació
+        for numero in range(min(procesos, shards)):
+            propios = list(range(numero, shards, procesos))
+            entorno = {
+                "MAFIA_SHARDS": str(shards),
+                "MAFIA_SHARDS_PROPIOS": ",".join(map(str, propios)),
+                "MAFIA_DATOS": os.path.join(directorio, "shards-" + "-".join(map(str, propios))),
+                "MAFIA_METRICAS_PUERTO": str(puerto_metricas + 1 + numero if puerto_metricas else 0),
+            }
+            trabajador = Trabajador(numero, propios, entorno)
+            self.trabajadores.append(trabajador)
+            for shard in propios:
+                self.dueno[shard] = trabajador
+
+    def lanzar(self, trabajador):
+        conexion, del_hijo = self.contexto.Pipe()
+        trabajador.proceso = self.contexto.Process(target=correr_trabajador, args=(del_hijo, self.preparar),
+                                                   name=f"mafia-{trabajador.numero}", daemon=True)
+        # El proceso nuevo hereda el entorno en el momento de arrancar, y mafia.py lo lee al importarse
+        anterior = dict(os.environ)
+        os.environ.update(trabajador.entorno)
+        try:
+            trabajador.proceso.start()
+        finally:
+            os.environ.clear()
+            os.environ.update(anterior)
+        del_hijo.close()
+        trabajador.conexion = conexion
+        trabajador.ultimo_latido = time.monotonic()
+        trabajador.estado = {}
+        asyncio.get_running_loop().add_reader(conexion.fileno(), self._leer, trabajador)
+
+    def _leer(self, trabajador):
+        try:
+            while trabajador.conexion.poll():
+                mensaje = trabajador.conexion.recv()
+                if "clic" in mensaje:
+                    self._enviar(self.dueno.get(mensaje["shard"]), {"clic": mensaje["clic"]})
+                    continue
+                trabajador.estado = mensaje
+                trabajador.ultimo_latido = time.monotonic()
+                self.retrasos.extend(mensaje["retrasos"])
+                for retraso in mensaje["retrasos"]:
+                    metricas.observar("retraso_loop_segundos", retraso, proceso=trabajador.numero)
+        except (EOFError, OSError):
+            # Se murió; la próxima revisión lo reinicia
+            asyncio.get_running_loop().remove_reader(trabajador.conexion.fileno())
+
+    def _enviar(self, trabajador, mensaje):
+        if trabajador is None:
+            return
+        try:
+            trabajador.conexion.send(mensaje)
+        except OSError:
+            pass # Se está reiniciando: ese clic se pierde, como si Discord no lo hubiera entregado
+
+    # Le pide al trabajador que se apague solo, así guarda lo que tenga pendiente; si no termina en
+    # ESPERA_CIERRE segundos (por ejemplo, porque está trabado), lo terminamos
+    async def detener(self, trabajador):
+        try:
+            asyncio.get_running_loop().remove_reader(trabajador.conexion.fileno())
+        except (ValueError, OSError):
+            pass
+        if trabajador.proceso.is_alive():
+            self._enviar(trabajador, {"cerrar": True})
+            await asyncio.to_thread(trabajador.proceso.join, ESPERA_CIERRE)
+        trabajador.conexion.close()
+        trabajador.proceso.terminate()
+        await asyncio.to_thread(trabajador.proceso.join, 5)
+        if trabajador.proceso.is_alive():
+            trabajador.proceso.kill()
+            await asyncio.to_thread(trabajador.proceso.join)
+
+    # Arranca los trabajadores de a uno, esperando a que cada uno se conecte: Discord limita cuántos
+    # shards pueden identificarse a la vez
+    async def arrancar(self):
+        for trabajador in self.trabajadores:
+            self.lanzar(trabajador)
+            limite = time.monotonic() + ESPERA_ARRANQUE
+            while not trabajador.estado.get("listo") and time.monotonic() < limite and trabajador.proceso.is_alive():
+                await asyncio.sleep(0.2)
+
+    # Reinicia los trabajadores que se murieron o que dejaron de latir
+    async def vigilar(self):
+        while True:
+            await asyncio.sleep(INTERVALO_REVISION)
+            ahora = time.monotonic()
+            for trabajador in self.trabajadores:
+                if not trabajador.proceso.is_alive():
+                    motivo = f"terminó (código {trabajador.proceso.exitcode})"
+                elif ahora - trabajador.ultimo_latido > LIMITE_SILENCIO:
+                    motivo = f"no late hace {ahora - trabajador.ultimo_latido:.0f} segundos"
+                else:
+                    continue
+                print(f"El trabajador {trabajador.numero} (shards {trabajador.propios}) {motivo}: lo reiniciamos")
+                metricas.contar("trabajadores_reiniciados", proceso=trabajador.numero)
+                trabajador.reinicios += 1
+                await self.detener(trabajador)
+                self.lanzar(trabajador)
+
+    async def cerrar(self):
+        await asyncio.gather(*(self.detener(trabajador) for trabajador in self.trabajadores if trabajador.proceso is not None))
+
+    # --------- Números de todos los trabajadores juntos ---------
+    def partidas_activas(self):
+        cantidades = {}
+        for trabajador in self.trabajadores:
+            for estado, cantidad in trabajador.estado.get("partidas", {}).items():
+                cantidades[estado] = cantidades.get(estado, 0) + cantidad
+        return cantidades
+
+    def sumar(self, clave):
+        return sum(trabajador.estado.get(clave, 0) for trabajador in self.trabajadores)
+
+    def por_trabajador(self, clave):
+        return {trabajador.numero: trabajador.estado[clave] for trabajador in self.trabajadores if clave in trabajador.estado}
+
+    def registrar_metricas(self):
+        metricas.medidor("partidas_activas", self.partidas_activas, etiqueta="estado")
+        metricas.medidor("jugadores_en_partida", lambda: self.sumar("jugadores"))
+        metricas.medidor("trabajadores_listos", lambda: sum(1 for t in self.trabajadores if t.estado.get("listo")))
+        metricas.medidor("memoria_mib", lambda: self.por_trabajador("memoria"), etiqueta="proceso")
+        metricas.medidor("latencia_gateway_segundos", lambda: self.por_trabajador("latencia"), etiqueta="proceso")
+
+# Cuántos shards recomienda Discord para el bot
+async def shards_recomendados(token, base="https://discord.com/api/v10"):
+    async with aiohttp.ClientSession() as sesion:
+        async with sesion.get(f"{base}/gateway/bot", headers={"Authorization": f"Bot {token}"}) as respuesta:
+            respuesta.raise_for_status()
+            return (await respuesta.json())["shards"]
+
+async def supervisar(args):
+    token = os.getenv('DISCORD_TOKEN')
+    shards = args.shards or await shards_recomendados(token)
+    puerto = int(os.getenv('MAFIA_METRICAS_PUERTO', '9108'))
+    supervisor = Supervisor(shards, args.procesos, os.getenv('MAFIA_DATOS', 'datos'), puerto)
+    print(f"{shards} shards en {len(supervisor.trabajadores)} procesos")
+    if puerto:
+        supervisor.registrar_metricas()
+        await metricas.servir(puerto)
+    try:
+        await supervisor.arrancar()
+        await supervisor.vigilar()
+    finally:
+        await supervisor.cerrar()
+
+def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Corre el bot repartido en varios procesos")
+    parser.add_argument("--procesos", type=int, default=os.cpu_count() or 1, help="procesos trabajadores")
+    parser.add_argument("--shards", type=int, default=0, help="shards en total (0: los que recomienda Discord)")
+    asyncio.run(supervisar(parser.parse_args()))
+
+if __name__ == "__main__":
+    main()
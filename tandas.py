@@ -0,0 +1,49 @@
+# Escritura en tandas de eventos a archivos de un JSON por línea, la usan persistencia.py e historial.py.
+# Los eventos se juntan en memoria y cada `intervalo` segundos se le pasan todos juntos a `escribir`
+# (una función async que los manda al disco desde un hilo aparte), así quien anota nunca espera al disco.
+import asyncio
+import json
+import os
+
+import planificador
+
+class Tandas:
+    __slots__ = ("intervalo", "escribir", "_pendientes", "_programada", "_candado")
+
+    def __init__(self, intervalo, escribir):
+        self.intervalo = intervalo
+        self.escribir = escribir # async (tanda) -> None, con la lista de eventos de la tanda
+        self._pendientes = [] # Eventos anotados que todavía no se escribieron
+        self._programada = False
+        self._candado = None # Una escritura a la vez, así las tandas quedan en orden
+
+    # Se llama ya con el event loop andando, antes de anotar
+    def abrir(self):
+        self._candado = asyncio.Lock()
+
+    # Anota un evento. No espera al disco: se escribe con la próxima tanda.
+    def anotar(self, evento):
+        self._pendientes.append(evento)
+        if not self._programada:
+            self._programada = True
+            planificador.programar(self.intervalo, self.vaciar)
+
+    # Escribe ya lo que esté pendiente
+    async def vaciar(self):
+        self._programada = False
+        async with self._candado:
+            tanda, self._pendientes = self._pendientes, []
+            if tanda:
+                await self.escribir(tanda)
+
+# Los eventos como líneas de JSON, listas para agregar a un archivo
+def lineas(tanda):
+    return "".join(json.dumps(evento, separators=(",", ":")) + "\n" for evento in tanda)
+
+# Agrega `texto` al final del archivo; con `sincronizar`, espera a que llegue al disco (fsync)
+def agregar(ruta, texto, sincronizar=False):
+    with open(ruta, "a", encoding="utf-8") as archivo:
+        archivo.write(texto)
+        if sincronizar:
+            archivo.flush()
+            os.fsync(archivo.fileno())